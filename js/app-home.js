@@ -9,6 +9,23 @@
     return `₹${n.toFixed(2)}`;
   }
 
+  // Responsive srcset from the admin-generated imageVariants manifest
+  function imageSrcset(product) {
+    const manifest = product.imageVariants?.[product.images?.[0]];
+    const entries = manifest?.webp || [];
+    return entries.length ? `srcset="${entries.map(e => `${e.src} ${e.width}w`).join(', ')}" sizes="(min-width: 1024px) 25vw, 50vw"` : '';
+  }
+
+  // Catalog listing entries carry only the first image; give them the
+  // product fields the card templates read
+  function fromCard(card) {
+    return {
+      ...card,
+      images: card.thumbnail ? [card.thumbnail] : [],
+      imageVariants: card.thumbnailVariants ? { [card.thumbnail]: card.thumbnailVariants } : undefined
+    };
+  }
+
   function loadCart() {
     try {
       return JSON.parse(localStorage.getItem(CART_KEY) || '[]');
@@ -150,6 +167,8 @@
     modal.classList.remove('hidden');
     modal.classList.add('flex');
     document.getElementById('searchInput').focus();
+    // Fetch the search index while the visitor types
+    window.preloadSearch();
   };
 
   window.closeSearch = function() {
@@ -191,9 +210,26 @@
     }, 300);
   };
   
-  function performSearch(query, resultsDiv) {
+  async function performSearch(query, resultsDiv) {
+    let results;
+    try {
+      // Full-text index written by the admin (search.js): covers descriptions,
+      // colors and attributes, which the listing cards leave out
+      const byId = new Map(products.map(p => [p.id, p]));
+      results = (await window.searchProducts(query, 50))
+        .filter(hit => hit.available)
+        .slice(0, 12)
+        .map(hit => byId.get(hit.id) || { ...hit, sku: '', images: hit.thumbnail ? [hit.thumbnail] : [] });
+    } catch (error) {
+      console.warn('Search index unavailable, matching product cards instead:', error);
+      results = scoreProducts(query);
+    }
+    renderSearchResults(query, results, resultsDiv);
+  }
+
+  function scoreProducts(query) {
     // Smart search with relevance scoring
-    const results = products
+    return products
       .filter(p => p.available !== false)
       .map(product => {
         let score = 0;
@@ -219,7 +255,9 @@
       .sort((a, b) => b.score - a.score)
       .slice(0, 12)
       .map(item => item.product);
-    
+  }
+
+  function renderSearchResults(query, results, resultsDiv) {
     if (results.length === 0) {
       resultsDiv.innerHTML = `
         <div class="text-center py-12">
@@ -264,7 +302,7 @@
 
   async function loadStore() {
     try {
-      const response = await fetch('data/store.json', { cache: 'no-cache' });
+      const response = await fetchData('store.json');
       store = await response.json();
       
       document.getElementById('storeName').textContent = store.name;
@@ -296,7 +334,7 @@
 
   async function loadCategories() {
     try {
-      const response = await fetch('data/categories.json', { cache: 'no-cache' });
+      const response = await fetchData('categories.json');
       categories = await response.json();
       
       const nav = document.getElementById('navCategories');
@@ -346,8 +384,14 @@
 
   async function loadProducts() {
     try {
-      const response = await fetch('data/products.json', { cache: 'no-cache' });
-      products = await response.json();
+      // Slim listing index, falling back to the full catalog
+      let response = await fetchData('catalog/index.json');
+      if (response.ok) {
+        products = (await response.json()).map(fromCard);
+      } else {
+        response = await fetchData('products.json');
+        products = await response.json();
+      }
       renderProducts();
       renderRecommended();
     } catch (error) {
@@ -366,7 +410,7 @@
     grid.innerHTML = filtered.slice(0, 8).map(product => `
       <div class="group flex flex-col h-full">
         <div class="aspect-square w-full overflow-hidden rounded-lg bg-gray-200 mb-4 cursor-pointer" onclick="window.location.href='product.html?slug=${product.slug}'">
-          <img alt="${product.title}" class="h-full w-full object-cover object-center group-hover:opacity-75 transition" src="${product.images?.[0] || ''}"/>
+          <img alt="${product.title}" class="h-full w-full object-cover object-center group-hover:opacity-75 transition" src="${product.images?.[0] || ''}" ${imageSrcset(product)}/>
         </div>
         <div class="flex flex-col flex-grow">
           <h3 class="text-base font-semibold text-black dark:text-white cursor-pointer hover:text-primary line-clamp-2 min-h-[3rem]" onclick="window.location.href='product.html?slug=${product.slug}'">${product.title}</h3>
@@ -386,7 +430,7 @@
     grid.innerHTML = recommended.map(product => `
       <div class="group flex flex-col h-full">
         <div class="aspect-square w-full overflow-hidden rounded-lg bg-gray-200 mb-4 cursor-pointer" onclick="window.location.href='product.html?slug=${product.slug}'">
-          <img alt="${product.title}" class="h-full w-full object-cover object-center group-hover:opacity-75 transition" src="${product.images?.[0] || ''}"/>
+          <img alt="${product.title}" class="h-full w-full object-cover object-center group-hover:opacity-75 transition" src="${product.images?.[0] || ''}" ${imageSrcset(product)}/>
         </div>
         <div class="flex flex-col flex-grow">
           <h3 class="text-base font-semibold text-black dark:text-white cursor-pointer hover:text-primary line-clamp-2 min-h-[3rem]" onclick="window.location.href='product.html?slug=${product.slug}'">${product.title}</h3>
@@ -401,7 +445,7 @@
 
   async function loadNews() {
     try {
-      const response = await fetch('data/news.json', { cache: 'no-cache' });
+      const response = await fetchData('news.json');
       const news = await response.json();
       
       const activeNews = news.filter(n => n.active);
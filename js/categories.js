@@ -6,7 +6,7 @@ let allProducts = [];
 // Load store configuration
 async function loadStoreConfig() {
   try {
-    const response = await fetch('data/store.json', { cache: 'no-cache' });
+    const response = await fetchData('store.json');
     const config = await response.json();
     
     document.getElementById('storeName').textContent = config.name || 'My Shop';
@@ -22,10 +22,13 @@ async function loadStoreConfig() {
   }
 }
 
-// Load all products to count per category
+// Load all products to count per category (the slim listing index is enough)
 async function loadProducts() {
   try {
-    const response = await fetch('data/products.json', { cache: 'no-cache' });
+    let response = await fetchData('catalog/index.json');
+    if (!response.ok) {
+      response = await fetchData('products.json');
+    }
     allProducts = await response.json();
   } catch (error) {
     console.error('Error loading products:', error);
@@ -47,7 +50,7 @@ async function loadCategories() {
     await loadProducts();
     
     // Load categories
-    const response = await fetch('data/categories.json', { cache: 'no-cache' });
+    const response = await fetchData('categories.json');
     const categoriesData = await response.json();
     
     allCategories = categoriesData
@@ -202,6 +205,8 @@ function openSearch() {
     modal.classList.remove('hidden');
     modal.classList.add('flex');
     document.getElementById('searchInput').focus();
+    // Fetch the search index while the visitor types
+    window.preloadSearch();
   }
 }
 
@@ -215,6 +220,42 @@ function closeSearch() {
   }
 }
 
+// Full-text index written by the admin (search.js): covers descriptions,
+// colors and attributes, without downloading every product
+async function findProducts(query) {
+  try {
+    const hits = (await window.searchProducts(query, 50)).filter(hit => hit.available).slice(0, 12);
+    return hits.map(hit => ({ ...hit, images: hit.thumbnail ? [hit.thumbnail] : [] }));
+  } catch (error) {
+    console.warn('Search index unavailable, searching products.json instead:', error);
+  }
+  const response = await fetchData('products.json');
+  const products = await response.json();
+  
+  // Smart search with scoring
+  return products
+    .filter(p => p.available !== false)
+    .map(product => {
+      let score = 0;
+      const title = product.title.toLowerCase();
+      const desc = (product.description || '').toLowerCase();
+      const shortDesc = (product.shortDescription || '').toLowerCase();
+      const tags = (product.tags || []).map(t => t.toLowerCase());
+      
+      if (title === query) score += 100;
+      else if (title.includes(query)) score += 50;
+      if (shortDesc.includes(query)) score += 20;
+      if (desc.includes(query)) score += 10;
+      if (tags.some(tag => tag.includes(query))) score += 25;
+      
+      return { product, score };
+    })
+    .filter(item => item.score > 0)
+    .sort((a, b) => b.score - a.score)
+    .slice(0, 12)
+    .map(item => item.product);
+}
+
 async function handleSearch() {
   const query = document.getElementById('searchInput').value.toLowerCase().trim();
   const resultsDiv = document.getElementById('searchResults');
@@ -239,31 +280,7 @@ async function handleSearch() {
   `;
   
   try {
-    const response = await fetch('data/products.json', { cache: 'no-cache' });
-    const products = await response.json();
-    
-    // Smart search with scoring
-    const results = products
-      .filter(p => p.available !== false)
-      .map(product => {
-        let score = 0;
-        const title = product.title.toLowerCase();
-        const desc = (product.description || '').toLowerCase();
-        const shortDesc = (product.shortDescription || '').toLowerCase();
-        const tags = (product.tags || []).map(t => t.toLowerCase());
-        
-        if (title === query) score += 100;
-        else if (title.includes(query)) score += 50;
-        if (shortDesc.includes(query)) score += 20;
-        if (desc.includes(query)) score += 10;
-        if (tags.some(tag => tag.includes(query))) score += 25;
-        
-        return { product, score };
-      })
-      .filter(item => item.score > 0)
-      .sort((a, b) => b.score - a.score)
-      .slice(0, 12)
-      .map(item => item.product);
+    const results = await findProducts(query);
     
     if (results.length === 0) {
       resultsDiv.innerHTML = `
@@ -297,7 +314,7 @@ async function handleSearch() {
               <p class="text-xs text-black/50 dark:text-white/50 line-clamp-1 mt-1">${product.shortDescription || ''}</p>
               <div class="mt-auto flex items-center justify-between">
                 <p class="text-primary font-bold">₹${product.price?.toFixed(2) || '0.00'}</p>
-                ${product.stock > 0 ? '<span class="text-xs text-green-600 font-medium">In Stock</span>' : '<span class="text-xs text-red-600 font-medium">Out</span>'}
+                ${(product.stock ?? (product.available ? 1 : 0)) > 0 ? '<span class="text-xs text-green-600 font-medium">In Stock</span>' : '<span class="text-xs text-red-600 font-medium">Out</span>'}
               </div>
             </div>
           </div>
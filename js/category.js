@@ -13,6 +13,23 @@
     return `₹${n.toFixed(2)}`;
   }
 
+  // Responsive srcset from the admin-generated imageVariants manifest
+  function imageSrcset(product) {
+    const manifest = product.imageVariants?.[product.images?.[0]];
+    const entries = manifest?.webp || [];
+    return entries.length ? `srcset="${entries.map(e => `${e.src} ${e.width}w`).join(', ')}" sizes="(min-width: 1024px) 25vw, 50vw"` : '';
+  }
+
+  // Catalog listing entries carry only the first image; give them the
+  // product fields the card templates read
+  function fromCard(card) {
+    return {
+      ...card,
+      images: card.thumbnail ? [card.thumbnail] : [],
+      imageVariants: card.thumbnailVariants ? { [card.thumbnail]: card.thumbnailVariants } : undefined
+    };
+  }
+
   function loadCart() {
     try {
       return JSON.parse(localStorage.getItem(CART_KEY) || '[]');
@@ -161,7 +178,7 @@
 
   async function loadStore() {
     try {
-      const response = await fetch('data/store.json', { cache: 'no-cache' });
+      const response = await fetchData('store.json');
       store = await response.json();
       
       document.getElementById('storeName').textContent = store.name;
@@ -182,11 +199,11 @@
 
   async function loadCategories() {
     try {
-      const response = await fetch('data/categories.json', { cache: 'no-cache' });
+      const response = await fetchData('categories.json');
       categories = await response.json();
       
       // Load subcategories
-      const subcatResponse = await fetch('data/subcategories.json', { cache: 'no-cache' });
+      const subcatResponse = await fetchData('subcategories.json');
       subcategories = await subcatResponse.json();
       
       // Get category from URL
@@ -389,8 +406,16 @@
 
   async function loadProducts() {
     try {
-      const response = await fetch('data/products.json', { cache: 'no-cache' });
-      products = await response.json();
+      // Only this category's shard, falling back to the full catalog
+      let response = currentCategory
+        ? await fetch(`data/catalog/categories/${currentCategory.id}.json`, { cache: 'no-cache' })
+        : null;
+      if (response && response.ok) {
+        products = (await response.json()).map(fromCard);
+      } else {
+        response = await fetchData('products.json');
+        products = await response.json();
+      }
       renderProducts();
     } catch (error) {
       console.error('Error loading products:', error);
@@ -456,7 +481,7 @@
         <div class="aspect-square w-full overflow-hidden rounded-lg bg-stone-200 dark:bg-stone-800 relative cursor-pointer" onclick="window.location.href='product.html?slug=${product.slug}'">
           <img alt="${product.title}" 
                class="h-full w-full object-cover object-center group-hover:opacity-80 transition-opacity" 
-               src="${product.images?.[0] || 'https://via.placeholder.com/400?text=' + encodeURIComponent(product.title)}"/>
+               src="${product.images?.[0] || 'https://via.placeholder.com/400?text=' + encodeURIComponent(product.title)}" ${imageSrcset(product)}/>
           ${product.stock <= 0 ? '<div class="absolute inset-0 bg-black/50 flex items-center justify-center"><span class="text-white font-bold text-sm">Out of Stock</span></div>' : ''}
         </div>
         <div class="mt-4 flex flex-col flex-grow">
@@ -488,6 +513,8 @@
     modal.classList.remove('hidden');
     modal.classList.add('flex');
     document.getElementById('searchInput').focus();
+    // Fetch the search index while the visitor types
+    window.preloadSearch();
   };
 
   window.closeSearch = function() {
@@ -498,16 +525,31 @@
     document.getElementById('searchResults').innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">Start typing to search products...</div>';
   };
 
-  window.handleSearch = function() {
-    const query = document.getElementById('searchInput').value.toLowerCase().trim();
-    const resultsDiv = document.getElementById('searchResults');
-    
-    if (!query) {
-      resultsDiv.innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">Start typing to search products...</div>';
-      return;
+  // Search covers the whole catalog, not just this category's shard
+  let catalogCards = null;
+  async function loadSearchProducts() {
+    if (!catalogCards) {
+      const response = await fetchData('catalog/index.json');
+      if (response.ok) {
+        catalogCards = (await response.json()).map(fromCard);
+      } else {
+        catalogCards = await (await fetchData('products.json')).json();
+      }
     }
-    
-    const results = products.filter(p => 
+    return catalogCards;
+  }
+
+  async function findProducts(query) {
+    try {
+      // Full-text index written by the admin (search.js): covers descriptions,
+      // colors and attributes, which the listing cards leave out
+      const hits = (await window.searchProducts(query, 50)).filter(hit => hit.available).slice(0, 10);
+      const byId = new Map((catalogCards || products).map(p => [p.id, p]));
+      return hits.map(hit => byId.get(hit.id) || { ...hit, images: hit.thumbnail ? [hit.thumbnail] : [] });
+    } catch (error) {
+      console.warn('Search index unavailable, matching product cards instead:', error);
+    }
+    return (await loadSearchProducts()).filter(p => 
       p.available !== false && (
         p.title.toLowerCase().includes(query) ||
         p.description?.toLowerCase().includes(query) ||
@@ -516,6 +558,18 @@
         p.sku.toLowerCase().includes(query)
       )
     ).slice(0, 10);
+  }
+
+  window.handleSearch = async function() {
+    const query = document.getElementById('searchInput').value.toLowerCase().trim();
+    const resultsDiv = document.getElementById('searchResults');
+    
+    if (!query) {
+      resultsDiv.innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">Start typing to search products...</div>';
+      return;
+    }
+    
+    const results = await findProducts(query);
     
     if (results.length === 0) {
       resultsDiv.innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">No products found</div>';
@@ -0,0 +1,29 @@
+// data.js - Loads storefront data through the admin-generated manifest of
+// content-hashed copies (dist/data/*), which browsers can cache for good.
+// Falls back to the plain data/ files if there is no manifest.
+(function() {
+  let manifest = null;
+
+  function loadManifest() {
+    if (!manifest) {
+      manifest = fetch('data/data-manifest.json', { cache: 'no-store' })
+        .then(response => (response.ok ? response.json() : {}))
+        .catch(() => ({}));
+    }
+    return manifest;
+  }
+
+  // fetchData('products.json') resolves to a Response like fetch() does
+  window.fetchData = async function(name) {
+    const files = await loadManifest();
+    if (files[name]) {
+      try {
+        const response = await fetch(files[name]);
+        if (response.ok) return response;
+      } catch (error) {
+        console.warn(`Hashed copy of ${name} unavailable, using data/${name}`, error);
+      }
+    }
+    return fetch(`data/${name}`, { cache: 'no-cache' });
+  };
+})();
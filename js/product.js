@@ -265,6 +265,8 @@
     modal.classList.remove('hidden');
     modal.classList.add('flex');
     document.getElementById('searchInput').focus();
+    // Fetch the search index while the visitor types
+    window.preloadSearch();
   };
 
   window.closeSearch = function() {
@@ -275,16 +277,17 @@
     document.getElementById('searchResults').innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">Start typing to search products...</div>';
   };
 
-  window.handleSearch = function() {
-    const query = document.getElementById('searchInput').value.toLowerCase().trim();
-    const resultsDiv = document.getElementById('searchResults');
-    
-    if (!query) {
-      resultsDiv.innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">Start typing to search products...</div>';
-      return;
+  async function findProducts(query) {
+    try {
+      // Full-text index written by the admin (search.js): ranked, and
+      // tolerant of prefixes and typos
+      const hits = (await window.searchProducts(query, 50)).filter(hit => hit.available).slice(0, 10);
+      const byId = new Map(products.map(p => [p.id, p]));
+      return hits.map(hit => byId.get(hit.id) || { ...hit, images: hit.thumbnail ? [hit.thumbnail] : [] });
+    } catch (error) {
+      console.warn('Search index unavailable, matching loaded products instead:', error);
     }
-    
-    const results = products.filter(p => 
+    return products.filter(p => 
       p.available !== false && (
         p.title.toLowerCase().includes(query) ||
         p.description?.toLowerCase().includes(query) ||
@@ -293,6 +296,18 @@
         p.sku.toLowerCase().includes(query)
       )
     ).slice(0, 10);
+  }
+
+  window.handleSearch = async function() {
+    const query = document.getElementById('searchInput').value.toLowerCase().trim();
+    const resultsDiv = document.getElementById('searchResults');
+    
+    if (!query) {
+      resultsDiv.innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">Start typing to search products...</div>';
+      return;
+    }
+    
+    const results = await findProducts(query);
     
     if (results.length === 0) {
       resultsDiv.innerHTML = '<div class="text-center py-12 text-black/40 dark:text-white/40">No products found</div>';
@@ -332,7 +347,7 @@
 
   async function loadStore() {
     try {
-      const response = await fetch('data/store.json', { cache: 'no-cache' });
+      const response = await fetchData('store.json');
       store = await response.json();
       
       document.getElementById('storeName').textContent = store.name;
@@ -349,7 +364,7 @@
 
   async function loadCategories() {
     try {
-      const response = await fetch('data/categories.json', { cache: 'no-cache' });
+      const response = await fetchData('categories.json');
       categories = await response.json();
       
       const nav = document.getElementById('navCategories');
@@ -367,7 +382,7 @@
 
   async function loadProducts() {
     try {
-      const response = await fetch('data/products.json', { cache: 'no-cache' });
+      const response = await fetchData('products.json');
       products = await response.json();
     } catch (error) {
       console.error('Error loading products:', error);
@@ -0,0 +1,110 @@
+// search.js - Product search over the admin-generated data/search-index.json.
+// The index is only downloaded on the first search (or preloadSearch()), so
+// pages that never search don't pay for it. Matching mirrors the admin's
+// /api/search: every word must match an indexed word exactly, as a prefix,
+// or with one typo. Needs data.js for fetchData().
+(function() {
+  const EXACT = 1, PREFIX = 0.7, TYPO = 0.5;
+  const TYPO_MIN_LENGTH = 4;
+  const PREFIX_LIMIT = 50;
+  let index = null;
+
+  function loadIndex() {
+    if (!index) {
+      index = fetchData('search-index.json')
+        .then(response => (response.ok ? response.json() : null))
+        .then(data => {
+          if (!data || data.format !== 1) throw new Error('Search index unavailable');
+          data.sortedTerms = Object.keys(data.terms).sort();
+          return data;
+        })
+        .catch(error => {
+          index = null;
+          throw error;
+        });
+    }
+    return index;
+  }
+
+  function compare(a, b) {
+    return a < b ? -1 : a > b ? 1 : 0;
+  }
+
+  function tokenize(text) {
+    const words = String(text || '').toLowerCase().normalize('NFKD')
+      .replace(/[\u0300-\u036f]/g, '').match(/[a-z0-9]+/g) || [];
+    return words.filter(word => word.length > 1 || /^\d$/.test(word));
+  }
+
+  // Edit distance of at most one (insert, delete, substitute or swap)
+  function withinOneEdit(a, b) {
+    if (Math.abs(a.length - b.length) > 1) return false;
+    let i = 0;
+    while (i < a.length && i < b.length && a[i] === b[i]) i++;
+    if (a.length === b.length) {
+      if (a.slice(i + 1) === b.slice(i + 1)) return true;
+      return a[i] === b[i + 1] && a[i + 1] === b[i] && a.slice(i + 2) === b.slice(i + 2);
+    }
+    return a.length > b.length ? a.slice(i + 1) === b.slice(i) : a.slice(i) === b.slice(i + 1);
+  }
+
+  function expand(data, word) {
+    const matches = new Map();
+    const terms = data.sortedTerms;
+    let low = 0, high = terms.length;
+    while (low < high) {
+      const mid = (low + high) >> 1;
+      if (terms[mid] < word) low = mid + 1; else high = mid;
+    }
+    for (let i = low; i < terms.length && i < low + PREFIX_LIMIT && terms[i].startsWith(word); i++) {
+      matches.set(terms[i], terms[i] === word ? EXACT : PREFIX);
+    }
+    if (word.length >= TYPO_MIN_LENGTH) {
+      for (const term of terms) {
+        if (!matches.has(term) && term.length >= TYPO_MIN_LENGTH && withinOneEdit(word, term)) {
+          matches.set(term, TYPO);
+        }
+      }
+    }
+    return matches;
+  }
+
+  // searchProducts('velvet scrunchie') resolves to
+  // [{id, slug, title, thumbnail, price, available, score}, ...], best first
+  window.searchProducts = async function(query, limit = 20) {
+    const data = await loadIndex();
+    let scores = null;
+    for (const word of new Set(tokenize(query))) {
+      const wordScores = new Map();
+      for (const [term, quality] of expand(data, word)) {
+        const postings = data.terms[term];
+        for (let i = 0; i < postings.length; i += 2) {
+          const score = postings[i + 1] * quality;
+          if ((wordScores.get(postings[i]) || 0) < score) wordScores.set(postings[i], score);
+        }
+      }
+      if (scores === null) {
+        scores = wordScores;
+      } else {
+        for (const [doc, total] of scores) {
+          if (wordScores.has(doc)) scores.set(doc, total + wordScores.get(doc));
+          else scores.delete(doc);
+        }
+      }
+      if (!scores.size) return [];
+    }
+    if (!scores) return [];
+    return [...scores]
+      .map(([doc, score]) => {
+        const [id, slug, title, thumbnail, price, available] = data.docs[doc];
+        return { id, slug, title, thumbnail, price, available: !!available, score };
+      })
+      .sort((a, b) => b.score - a.score || compare(a.title.toLowerCase(), b.title.toLowerCase()) || compare(a.id, b.id))
+      .slice(0, limit);
+  };
+
+  // Start the download early, e.g. when a search box gets focus
+  window.preloadSearch = function() {
+    loadIndex().catch(() => {});
+  };
+})();
@@ -0,0 +1,267 @@
+"""
+Analytics dashboard aggregates, maintained incrementally as products are saved
+"""
+import bisect
+import heapq
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+import columnar
+import orders
+import utils
+
+# Admin state file holding the aggregates
+STATE_FILE = 'analytics.json'
+# Entries shown in the dashboard lists
+TOP_LIMIT = 5
+# Ranked entries tracked, so a few deletions don't force a rebuild
+TOP_KEEP = 20
+# Products at or below this stock level are listed as inventory alerts
+LOW_STOCK = 10
+
+def _value(product: Dict) -> float:
+    return product.get('price', 0) * product.get('stock', 0)
+
+def _top_entry(product: Dict) -> Dict:
+    category_ids = product.get('categoryIds') or []
+    return {
+        'id': product.get('id'),
+        'title': product.get('title', 'Unknown'),
+        'categoryId': category_ids[0] if category_ids else None,
+        'value': _value(product),
+        'stock': product.get('stock', 0)
+    }
+
+def _recent_entry(product: Dict) -> Dict:
+    return {
+        'id': product.get('id'),
+        'title': product.get('title', 'Unknown'),
+        'stock': product.get('stock', 0),
+        'price': product.get('price', 0),
+        'updatedAt': product.get('updatedAt', '')
+    }
+
+def rebuild() -> Dict[str, Any]:
+    """
+    Recompute every aggregate from products.json and store the result.
+    
+    Returns:
+        The aggregate state
+    """
+    # Holding the products lock keeps the snapshot and its version consistent
+    with utils.file_lock('products.json'), utils.file_lock(STATE_FILE):
+        version = utils.get_data_version('products.json')
+        products = utils.get_all_products()
+        columns = columnar.get_columns(products)
+        state = {'version': version}
+        state.update(_columnar_state(products, columns) if columns is not None else _walk_state(products))
+        utils.write_state_file(STATE_FILE, state)
+    return state
+
+def _walk_state(products: List[Dict]) -> Dict[str, Any]:
+    """Compute the aggregates product by product"""
+    state = {
+        'totals': {'products': 0, 'stock': 0, 'value': 0},
+        'categories': {},
+        'lowStock': {},
+        'top': [_top_entry(p) for p in heapq.nlargest(TOP_KEEP, products, key=_value)],
+        'recent': [_recent_entry(p) for p in
+                   heapq.nlargest(TOP_KEEP, products, key=lambda p: p.get('updatedAt', ''))]
+    }
+    for product in products:
+        _add(state, product, 1)
+    return state
+
+def _columnar_state(products: List[Dict], columns: columnar.ProductColumns) -> Dict[str, Any]:
+    """Compute the same aggregates as _walk_state with vectorized column operations"""
+    count, stock, value = columns.totals()
+    low_stock = {}
+    for i in columns.at_most(LOW_STOCK):
+        product = products[i]
+        low_stock[product.get('id')] = {'title': product.get('title', 'Unknown'), 'stock': product.get('stock', 0)}
+    return {
+        'totals': {'products': count, 'stock': stock, 'value': value},
+        'categories': columns.category_totals(),
+        'lowStock': low_stock,
+        'top': [_top_entry(products[i]) for i in columns.top(TOP_KEEP, 'value')],
+        'recent': [_recent_entry(products[i]) for i in columns.top(TOP_KEEP, 'updatedAt')]
+    }
+
+def _add(state: Dict, product: Dict, sign: int) -> None:
+    """Add (sign=1) or subtract (sign=-1) a product's contribution to the sums"""
+    value, stock = _value(product), product.get('stock', 0)
+    totals = state['totals']
+    totals['products'] += sign
+    totals['stock'] += sign * stock
+    totals['value'] = round(totals['value'] + sign * value, 2)
+    categories = state['categories']
+    for category_id in product.get('categoryIds') or []:
+        stats = categories.setdefault(category_id, {'products': 0, 'stock': 0, 'value': 0})
+        stats['products'] += sign
+        stats['stock'] += sign * stock
+        stats['value'] = round(stats['value'] + sign * value, 2)
+        if stats['products'] <= 0:
+            del categories[category_id]
+    if sign < 0:
+        state['lowStock'].pop(product.get('id'), None)
+    elif stock <= LOW_STOCK:
+        state['lowStock'][product.get('id')] = {'title': product.get('title', 'Unknown'), 'stock': stock}
+
+def _rank(ranked: List[Dict], product_id: str, entry: Optional[Dict], key: str, total: int) -> None:
+    """
+    Move a product within a list holding the exact top len(ranked) products.
+    
+    Every unlisted product ranks at or below the last listed one, so the new
+    entry only belongs in the list if it ties or beats that entry, or if the
+    list already holds every other product. The list can shrink; callers
+    rebuild once it gets shorter than what the dashboard shows.
+    """
+    ranked[:] = [e for e in ranked if e['id'] != product_id]
+    if entry is None:
+        return
+    if (ranked and entry[key] >= ranked[-1][key]) or len(ranked) >= total - 1:
+        keys = [-e[key] if key == 'value' else e[key] for e in ranked]
+        if key == 'value':
+            position = bisect.bisect_right(keys, -entry[key])
+        else:
+            # updatedAt strings sort ascending; the list is newest first
+            position = len(keys) - bisect.bisect_left(keys[::-1], entry[key])
+        ranked.insert(position, entry)
+        del ranked[TOP_KEEP:]
+
+def _apply(state: Dict, old: Optional[Dict], new: Optional[Dict]) -> bool:
+    """
+    Apply one saved or deleted product to the aggregates.
+    
+    Returns:
+        False if a ranked list ran short and the aggregates need a rebuild
+    """
+    if old is not None:
+        _add(state, old, -1)
+    if new is not None:
+        _add(state, new, 1)
+    product_id = (new or old).get('id')
+    total = state['totals']['products']
+    _rank(state['top'], product_id, _top_entry(new) if new else None, 'value', total)
+    _rank(state['recent'], product_id, _recent_entry(new) if new else None, 'updatedAt', total)
+    needed = min(TOP_LIMIT, total)
+    return len(state['top']) >= needed and len(state['recent']) >= needed
+
+def _on_products_saved(changes: utils.RecordChanges, before_version: str, after_version: str) -> None:
+    with utils.file_lock(STATE_FILE):
+        state = utils.read_state_file(STATE_FILE, None)
+        if not state or state.get('version') != before_version:
+            # Missed a write; the next read rebuilds
+            return
+        for old, new in changes:
+            if not _apply(state, old, new):
+                return
+        state['version'] = after_version
+        utils.write_state_file(STATE_FILE, state)
+
+utils.register_record_listener('products.json', _on_products_saved)
+
+def get_aggregates() -> Dict[str, Any]:
+    """Get the stored aggregates, rebuilding them if products.json changed behind their back"""
+    state = utils.read_state_file(STATE_FILE, None)
+    if not state or state.get('version') != utils.get_data_version('products.json'):
+        state = rebuild()
+    return state
+
+def get_analytics_data() -> Dict:
+    """
+    Get comprehensive analytics data for the analytics dashboard.
+    
+    Returns:
+        Dictionary containing all analytics metrics
+    """
+    state = get_aggregates()
+    category_lookup = {cat['id']: cat['name'] for cat in utils.get_all_categories()}
+
+    # Inventory value
+    total_inventory_value = state['totals']['value']
+
+    # Orders of the last 30 days, from the order rollups
+    sales = orders.get_dashboard(days=30)
+
+    # Category performance, sorted by revenue
+    sorted_categories = sorted(
+        [{'name': category_lookup[k], 'revenue': f"{v['value']:.2f}", 'percentage': (v['value'] / total_inventory_value * 100) if total_inventory_value > 0 else 0}
+         for k, v in state['categories'].items() if k in category_lookup],
+        key=lambda x: float(x['revenue']),
+        reverse=True
+    )
+
+    # Top products by potential value
+    top_products_data = [
+        {
+            'title': p['title'],
+            'category': category_lookup.get(p['categoryId'], 'Uncategorized') if p['categoryId'] else 'Uncategorized',
+            'revenue': f"{p['value']:.2f}",
+            'sales': p['stock']
+        }
+        for p in state['top'][:TOP_LIMIT]
+    ]
+
+    # Inventory alerts, out-of-stock products first
+    inventory_alerts = []
+    for product in heapq.nsmallest(TOP_LIMIT, state['lowStock'].values(), key=lambda p: (p['stock'], p['title'])):
+        if product['stock'] == 0:
+            inventory_alerts.append({
+                'product': product['title'],
+                'stock': product['stock'],
+                'type': 'alert',
+                'message': 'Out of stock! Reorder immediately.'
+            })
+        else:
+            inventory_alerts.append({
+                'product': product['title'],
+                'stock': product['stock'],
+                'type': 'warning',
+                'message': 'Low stock! Consider reordering soon.'
+            })
+
+    # Recent activity (based on updatedAt timestamps)
+    recent_items = []
+    for product in state['recent'][:TOP_LIMIT]:
+        recent_items.append({
+            'type': 'product',
+            'icon': '🛍️',
+            'title': f"Product Updated: {product['title']}",
+            'description': f"Stock: {product['stock']} units, Price: ₹{product['price']}",
+            'time': utils.format_time_ago(product['updatedAt'])
+        })
+
+    def chart(counts: Dict[str, int]) -> Dict[str, List]:
+        return {'labels': [k.replace('-', ' ').title() for k in counts], 'data': list(counts.values())}
+
+    start, end = (datetime.strptime(d, '%Y-%m-%d') for d in sales['period'])
+    return {
+        # Overview Stats
+        'total_revenue': f"{sales['revenue']:.2f}",
+        'revenue_trend': sales['revenueTrend'],
+        'total_orders': sales['orders'],
+        'orders_trend': sales['ordersTrend'],
+        'total_customers': sales['customers'],
+        'customers_trend': sales['newCustomers'],
+        'products_sold': sales['units'],
+        'avg_order_value': f"{sales['avgOrderValue']:.2f}",
+        'period_text': f"{start:%B} {start.day} - {end:%B} {end.day}, {end.year}",
+        'inventory_value': f"{total_inventory_value:.2f}",
+
+        # Charts Data
+        'revenue_chart': sales['revenueByDay'],
+        'source_chart': chart(sales['source']),
+        'order_status_chart': chart(sales['status']),
+        'payment_chart': chart(sales['payment']),
+
+        # Lists
+        'top_products': top_products_data,
+        'categories': sorted_categories,
+        'inventory_alerts': inventory_alerts,
+        'recent_activity': recent_items,
+
+        # Customer Insights
+        'repeat_customers': sales['repeatCustomers'],
+        'customer_lifetime_value': f"{sales['lifetimeValue']:.2f}",
+    }
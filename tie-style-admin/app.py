@@ -3,18 +3,31 @@ Tie-Style Admin Panel - Flask Application
 Main application file with all routes for managing the e-commerce store
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, Response
+from flask.json.provider import DefaultJSONProvider
 import os
-import json
-from datetime import datetime
+import csv
+import uuid
+import click
 import utils
-import sys
-import traceback
-try:
-    from git import Repo, GitCommandError
-except ImportError:
-    Repo = None
-    GitCommandError = Exception
+import aggregates
+import bulk
+import catalog
+import datafiles
+import http_cache
+import ids
+import images
+import jobs
+import listing
+import media
+import metrics
+import orders
+import profiling
+import publisher
+import records
+import search
+import storage
+import shutil
 try:
     from dotenv import load_dotenv
 except ImportError:
@@ -22,158 +35,63 @@ except ImportError:
         return False
 load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import FileStorage
+
+class CatalogJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes compact catalog records (see records) like plain dicts"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, (records.Record, records.ColorVariant, records.ColorVariants)):
+            return records.json_default(o)
+        return DefaultJSONProvider.default(o)
 
 app = Flask(__name__)
+app.json = CatalogJSONProvider(app)
 app.secret_key = 'tie-style-admin-secret-key-change-in-production'  # Change this in production!
+metrics.instrument(app)
+profiling.instrument(app)
 
 # --- PUBLISH TO GITHUB ENDPOINT ---
 @app.route('/publish', methods=['GET', 'POST'])
 def publish_to_github():
     """
-    Commit and push changes to GitHub repo using GitPython.
+    Queue a job that commits and pushes changes to the GitHub repo.
     Reads repo path, token, and repo URL from environment variables for security.
+    Returns the job ID straight away; poll /publish/status/<job_id> for progress.
+    Only files changed through the admin are staged unless ?full=1 is given.
     """
-    if Repo is None:
-        return jsonify({"ok": False, "error": "GitPython not installed"}), 500
-    repo_dir = os.getenv("REPO_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    token = os.getenv("GITHUB_TOKEN")
-    repo_url = os.getenv("GITHUB_REPO_URL")
-    branch = os.getenv("PUBLISH_BRANCH", "dev")
-    remote_name = os.getenv("REMOTE_NAME", "origin")
-    commit_message = request.args.get("message") or (request.json.get("message") if request.is_json else "Auto commit from Flask App")
-    if not token or not repo_url:
-        return jsonify({"ok": False, "error": "GITHUB_TOKEN and GITHUB_REPO_URL must be set in .env"}), 400
-    # Inject token into URL for HTTPS push
-    if repo_url.startswith("https://"):
-        at_idx = repo_url.find("//")
-        push_url = repo_url[:at_idx+2] + f"x-access-token:{token}@" + repo_url[at_idx+2:]
-    else:
-        push_url = repo_url
+    commit_message = request.args.get("message") or (request.json.get("message") if request.is_json else None) or publisher.DEFAULT_MESSAGE
     try:
-        # Check if .git directory exists
-        git_dir = os.path.join(repo_dir, '.git')
-        if not os.path.exists(git_dir):
-            return jsonify({
-                "ok": False, 
-                "error": f"Not a git repository: {repo_dir}. Make sure .git folder exists."
-            }), 400
-        
-        # Initialize repo and fix ownership issues
-        try:
-            repo = Repo(repo_dir)
-        except Exception as repo_error:
-            # Try to fix git ownership issue
-            try:
-                os.system(f'git config --global --add safe.directory "{repo_dir}"')
-                repo = Repo(repo_dir)
-            except:
-                return jsonify({
-                    "ok": False, 
-                    "error": f"Cannot access git repository. Try running: git config --global --add safe.directory \"{repo_dir}\""
-                }), 500
-        
-        # Check if there are any changes
-        changed_files = []
-        if repo.is_dirty(untracked_files=True):
-            changed_files = [item.a_path for item in repo.index.diff(None)] + repo.untracked_files
-        
-        # If no changes, return early
-        if not changed_files:
-            return jsonify({
-                "ok": True, 
-                "message": "ℹ️ No new changes to commit", 
-                "branch": branch,
-                "changes": []
-            })
-        
-        # Add and commit changes
-        repo.git.add(all=True)
-        commit_result = repo.index.commit(commit_message)
-        
-        # Temporarily set remote URL with token and push
-        remote = repo.remote(name=remote_name)
-        original_url = remote.url
-        
-        try:
-            remote.set_url(push_url)
-            
-            # Try to push with detailed error handling
-            try:
-                # First try normal push
-                push_info = remote.push(refspec=f"{branch}:{branch}")
-                
-                # Check if push was successful
-                if push_info and len(push_info) > 0:
-                    push_result = push_info[0]
-                    if push_result.flags & push_result.ERROR:
-                        # If error contains rejection, try FORCE PUSH
-                        if "rejected" in push_result.summary.lower() or "fetch first" in push_result.summary.lower():
-                            print(f"⚠️ Push rejected: {push_result.summary}")
-                            print(f"⚠️ Attempting FORCE PUSH to {branch}...")
-                            try:
-                                push_info = remote.push(refspec=f"{branch}:{branch}", force=True)
-                                print(f"✅ Successfully FORCE PUSHED to {branch}")
-                                # Continue to success response below
-                            except Exception as force_err:
-                                error_msg = f"Push rejected and force push failed: {str(force_err)}"
-                                remote.set_url(original_url)
-                                return jsonify({"ok": False, "error": error_msg}), 500
-                        else:
-                            error_msg = f"Push failed: {push_result.summary}"
-                            remote.set_url(original_url)
-                            return jsonify({"ok": False, "error": error_msg}), 500
-                    elif push_result.flags & push_result.REJECTED:
-                        # If rejected, try FORCE PUSH
-                        print(f"⚠️ Normal push rejected, attempting FORCE PUSH to {branch}...")
-                        try:
-                            push_info = remote.push(refspec=f"{branch}:{branch}", force=True)
-                            print(f"✅ Successfully FORCE PUSHED to {branch}")
-                            # Continue to success response below
-                        except Exception as force_err:
-                            error_msg = f"Push rejected and force push failed: {str(force_err)}"
-                            remote.set_url(original_url)
-                            return jsonify({"ok": False, "error": error_msg}), 500
-                
-            except GitCommandError as git_err:
-                remote.set_url(original_url)
-                error_msg = str(git_err)
-                
-                # Provide helpful error messages
-                if "Could not resolve host" in error_msg:
-                    error_msg = "❌ Cannot connect to GitHub. Check your internet connection."
-                elif "Authentication failed" in error_msg or "Invalid username or password" in error_msg:
-                    error_msg = "❌ GitHub authentication failed. Check your GITHUB_TOKEN in .env file."
-                elif "Repository not found" in error_msg:
-                    error_msg = "❌ Repository not found. Check GITHUB_REPO_URL in .env file."
-                elif "failed to push" in error_msg:
-                    error_msg = f"❌ Push failed: {error_msg}"
-                
-                return jsonify({"ok": False, "error": error_msg}), 500
-                
-            # Restore original URL
-            remote.set_url(original_url)
-            
-        except Exception as push_error:
-            # Make sure to restore original URL even if something goes wrong
-            try:
-                remote.set_url(original_url)
-            except:
-                pass
-            raise push_error
-        
+        job = publisher.start_publish(commit_message, full=request.args.get('full') == '1')
+    except publisher.PublishError as e:
+        return jsonify({"ok": False, "error": str(e)}), e.status
+    except jobs.JobActiveError as e:
         return jsonify({
-            "ok": True, 
-            "message": f"✅ Successfully Published to GitHub! ({len(changed_files)} files)", 
-            "branch": branch,
-            "commit": str(commit_result)[:8],
-            "changes": changed_files[:10]  # Show first 10 changed files
-        })
-    except GitCommandError as git_e:
-        traceback.print_exc(file=sys.stderr)
-        return jsonify({"ok": False, "error": f"Git error: {str(git_e)}"}), 500
-    except Exception as e:
-        traceback.print_exc(file=sys.stderr)
-        return jsonify({"ok": False, "error": f"Unexpected error: {str(e)}"}), 500
+            "ok": False,
+            "error": "A publish is already in progress",
+            "jobId": e.job['id'],
+            "statusUrl": url_for('publish_status', job_id=e.job['id'])
+        }), 409
+    return jsonify({
+        "ok": True,
+        "jobId": job['id'],
+        "status": job['status'],
+        "statusUrl": url_for('publish_status', job_id=job['id'])
+    }), 202
+
+@app.route('/publish/auto')
+def auto_publish_status():
+    """Auto-publish settings, pending changes and when they will be published"""
+    return jsonify(publisher.get_auto_publish_status())
+
+@app.route('/publish/status/<job_id>')
+def publish_status(job_id):
+    """Progress (current phase and per-phase timings) and outcome of a publish job"""
+    job = jobs.get_job(job_id)
+    if job is None or job['type'] != publisher.JOB_TYPE:
+        return jsonify({"ok": False, "error": "Publish job not found"}), 404
+    return jsonify(publisher.get_status(job))
 
 # Configuration - Use parent directory's assets and image folders
 PARENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -185,6 +103,7 @@ MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 app.config['ASSETS_FOLDER'] = ASSETS_FOLDER
 app.config['IMAGE_FOLDER'] = IMAGE_FOLDER
+app.add_template_filter(images.srcset, 'srcset')
 
 def allowed_file(filename):
     """Check if the uploaded file has an allowed extension"""
@@ -203,9 +122,15 @@ def delete_image_file(image_path):
     try:
         # Convert relative path to absolute path
         full_path = os.path.join(PARENT_DIR, image_path)
+        deleted = []
         if os.path.exists(full_path):
             os.remove(full_path)
+            deleted.append(image_path)
             print(f"Deleted image: {full_path}")
+        # Remove resized variants generated for it as well
+        deleted.extend(images.delete_variants(image_path))
+        utils.record_changes(deleted)
+        media.update_manifest(removed=[image_path])
     except Exception as e:
         print(f"Error deleting image {image_path}: {e}")
 
@@ -218,7 +143,7 @@ def save_uploaded_file(file, subfolder='', use_image_dir=False, custom_filename=
         subfolder: Optional subfolder within assets or image (e.g., 'products/scrunchies', 'categories')
         use_image_dir: If True, save to 'image/' folder, otherwise save to 'assets/' folder
         custom_filename: Optional custom filename (without extension, e.g., 'scrunchies')
-        
+    
     Returns:
         The relative path to the saved file (as it should appear in JSON), or None if save failed
     """
@@ -226,14 +151,11 @@ def save_uploaded_file(file, subfolder='', use_image_dir=False, custom_filename=
         original_filename = secure_filename(file.filename)
         _, ext = os.path.splitext(original_filename)
         
-        # Use custom filename if provided, otherwise use original with timestamp
+        # Use custom filename if provided, otherwise the original name
         if custom_filename:
-            filename = f"{secure_filename(custom_filename)}{ext}"
+            name = secure_filename(custom_filename)
         else:
-            # Add timestamp to filename to avoid conflicts
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             name, _ = os.path.splitext(original_filename)
-            filename = f"{name}_{timestamp}{ext}"
         
         # Choose base directory
         base_dir = IMAGE_FOLDER if use_image_dir else ASSETS_FOLDER
@@ -242,19 +164,188 @@ def save_uploaded_file(file, subfolder='', use_image_dir=False, custom_filename=
         upload_path = os.path.join(base_dir, subfolder)
         utils.ensure_directory_exists(upload_path)
         
-        # Save the file
-        filepath = os.path.join(upload_path, filename)
-        file.save(filepath)
+        # Save the file, then name it after a hash of its contents so a
+        # replaced image always gets a new URL and can be cached for good
+        tmp_path = os.path.join(upload_path, f".upload-{uuid.uuid4().hex}{ext}")
+        folder = subfolder.split('/')[0] or 'root'
+        with metrics.timed('tiestyle_upload_seconds', folder=folder):
+            file.save(tmp_path)
+            filename = media.fingerprinted_name(name, ext, media.file_digest(tmp_path))
+            os.replace(tmp_path, os.path.join(upload_path, filename))
+        metrics.inc('tiestyle_upload_bytes_total', os.path.getsize(os.path.join(upload_path, filename)), folder=folder)
         
         # Return the path as it should appear in JSON
         # For assets: "assets/products/scrunchies/filename.png"
         # For image: "image/news/filename.jpg"
         base_folder = 'image' if use_image_dir else 'assets'
         json_path = os.path.join(base_folder, subfolder, filename).replace('\\', '/')
+        utils.record_changes([json_path])
+        media.update_manifest(added=[json_path])
         
         return json_path
     return None
 
+@app.before_request
+def start_background_jobs():
+    """Start this worker's job pool on its first request, resuming jobs left over from a restart"""
+    jobs.ensure_started()
+    publisher.ensure_auto_publish()
+
+def is_stale_edit(record):
+    """
+    Check whether an edit form was rendered from an older version of a record.
+    
+    Edit forms carry the record's ETag in a hidden 'etag' field. Checking it
+    before any image files are touched avoids half-applied edits; the save
+    helpers check it again under the file lock.
+    """
+    submitted = request.form.get('etag')
+    return bool(submitted) and submitted != utils.record_etag(record)
+
+# ==================== BACKGROUND IMAGE JOBS ====================
+
+# Loader and saver for each record type an image job can update
+IMAGE_RECORDS = {
+    'product': ('products.json', utils.get_product_by_id, utils.save_product),
+    'category': ('categories.json', utils.get_category_by_id, utils.save_category),
+    'news': ('news.json', utils.get_news_by_id, utils.save_news)
+}
+IMAGES_PROCESSING = ' Images are being processed in the background.'
+
+def spool_uploads(entries):
+    """
+    Copy uploaded files to a new spool directory so a background job can save them.
+    
+    The request only has to stream the files to disk; moving them into place,
+    generating variants and updating the record happen in the 'attach_images' job.
+    
+    Args:
+        entries: (file, subfolder, use_image_dir, custom_filename) tuples, as for save_uploaded_file
+    
+    Returns:
+        Job payload part {'spoolDir': ..., 'uploads': [...]}, or None if no allowed file was uploaded
+    """
+    entries = [entry for entry in entries if entry[0] and allowed_file(entry[0].filename)]
+    if not entries:
+        return None
+    
+    spool_directory = jobs.spool_dir()
+    uploads = []
+    for index, (file, subfolder, use_image_dir, custom_filename) in enumerate(entries):
+        spool_path = os.path.join(spool_directory, f'{index}-{secure_filename(file.filename)}')
+        file.save(spool_path)
+        uploads.append({
+            'spool': spool_path,
+            'filename': file.filename,
+            'subfolder': subfolder,
+            'useImageDir': use_image_dir,
+            'customFilename': custom_filename
+        })
+    return {'spoolDir': spool_directory, 'uploads': uploads}
+
+def discard_spooled(spooled):
+    """Remove spooled uploads that will not be processed (e.g. the record could not be saved)"""
+    if spooled:
+        shutil.rmtree(spooled['spoolDir'], ignore_errors=True)
+
+def enqueue_image_job(spooled, record_type, record_id, field, replace=None, multiple=True):
+    """
+    Queue a job that saves spooled uploads and points a record's image field at them.
+    
+    Args:
+        spooled: Result of spool_uploads()
+        record_type: 'product', 'category', 'news' or 'store'
+        record_id: ID of the record (ignored for 'store')
+        field: Field to set (e.g., 'images', 'image', 'media', 'logo')
+        replace: Current images of the field, deleted once the record points at the new ones
+        multiple: Store a list of paths rather than a single path
+    
+    Returns:
+        The queued job, or None if there was nothing to process
+    """
+    if not spooled:
+        return None
+    payload = dict(spooled, record=record_type, recordId=record_id, field=field,
+                   replace=[path for path in (replace or []) if path], multiple=multiple)
+    return jobs.enqueue('attach_images', payload)
+
+def update_record_fields(record_type, record_id, changes):
+    """
+    Apply field changes to a record under its file lock (None values remove the field).
+    
+    Returns:
+        False if the record no longer exists
+    """
+    filename = IMAGE_RECORDS[record_type][0] if record_type != 'store' else 'store.json'
+    with utils.file_lock(filename):
+        if record_type == 'store':
+            record = utils.get_store_info()
+        else:
+            record = IMAGE_RECORDS[record_type][1](record_id)
+            if record is None:
+                return False
+        
+        for key, value in changes.items():
+            if value is None:
+                record.pop(key, None)
+            else:
+                record[key] = value
+        
+        if record_type == 'store':
+            saved = utils.save_store_info(record)
+        else:
+            saved = IMAGE_RECORDS[record_type][2](record, is_new=False)
+    if not saved:
+        raise RuntimeError(f"Could not save {filename}")
+    return True
+
+@jobs.handler('attach_images')
+def attach_images_job(job):
+    """Move spooled uploads into place, generate variants and update the record"""
+    payload = job['payload']
+    uploads = payload['uploads']
+    
+    jobs.report_progress(job, phase='save', done=0, total=len(uploads))
+    saved_paths = []
+    try:
+        for upload in uploads:
+            with open(upload['spool'], 'rb') as stream:
+                file = FileStorage(stream=stream, filename=upload['filename'])
+                image_path = save_uploaded_file(file, upload['subfolder'], use_image_dir=upload['useImageDir'],
+                                                custom_filename=upload['customFilename'])
+            if image_path:
+                saved_paths.append(image_path)
+            jobs.report_progress(job, done=len(saved_paths))
+        if not saved_paths:
+            raise RuntimeError("None of the uploaded files could be saved")
+        
+        changes = {payload['field']: saved_paths if payload.get('multiple', True) else saved_paths[0]}
+        if payload['record'] == 'product':
+            jobs.report_progress(job, phase='variants')
+            changes['imageVariants'] = images.build_image_variants(saved_paths) or None
+        
+        jobs.report_progress(job, phase='update')
+        updated = update_record_fields(payload['record'], payload.get('recordId'), changes)
+    except Exception:
+        # The record still points at its old images; drop the new files (an
+        # identical upload keeps the name of the image it replaces)
+        for image_path in saved_paths:
+            if image_path not in payload.get('replace', []):
+                delete_image_file(image_path)
+        raise
+    
+    if not updated:
+        # The record was deleted while the job was waiting
+        for image_path in set(saved_paths) | set(payload.get('replace', [])):
+            delete_image_file(image_path)
+        return {'images': [], 'skipped': 'record no longer exists'}
+    
+    # Only now that the record points at the new images are the old ones deleted
+    for old_image in payload.get('replace', []):
+        if old_image not in saved_paths:
+            delete_image_file(old_image)
+    return {'images': saved_paths}
+
 # ==================== DASHBOARD ====================
 
 @app.route('/')
@@ -267,15 +358,26 @@ def index():
 @app.route('/analytics')
 def analytics():
     """Analytics dashboard page"""
-    analytics_data = utils.get_analytics_data()
+    analytics_data = aggregates.get_analytics_data()
     return render_template('analytics.html', analytics=analytics_data)
 
 # ==================== PRODUCTS ====================
 
 @app.route('/products')
 def products():
-    """List all products"""
-    products = utils.get_all_products()
+    """
+    List products one page at a time.
+    
+    Query parameters: page or cursor, per_page, category, subcategory,
+    available, stock_min, stock_max, q and sort (see listing.parse_args).
+    """
+    options = listing.parse_args(request.args)
+    try:
+        page = listing.query_products(**options)
+    except ValueError as e:
+        flash(str(e), 'error')
+        options['cursor'] = None
+        page = listing.query_products(**options)
     categories = utils.get_all_categories()
     subcategories = utils.get_all_subcategories()
     
@@ -283,8 +385,19 @@ def products():
     category_lookup = {cat['id']: cat['name'] for cat in categories}
     subcategory_lookup = {subcat['id']: subcat['name'] for subcat in subcategories}
     
+    def page_url(**changes):
+        args = {k: v for k, v in request.args.items() if k not in ('page', 'cursor')}
+        args.update(changes)
+        return url_for('products', **args)
+    
     return render_template('products.html', 
-                         products=products, 
+                         products=page['items'], 
+                         listing=page,
+                         filters=options,
+                         sort_keys=[key for key in listing.SORT_KEYS if key],
+                         page_url=page_url,
+                         categories=categories,
+                         subcategories=subcategories,
                          category_lookup=category_lookup,
                          subcategory_lookup=subcategory_lookup)
 
@@ -292,27 +405,9 @@ def products():
 def add_product():
     """Add a new product"""
     if request.method == 'POST':
-        # Auto-generate Product ID
-        all_products = utils.get_all_products()
-        max_id_number = 0
-        for prod in all_products:
-            if prod['id'].startswith('prod-'):
-                try:
-                    num = int(prod['id'].split('-')[-1])
-                    max_id_number = max(max_id_number, num)
-                except:
-                    pass
-        new_id = f'prod-{str(max_id_number + 1).zfill(3)}'
-        
-        # Auto-generate SKU from title
+        # Auto-generate Product ID and SKU (from the title)
         title = request.form.get('title', '')
-        words = title.upper().split()
-        if len(words) >= 2:
-            sku = words[0][:4] + '-' + words[1][:3] + '-' + str(max_id_number + 1).zfill(3)
-        elif len(words) == 1:
-            sku = words[0][:7] + '-' + str(max_id_number + 1).zfill(3)
-        else:
-            sku = 'PROD-' + str(max_id_number + 1).zfill(3)
+        new_id, sku = ids.next_product(title)
         
         # Get form data
         product_data = {
@@ -370,10 +465,10 @@ def add_product():
         if colors:
             product_data['colors'] = colors
         
-        # Handle multiple image uploads (up to 6)
+        # Handle multiple image uploads (up to 6); they are saved by a background job
+        spooled = None
         if 'images' in request.files:
             files = request.files.getlist('images')
-            uploaded_images = []
             
             # Limit to 6 images
             files = files[:6]
@@ -381,30 +476,33 @@ def add_product():
             # Determine subfolder based on category
             category_slug = ''
             if product_data['subcategoryId']:
-                subcats = utils.get_all_subcategories()
-                for sc in subcats:
-                    if sc['id'] == product_data['subcategoryId']:
-                        category_slug = sc['slug']
-                        break
+                subcat = utils.get_subcategory_by_id(product_data['subcategoryId'])
+                if subcat:
+                    category_slug = subcat['slug']
             
             product_slug = product_data['slug']
             
+            entries = []
             for index, file in enumerate(files):
                 if file.filename:
                     # Save each image with numbered suffix
                     custom_filename = f'{product_slug}-{index+1}' if index > 0 else product_slug
-                    image_path = save_uploaded_file(file, f'products/{category_slug}', use_image_dir=False, custom_filename=custom_filename)
-                    if image_path:
-                        uploaded_images.append(image_path)
-            
-            if uploaded_images:
-                product_data['images'] = uploaded_images
+                    entries.append((file, f'products/{category_slug}', False, custom_filename))
+            spooled = spool_uploads(entries)
         
         # Save the product
-        if utils.save_product(product_data, is_new=True):
-            flash('Product added successfully!', 'success')
+        try:
+            saved = utils.save_product(product_data, is_new=True)
+        except utils.ConflictError as e:
+            discard_spooled(spooled)
+            flash(str(e), 'error')
+            return redirect(url_for('add_product'))
+        if saved:
+            job = enqueue_image_job(spooled, 'product', product_data['id'], 'images')
+            flash('Product added successfully!' + (IMAGES_PROCESSING if job else ''), 'success')
             return redirect(url_for('products'))
         else:
+            discard_spooled(spooled)
             flash('Error adding product.', 'error')
     
     # GET request - show the form
@@ -426,6 +524,11 @@ def edit_product(product_id):
         return redirect(url_for('products'))
     
     if request.method == 'POST':
+        if is_stale_edit(product):
+            flash('This product was changed by someone else since you opened it. Please apply your changes again.', 'error')
+            return redirect(url_for('edit_product', product_id=product_id))
+        etag = utils.record_etag(product)
+        
         # Update product data (keep original ID and SKU)
         product['title'] = request.form.get('title')
         product['slug'] = utils.generate_slug(request.form.get('title', ''))
@@ -488,48 +591,47 @@ def edit_product(product_id):
             if 'colors' in product:
                 del product['colors']
         
-        # Handle multiple image uploads (if new images provided)
+        # Handle multiple image uploads (if new images provided); the old images
+        # are replaced by a background job once the product is saved
+        spooled = None
         if 'images' in request.files:
             files = request.files.getlist('images')
             # Check if any file was actually selected
             if any(file.filename for file in files):
-                # Delete old images first
-                if product.get('images'):
-                    for old_image in product['images']:
-                        delete_image_file(old_image)
-                
                 # Determine subfolder based on category
                 category_slug = ''
                 if product['subcategoryId']:
-                    subcats = utils.get_all_subcategories()
-                    for sc in subcats:
-                        if sc['id'] == product['subcategoryId']:
-                            category_slug = sc['slug']
-                            break
+                    subcat = utils.get_subcategory_by_id(product['subcategoryId'])
+                    if subcat:
+                        category_slug = subcat['slug']
                 
                 # Upload new images (up to 6)
-                uploaded_images = []
                 product_slug = product['slug']
                 
                 # Limit to 6 images
                 files = files[:6]
                 
+                entries = []
                 for index, file in enumerate(files):
                     if file.filename:
                         # Save each image with numbered suffix
                         custom_filename = f'{product_slug}-{index+1}' if index > 0 else product_slug
-                        image_path = save_uploaded_file(file, f'products/{category_slug}', use_image_dir=False, custom_filename=custom_filename)
-                        if image_path:
-                            uploaded_images.append(image_path)
-                
-                if uploaded_images:
-                    product['images'] = uploaded_images
+                        entries.append((file, f'products/{category_slug}', False, custom_filename))
+                spooled = spool_uploads(entries)
         
         # Save the updated product
-        if utils.save_product(product, is_new=False):
-            flash('Product updated successfully!', 'success')
+        try:
+            saved = utils.save_product(product, is_new=False, expected_etag=etag)
+        except utils.ConflictError as e:
+            discard_spooled(spooled)
+            flash(str(e), 'error')
+            return redirect(url_for('edit_product', product_id=product_id))
+        if saved:
+            job = enqueue_image_job(spooled, 'product', product_id, 'images', replace=product.get('images'))
+            flash('Product updated successfully!' + (IMAGES_PROCESSING if job else ''), 'success')
             return redirect(url_for('products'))
         else:
+            discard_spooled(spooled)
             flash('Error updating product.', 'error')
     
     # GET request - show the form with existing data
@@ -539,6 +641,7 @@ def edit_product(product_id):
                          product=product, 
                          categories=categories,
                          subcategories=subcategories,
+                         etag=utils.record_etag(product),
                          mode='edit')
 
 @app.route('/products/delete/<product_id>', methods=['POST'])
@@ -561,6 +664,43 @@ def delete_product(product_id):
         flash('Product not found.', 'error')
     return redirect(url_for('products'))
 
+@app.route('/products/import', methods=['POST'])
+def import_products():
+    """
+    Bulk-create or update products from an uploaded CSV or JSON Lines file.
+    
+    Accepts a multipart upload in the 'file' field or a raw request body.
+    Query parameters: format=csv|jsonl (otherwise guessed from the file name),
+    dry_run=1 to validate without saving.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    try:
+        fmt = bulk.detect_format(upload.filename if upload else '',
+                                 upload.mimetype if upload else (request.mimetype or ''),
+                                 request.args.get('format'))
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    dry_run = request.args.get('dry_run') in ('1', 'true', 'yes')
+    try:
+        report = bulk.import_products(bulk.iter_rows(stream, fmt), dry_run=dry_run)
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'ok': False, 'error': f'Could not read {fmt} upload: {e}'}), 400
+    except utils.ConflictError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 409
+    return jsonify(report), (200 if report['ok'] else 500)
+
+@app.route('/products/export')
+def export_products():
+    """Download the whole catalog as CSV or JSON Lines (format=csv|jsonl), streamed row by row"""
+    fmt = (request.args.get('format') or 'csv').lower()
+    if fmt not in bulk.FORMATS:
+        return jsonify({'ok': False, 'error': f"Unsupported format '{fmt}'"}), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(bulk.export_products(fmt), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=products.{fmt}'
+    })
+
 # ==================== CATEGORIES ====================
 
 @app.route('/categories')
@@ -581,9 +721,7 @@ def add_category():
         if category_type == 'main':
             # Add main category
             # Auto-generate sequential category ID
-            categories = utils.get_all_categories()
-            existing_ids = [cat['id'] for cat in categories]
-            category_id = utils.generate_sequential_id('cat-', existing_ids)
+            category_id = ids.next_id(ids.CATEGORY_PREFIX)
             
             category_data = {
                 'id': category_id,
@@ -596,25 +734,21 @@ def add_category():
                 'active': request.form.get('active') == 'on'
             }
             
-            # Handle image upload
+            # Handle image upload (saved to assets/categories/ with the category slug as filename by a background job)
+            spooled = None
             if 'image' in request.files:
-                file = request.files['image']
-                if file.filename:
-                    # Save to assets/categories/ with category slug as filename
-                    category_slug = category_data['slug']
-                    image_path = save_uploaded_file(file, 'categories', use_image_dir=False, custom_filename=category_slug)
-                    if image_path:
-                        category_data['image'] = image_path
+                spooled = spool_uploads([(request.files['image'], 'categories', False, category_data['slug'])])
             
             if utils.save_category(category_data, is_new=True):
-                flash('Category added successfully!', 'success')
+                job = enqueue_image_job(spooled, 'category', category_id, 'image', multiple=False)
+                flash('Category added successfully!' + (IMAGES_PROCESSING if job else ''), 'success')
             else:
+                discard_spooled(spooled)
                 flash('Error adding category.', 'error')
         
         else:
             # Add subcategory
             # Auto-generate sequential subcategory ID
-            subcategories = utils.get_all_subcategories()
             parent_id = request.form.get('parentCategoryId')
             
             # Generate ID based on parent (e.g., subcat-scr-01 for scrunchies)
@@ -622,11 +756,9 @@ def add_category():
             if parent_id:
                 parent_cat = utils.get_category_by_id(parent_id)
                 if parent_cat:
-                    parent_slug = parent_cat['slug'][:3]  # First 3 chars of slug
+                    parent_slug = parent_cat['slug']
             
-            # Get existing subcategory IDs for this parent
-            existing_ids = [sc['id'] for sc in subcategories]
-            subcategory_id = utils.generate_sequential_id(f'subcat-{parent_slug}-', existing_ids)
+            subcategory_id = ids.next_id(ids.subcategory_prefix(parent_slug))
             
             subcategory_data = {
                 'id': subcategory_id,
@@ -661,14 +793,18 @@ def edit_category(category_id):
     
     if not is_main:
         # It's a subcategory
-        subcategories = utils.get_all_subcategories()
-        category = next((sc for sc in subcategories if sc['id'] == category_id), None)
+        category = utils.get_subcategory_by_id(category_id)
     
     if not category:
         flash('Category not found.', 'error')
         return redirect(url_for('categories'))
     
     if request.method == 'POST':
+        if is_stale_edit(category):
+            flash('This category was changed by someone else since you opened it. Please apply your changes again.', 'error')
+            return redirect(url_for('categories'))
+        etag = utils.record_etag(category)
+        
         if is_main:
             # Update main category
             old_image = category.get('image', '')
@@ -679,24 +815,21 @@ def edit_category(category_id):
             category['order'] = int(request.form.get('order', 1))
             category['active'] = request.form.get('active') == 'on'
             
-            # Handle image upload
+            # Handle image upload (a background job replaces the old image once the category is saved)
+            spooled = None
             if 'image' in request.files:
-                file = request.files['image']
-                if file.filename:
-                    # Delete old image if it exists
-                    if old_image:
-                        delete_image_file(old_image)
-                    
-                    # Save to assets/categories/ with category slug as filename
-                    category_slug = category['slug']
-                    image_path = save_uploaded_file(file, 'categories', use_image_dir=False, custom_filename=category_slug)
-                    if image_path:
-                        category['image'] = image_path
+                spooled = spool_uploads([(request.files['image'], 'categories', False, category['slug'])])
             
-            if utils.save_category(category, is_new=False):
-                flash('Category updated successfully!', 'success')
-            else:
-                flash('Error updating category.', 'error')
+            try:
+                if utils.save_category(category, is_new=False, expected_etag=etag):
+                    job = enqueue_image_job(spooled, 'category', category_id, 'image', replace=[old_image], multiple=False)
+                    flash('Category updated successfully!' + (IMAGES_PROCESSING if job else ''), 'success')
+                else:
+                    discard_spooled(spooled)
+                    flash('Error updating category.', 'error')
+            except utils.ConflictError as e:
+                discard_spooled(spooled)
+                flash(str(e), 'error')
         else:
             # Update subcategory
             category['name'] = request.form.get('name')
@@ -706,10 +839,13 @@ def edit_category(category_id):
             category['order'] = int(request.form.get('order', 1))
             category['active'] = request.form.get('active') == 'on'
             
-            if utils.save_subcategory(category, is_new=False):
-                flash('Subcategory updated successfully!', 'success')
-            else:
-                flash('Error updating subcategory.', 'error')
+            try:
+                if utils.save_subcategory(category, is_new=False, expected_etag=etag):
+                    flash('Subcategory updated successfully!', 'success')
+                else:
+                    flash('Error updating subcategory.', 'error')
+            except utils.ConflictError as e:
+                flash(str(e), 'error')
         
         return redirect(url_for('categories'))
     
@@ -719,6 +855,7 @@ def edit_category(category_id):
                          category=category,
                          categories=all_categories,
                          is_main=is_main,
+                         etag=utils.record_etag(category),
                          mode='edit')
 
 @app.route('/categories/delete/<category_id>', methods=['POST'])
@@ -737,8 +874,7 @@ def delete_category(category_id):
             flash('Error deleting category.', 'error')
     else:
         # Try subcategory
-        subcategories = utils.get_all_subcategories()
-        subcategory = next((sc for sc in subcategories if sc['id'] == category_id), None)
+        subcategory = utils.get_subcategory_by_id(category_id)
         if subcategory:
             # Subcategories don't have images, just delete
             if utils.delete_subcategory(category_id):
@@ -777,20 +913,17 @@ def add_news():
             }
         }
         
-        # Handle image upload
+        # Handle image upload (saved to image/news/ with the news slug as filename by a background job)
+        spooled = None
         if 'image' in request.files:
-            file = request.files['image']
-            if file.filename:
-                # Save to image/news/ with news slug as filename
-                news_slug = news_data['slug']
-                image_path = save_uploaded_file(file, 'news', use_image_dir=True, custom_filename=news_slug)
-                if image_path:
-                    news_data['media'] = [image_path]
+            spooled = spool_uploads([(request.files['image'], 'news', True, news_data['slug'])])
         
         if utils.save_news(news_data, is_new=True):
-            flash('News item added successfully!', 'success')
+            job = enqueue_image_job(spooled, 'news', news_data['id'], 'media')
+            flash('News item added successfully!' + (IMAGES_PROCESSING if job else ''), 'success')
             return redirect(url_for('news'))
         else:
+            discard_spooled(spooled)
             flash('Error adding news item.', 'error')
     
     # GET request
@@ -806,6 +939,11 @@ def edit_news(news_id):
         return redirect(url_for('news'))
     
     if request.method == 'POST':
+        if is_stale_edit(news_item):
+            flash('This news item was changed by someone else since you opened it. Please apply your changes again.', 'error')
+            return redirect(url_for('news'))
+        etag = utils.record_etag(news_item)
+        
         news_item['title'] = request.form.get('title')
         news_item['slug'] = utils.generate_slug(request.form.get('title', ''))
         news_item['type'] = request.form.get('type', 'update')
@@ -818,29 +956,27 @@ def edit_news(news_id):
             'url': request.form.get('cta_url', '')
         }
         
-        # Handle image upload
+        # Handle image upload (a background job replaces the old images once the item is saved)
+        spooled = None
         if 'image' in request.files:
-            file = request.files['image']
-            if file.filename:
-                # Delete old images first
-                if news_item.get('media'):
-                    for old_image in news_item['media']:
-                        delete_image_file(old_image)
-                
-                # Save to image/news/ with news slug as filename
-                news_slug = news_item['slug']
-                image_path = save_uploaded_file(file, 'news', use_image_dir=True, custom_filename=news_slug)
-                if image_path:
-                    news_item['media'] = [image_path]
-        
-        if utils.save_news(news_item, is_new=False):
-            flash('News item updated successfully!', 'success')
+            spooled = spool_uploads([(request.files['image'], 'news', True, news_item['slug'])])
+        
+        try:
+            saved = utils.save_news(news_item, is_new=False, expected_etag=etag)
+        except utils.ConflictError as e:
+            discard_spooled(spooled)
+            flash(str(e), 'error')
+            return redirect(url_for('news'))
+        if saved:
+            job = enqueue_image_job(spooled, 'news', news_id, 'media', replace=news_item.get('media'))
+            flash('News item updated successfully!' + (IMAGES_PROCESSING if job else ''), 'success')
             return redirect(url_for('news'))
         else:
+            discard_spooled(spooled)
             flash('Error updating news item.', 'error')
     
     # GET request
-    return render_template('edit_news.html', news_item=news_item, mode='edit')
+    return render_template('edit_news.html', news_item=news_item, etag=utils.record_etag(news_item), mode='edit')
 
 @app.route('/news/delete/<news_id>', methods=['POST'])
 def delete_news(news_id):
@@ -867,6 +1003,11 @@ def store_settings():
     store_info = utils.get_store_info()
     
     if request.method == 'POST':
+        if is_stale_edit(store_info):
+            flash('Store settings were changed by someone else since you opened them. Please apply your changes again.', 'error')
+            return redirect(url_for('store_settings'))
+        etag = utils.record_etag(store_info)
+        
         # Update basic info
         store_info['name'] = request.form.get('name')
         store_info['handle'] = request.form.get('handle')
@@ -935,50 +1076,162 @@ def store_settings():
             store_info['delivery'] = {}
         store_info['delivery']['rates'] = rates
         
-        # Handle logo upload
-        if 'logo' in request.files:
-            file = request.files['logo']
-            if file.filename:
-                # Delete old logo first
-                if store_info.get('logo'):
-                    delete_image_file(store_info['logo'])
-                
-                # Save to image/ folder with store-logo as filename
-                image_path = save_uploaded_file(file, '', use_image_dir=True, custom_filename='store-logo')
-                if image_path:
-                    store_info['logo'] = image_path
-        
-        # Handle banner upload
-        if 'banner' in request.files:
-            file = request.files['banner']
-            if file.filename:
-                # Delete old banner first
-                if store_info.get('bannerImage'):
-                    delete_image_file(store_info['bannerImage'])
-                
-                # Save to image/ folder with store-banner as filename
-                image_path = save_uploaded_file(file, '', use_image_dir=True, custom_filename='store-banner')
-                if image_path:
-                    store_info['bannerImage'] = image_path
+        # Handle logo and banner uploads (saved to the image/ folder as store-logo/store-banner
+        # by background jobs, which also delete the old files)
+        spooled_logo = spool_uploads([(request.files.get('logo'), '', True, 'store-logo')])
+        spooled_banner = spool_uploads([(request.files.get('banner'), '', True, 'store-banner')])
         
-        if utils.save_store_info(store_info):
-            flash('Store settings updated successfully!', 'success')
-        else:
-            flash('Error updating store settings.', 'error')
+        try:
+            if utils.save_store_info(store_info, expected_etag=etag):
+                logo_job = enqueue_image_job(spooled_logo, 'store', None, 'logo',
+                                             replace=[store_info.get('logo')], multiple=False)
+                banner_job = enqueue_image_job(spooled_banner, 'store', None, 'bannerImage',
+                                               replace=[store_info.get('bannerImage')], multiple=False)
+                flash('Store settings updated successfully!' + (IMAGES_PROCESSING if logo_job or banner_job else ''), 'success')
+            else:
+                discard_spooled(spooled_logo)
+                discard_spooled(spooled_banner)
+                flash('Error updating store settings.', 'error')
+        except utils.ConflictError as e:
+            discard_spooled(spooled_logo)
+            discard_spooled(spooled_banner)
+            flash(str(e), 'error')
         
         return redirect(url_for('store_settings'))
     
     # GET request
-    return render_template('store_settings.html', store=store_info)
+    return render_template('store_settings.html', store=store_info, etag=utils.record_etag(store_info))
 
 # ==================== API ENDPOINTS ====================
 
 @app.route('/api/subcategories/<parent_id>')
+@http_cache.conditional_json('subcategories.json')
 def get_subcategories_api(parent_id):
     """API endpoint to get subcategories for a parent category"""
     subcategories = utils.get_subcategories_by_parent(parent_id)
     return jsonify(subcategories)
 
+@app.route('/api/products')
+@http_cache.conditional_json('products.json')
+def list_products_api():
+    """
+    API endpoint with one page of products, filtered and sorted like /products.
+    
+    Returns {"items": [...], "total", "page", "perPage", "pages", "nextCursor"};
+    pass nextCursor back as ?cursor= to fetch the following page.
+    """
+    try:
+        return jsonify(listing.query_products(**listing.parse_args(request.args)))
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+
+@app.route('/api/search')
+@http_cache.conditional_json('products.json')
+def search_products_api():
+    """
+    API endpoint for full-text product search (?q=...&limit=20).
+    
+    Every word must match a title, tag, SKU, color, attribute or description
+    word, as a prefix or with one typo.
+    """
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', search.DEFAULT_LIMIT, type=int), 100))
+    results = search.search_products(query, limit=limit) if query else []
+    return jsonify({'query': query, 'items': results})
+
+@app.route('/api/products/stock', methods=['PATCH', 'POST'])
+def bulk_update_stock_api():
+    """
+    API endpoint to apply many stock/price/availability changes at once.
+    
+    Body: {"updates": [{"id": "prod-006", "color": "White", "field": "stock",
+    "op": "inc", "value": -2}, ...]} (a bare list is accepted too).
+    Add ?dry_run=1 to validate without saving.
+    """
+    payload = request.get_json(silent=True)
+    updates = payload.get('updates') if isinstance(payload, dict) else payload
+    if not isinstance(updates, list):
+        return jsonify({'ok': False, 'error': 'Expected a JSON list of updates or {"updates": [...]}'}), 400
+    dry_run = request.args.get('dry_run') in ('1', 'true', 'yes')
+    try:
+        report = bulk.apply_stock_updates(updates, dry_run=dry_run)
+    except utils.ConflictError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 409
+    return jsonify(report), (200 if report['ok'] else 500)
+
+@app.route('/api/orders/events', methods=['POST'])
+def ingest_orders_api():
+    """
+    API endpoint to record orders and order updates in the order event log.
+    
+    Body: an order as saved by the storefront (e.g. the whshop_orders_v1
+    localStorage entries), {"type": "status", "orderId": ..., "status": ...},
+    {"type": "payment", "orderId": ..., "paymentStatus": ...}, or a list of
+    these. Orders already recorded are only checked for status changes.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, (dict, list)):
+        return jsonify({'ok': False, 'error': 'Expected a JSON order, event or list of them'}), 400
+    summary = orders.ingest(payload)
+    summary['ok'] = not summary['errors']
+    return jsonify(summary), (200 if summary['ok'] or summary['accepted'] else 400)
+
+@app.route('/api/orders/summary')
+@http_cache.conditional_json()
+def orders_summary_api():
+    """API endpoint with order totals and breakdowns for the last ?days=30 days"""
+    return jsonify(orders.get_dashboard(days=max(1, min(request.args.get('days', 30, type=int), 366))))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request latency and data I/O metrics of all workers, in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/cache/stats')
+@http_cache.conditional_json()
+def cache_stats_api():
+    """API endpoint exposing hit/miss counters of the catalog cache"""
+    return jsonify(utils.get_cache_stats())
+
+@app.route('/api/jobs')
+@http_cache.conditional_json()
+def list_jobs_api():
+    """API endpoint listing background jobs (optionally ?type=...&status=...)"""
+    return jsonify(jobs.list_jobs(job_type=request.args.get('type'),
+                                  status=request.args.get('status'),
+                                  limit=request.args.get('limit', 50, type=int)))
+
+@app.route('/api/jobs/<job_id>')
+@http_cache.conditional_json()
+def get_job_api(job_id):
+    """API endpoint to poll the status of a background job"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/profiles')
+@http_cache.conditional_json()
+def list_profiles_api():
+    """API endpoint listing saved request profiles, newest first (see profiling.py)"""
+    return jsonify(profiling.list_profiles(limit=request.args.get('limit', 50, type=int)))
+
+@app.route('/api/profiles/<name>')
+def get_profile_api(name):
+    """
+    Download a saved profile.
+    
+    CPU profiles are cProfile files (open with pstats or snakeviz); add
+    ?format=text for the top functions by cumulative time. Memory profiles
+    are JSON with the peak and the largest allocation sites.
+    """
+    path = profiling.profile_path(name)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    if request.args.get('format') == 'text' and name.endswith('.prof'):
+        return Response(profiling.cpu_summary(name), mimetype='text/plain')
+    return send_from_directory(profiling.PROFILES_DIR, name, as_attachment=name.endswith('.prof'))
+
 # ==================== SERVE UPLOADED IMAGES ====================
 
 @app.route('/assets/<path:filename>')
@@ -1001,6 +1254,91 @@ def serve_images(filename):
 # def internal_error(error):
 #     return render_template('500.html'), 500
 
+# ==================== CLI COMMANDS ====================
+
+@app.cli.command('backfill-images')
+@click.option('--force', is_flag=True, help='Regenerate variants that already exist.')
+def backfill_images_command(force):
+    """Generate responsive WebP/AVIF variants for existing product images."""
+    summary = images.backfill_products(force=force)
+    click.echo(f"Checked {summary['checked']} products, updated {summary['updated']}.")
+
+@app.cli.command('build-catalog')
+@click.option('--full', is_flag=True, help='Rewrite every shard instead of only the changed ones.')
+def build_catalog_command(full):
+    """Generate the storefront catalog shards and listing index under data/catalog/."""
+    summary = catalog.build(full=full)
+    click.echo(f"{summary['products']} products: wrote {summary['shardsWritten']} shards"
+               f"{' and the listing index' if summary['index'] else ''}, deleted {summary['shardsDeleted']}.")
+
+@app.cli.command('build-data')
+def build_data_command():
+    """Write content-hashed, precompressed copies of the data files and their manifest."""
+    summary = datafiles.build()
+    click.echo(f"Wrote {len(summary['written'])} files, deleted {len(summary['deleted'])}.")
+    for name, path in sorted(summary['manifest'].items()):
+        click.echo(f"  {name} -> {path}")
+
+@app.cli.command('build-search')
+def build_search_command():
+    """Reindex every product and rewrite the storefront search index."""
+    summary = search.rebuild()
+    click.echo(f"Indexed {summary['products']} products, {summary['terms']} terms, into data/{search.INDEX_FILE}.")
+
+@app.cli.command('build-analytics')
+def build_analytics_command():
+    """Recompute the analytics dashboard aggregates from products.json."""
+    state = aggregates.rebuild()
+    click.echo(f"{state['totals']['products']} products, {len(state['categories'])} categories, "
+               f"{len(state['lowStock'])} low on stock.")
+
+@app.cli.command('reconcile-ids')
+@click.option('--reset', is_flag=True, help='Allow numbers of deleted records to be handed out again.')
+def reconcile_ids_command(reset):
+    """Rebuild the product, category and subcategory ID counters from the data files."""
+    summary = ids.reconcile(reset=reset)
+    for prefix, (old, new) in sorted(summary['changed'].items()):
+        click.echo(f"  {prefix}: {old if old is not None else '-'} -> {new if new is not None else '-'}")
+    for sku, owners in sorted(summary['duplicateSkus'].items()):
+        click.echo(f"  duplicate SKU {sku}: {', '.join(owners)}")
+    click.echo(f"{len(summary['counters'])} counters, {len(summary['changed'])} changed, "
+               f"{len(summary['duplicateSkus'])} duplicate SKUs.")
+
+@app.cli.command('rebuild-orders')
+def rebuild_orders_command():
+    """Recompute the order rollups by replaying the order event log."""
+    rollups = orders.rebuild()
+    click.echo(f"{len(rollups['orders'])} orders over {len(rollups['days'])} days, "
+               f"{len(rollups['customers'])} customers.")
+
+@app.cli.command('migrate-storage')
+@click.argument('target', type=click.Choice(['sqlite', 'json']))
+def migrate_storage_command(target):
+    """Import the data files into SQLite, or export them back from it."""
+    summary = storage.migrate(target)
+    if target == 'sqlite':
+        for filename, count in summary['imported'].items():
+            click.echo(f"  {filename}: {count} records")
+        click.echo(f"Imported into {summary['database']}. Set ADMIN_STORAGE=sqlite to use it.")
+    else:
+        click.echo(f"Exported {', '.join(summary['exported'])} from {summary['database']}. "
+                   f"Set ADMIN_STORAGE=json (or unset it) to edit the files directly.")
+
+@app.cli.command('fingerprint-media')
+@click.option('--dry-run', is_flag=True, help='Only list the files that would be renamed.')
+def fingerprint_media_command(dry_run):
+    """Rename existing product, category, news and store images to content-hashed names."""
+    summary = media.migrate(dry_run=dry_run)
+    for old_path, new_path in sorted(summary['renamed'].items()):
+        click.echo(f"  {old_path} -> {new_path}")
+    for path in summary['missing']:
+        click.echo(f"  missing: {path}")
+    verb = 'Would rename' if summary['dryRun'] else 'Renamed'
+    click.echo(f"{verb} {len(summary['renamed'])} images and {summary['variants']} variants.")
+    if not summary['dryRun']:
+        rules = media.immutable_rules()
+        click.echo(f"Cached for good: {', '.join(rules) if rules else 'nothing yet (folders still hold old names)'}")
+
 # ==================== RUN APPLICATION ====================
 
 if __name__ == '__main__':
@@ -0,0 +1,3 @@
+"""
+Benchmarks of the admin against synthetic catalogs (see benchmarks.run)
+"""
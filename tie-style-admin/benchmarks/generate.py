@@ -0,0 +1,173 @@
+"""
+Synthetic catalog generator: realistic products, categories, subcategories and news at any scale
+
+Usage:
+    python -m benchmarks.generate --products 10000 --out /tmp/catalog-10k
+"""
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Any
+
+# Color variants of the kind prod-006 carries (name, hex)
+PALETTE = [
+    ('White', '#FFFFFF'), ('Snow', '#FFFAFA'), ('Ivory', '#FFFFF0'), ('Beige', '#F5F5DC'),
+    ('Light Gray', '#D3D3D3'), ('Gray', '#808080'), ('Charcoal', '#36454F'), ('Black', '#000000'),
+    ('Brown', '#A52A2A'), ('Coco', '#3D1C02'), ('Caramel', '#C68A5E'), ('Copper', '#B87333'),
+    ('Crimson', '#DC143C'), ('Firebrick', '#B22222'), ('Maroon', '#800000'), ('Bordeaux', '#800020'),
+    ('Wine', '#722F37'), ('Raspberry', '#E30B5C'), ('Scarlet', '#FF2400'), ('Blush', '#FADADD'),
+    ('Flamingo', '#FC8EAC'), ('Peach', '#FFE5B4'), ('Coral', '#FF7F50'), ('Mustard', '#FFDB58'),
+    ('Lemon', '#FFF44F'), ('Mint', '#98FF98'), ('Sage', '#9CAF88'), ('Olive', '#808000'),
+    ('Emerald', '#50C878'), ('Teal', '#008080'), ('Sky Blue', '#87CEEB'), ('Navy', '#000080'),
+    ('Royal Blue', '#4169E1'), ('Lavender', '#E6E6FA'), ('Lilac', '#C8A2C8'), ('Plum', '#8E4585'),
+    ('Mauve', '#E0B0FF'), ('Rose Gold', '#B76E79'), ('Champagne', '#F7E7CE'), ('Mocha', '#967969')
+]
+# Share of products by number of color variants, roughly as in the live catalog
+COLOR_COUNTS = [(0, 20), (1, 7), (2, 6), (3, 8), (4, 12), (5, 5), (6, 12), (10, 6), (20, 10), (40, 14)]
+CATEGORY_NAMES = ['Scrunchies', 'Claw Clips', 'Hair Bows', 'Hamper Boxes', 'Headbands', 'Hair Ties',
+                  'Accessories', 'Gift Sets', 'Bands', 'Pins', 'Wraps', 'Kits']
+ADJECTIVES = ['Plain', 'Velvet', 'Satin', 'Silk', 'Mini', 'Skinny', 'Double Layered', 'Pearl', 'Floral',
+              'Classic', 'Premium', 'Chunky', 'Glitter', 'Pastel', 'Matte', 'Printed', 'Bunny', 'Kitty']
+NOUNS = ['Scrunchie', 'Claw Clip', 'Bow Clip', 'Headband', 'Hair Tie', 'Snap Clip', 'Bow', 'Hamper',
+         'Alligator Clip', 'Banana Clip', 'Hair Wrap', 'Tail Scrunchie']
+WORDS = ['soft', 'stretchy', 'gentle', 'hair', 'everyday', 'hold', 'perfect', 'ponytail', 'bun', 'chic',
+         'damage', 'free', 'gift', 'style', 'elegant', 'comfortable', 'durable', 'handmade', 'lightweight']
+SIZES = ['S', 'M', 'L', 'XL']
+MATERIALS = ['satin', 'velvet', 'cotton', 'silk', 'acrylic', 'metal', 'chiffon', 'organza']
+
+def _slug(text: str) -> str:
+    return '-'.join(text.lower().split())
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+def _timestamp(rng: random.Random, start: datetime) -> str:
+    return (start + timedelta(seconds=rng.randrange(365 * 24 * 3600))).isoformat() + 'Z'
+
+def _color_count(rng: random.Random) -> int:
+    counts, weights = zip(*COLOR_COUNTS)
+    return rng.choices(counts, weights)[0]
+
+def generate_catalog(products: int, seed: int = 1) -> Dict[str, Any]:
+    """
+    Generate a catalog shaped like data/*.json.
+    
+    Categories grow with the catalog (one per ~500 products, at least 8),
+    with 5-20 subcategories each; about a third of the products have 20 or
+    more color variants.
+    
+    Args:
+        products: Number of products
+        seed: Random seed; the same seed gives the same catalog
+    
+    Returns:
+        Mapping of data filename (e.g., 'products.json') to its content
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 1, 1)
+
+    categories: List[Dict] = []
+    subcategories: List[Dict] = []
+    for n in range(1, max(8, products // 500) + 1):
+        name = CATEGORY_NAMES[(n - 1) % len(CATEGORY_NAMES)]
+        if n > len(CATEGORY_NAMES):
+            name = f'{name} {(n - 1) // len(CATEGORY_NAMES) + 1}'
+        category_id = f'cat-{n:02d}'
+        categories.append({
+            'id': category_id, 'name': name, 'slug': _slug(name), 'description': _sentence(rng, 20),
+            'image': f'assets/categories/{_slug(name)}.jpeg', 'parentId': None, 'order': n, 'active': True
+        })
+        prefix = _slug(name)[:3]
+        for m in range(1, rng.randint(5, 20) + 1):
+            sub_name = f'{rng.choice(ADJECTIVES)} {name.lower()} {m}'
+            subcategories.append({
+                'id': f'subcat-{prefix}-{n:02d}{m:02d}', 'name': sub_name, 'slug': _slug(sub_name),
+                'description': _sentence(rng, 12), 'parentCategoryId': category_id, 'order': m, 'active': True
+            })
+    subcategories_by_parent: Dict[str, List[Dict]] = {}
+    for subcategory in subcategories:
+        subcategories_by_parent.setdefault(subcategory['parentCategoryId'], []).append(subcategory)
+
+    items: List[Dict] = []
+    for n in range(1, products + 1):
+        title = f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {n}'
+        category = rng.choice(categories)
+        subcategory = rng.choice(subcategories_by_parent[category['id']])
+        colors = [{'name': name, 'hex': hex_value, 'stock': rng.randint(0, 200), 'available': rng.random() > 0.1}
+                  for name, hex_value in rng.sample(PALETTE, _color_count(rng))]
+        created = _timestamp(rng, start)
+        slug = _slug(title)
+        items.append({
+            'id': f'prod-{n:03d}',
+            'sku': f'{title[:4].upper()}-{rng.choice(NOUNS)[:3].upper()}-{n:03d}',
+            'title': title,
+            'slug': slug,
+            'categoryIds': [category['id']],
+            'subcategoryId': subcategory['id'],
+            'price': float(rng.choice([25, 30, 45, 60, 80, 120, 250, 499])),
+            'currency': 'INR',
+            'stock': sum(c['stock'] for c in colors) if colors else rng.randint(0, 500),
+            'available': rng.random() > 0.15,
+            'images': [f'assets/products/{slug}/{slug}.jpeg'],
+            'sizes': SIZES,
+            'attributes': {'material': rng.choice(MATERIALS)} if rng.random() < 0.5 else {},
+            'shortDescription': _sentence(rng, 12),
+            'description': _sentence(rng, 40) if rng.random() < 0.4 else '',
+            'tags': rng.sample(WORDS, rng.randint(0, 3)),
+            'colors': colors,
+            'createdAt': created,
+            'updatedAt': max(created, _timestamp(rng, start))
+        })
+
+    news = [{
+        'id': f'news-{n:03d}', 'title': f'Offer {n}', 'slug': f'offer-{n}', 'type': 'announcement',
+        'content': _sentence(rng, 25), 'media': [], 'startsAt': '2026-01-01T00:00', 'endsAt': '2029-01-01T00:00',
+        'active': rng.random() > 0.3, 'cta': {'text': '', 'url': ''}
+    } for n in range(1, max(1, products // 100) + 1)]
+
+    store = {
+        'id': 'store-001', 'name': 'Benchmark Store', 'handle': 'benchmark-store', 'description': _sentence(rng, 10),
+        'logo': '', 'bannerImage': '', 'catalogVersion': start.strftime('%Y-%m-%d-01'),
+        'contact': {'phoneE164': '+910000000000', 'email': 'store@example.com', 'address': ''},
+        'payments': {'gpayUpiId': '', 'gpayQrImage': '', 'instructions': ''},
+        'delivery': {'areas': [], 'shippingPolicy': '', 'returnsPolicy': ''}
+    }
+
+    return {
+        'products.json': items,
+        'categories.json': categories,
+        'subcategories.json': subcategories,
+        'news.json': news,
+        'store.json': store
+    }
+
+def write_site(root: str, catalog: Dict[str, Any]) -> None:
+    """
+    Write a catalog as a site tree (data/, assets/, image/) under root.
+    
+    Args:
+        root: Directory to create the site in
+        catalog: Result of generate_catalog
+    """
+    for directory in ('data', 'assets', 'image'):
+        os.makedirs(os.path.join(root, directory), exist_ok=True)
+    for filename, content in catalog.items():
+        with open(os.path.join(root, 'data', filename), 'w', encoding='utf-8') as f:
+            json.dump(content, f, indent=2, ensure_ascii=False)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a synthetic catalog.')
+    parser.add_argument('--products', type=int, default=1000, help='Number of products')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+    parser.add_argument('--out', required=True, help='Directory to write data/, assets/ and image/ into')
+    args = parser.parse_args()
+    catalog = generate_catalog(args.products, seed=args.seed)
+    write_site(args.out, catalog)
+    print(f"Wrote {len(catalog['products.json'])} products, {len(catalog['categories.json'])} categories, "
+          f"{len(catalog['subcategories.json'])} subcategories and {len(catalog['news.json'])} news items "
+          f"to {os.path.join(args.out, 'data')}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""
+Benchmark the admin against synthetic catalogs at several scales
+
+Each scale runs in its own process on a freshly generated catalog in a
+temporary directory, so the real data/ is never touched. Results are saved
+as JSON and can be compared with an earlier run to flag regressions.
+
+Usage (from tie-style-admin/):
+    python -m benchmarks.run --scales 1000,10000
+    python -m benchmarks.run --scales 1000,10000 --baseline benchmarks/results/<earlier run>.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+
+from benchmarks.generate import generate_catalog, write_site
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmarks', 'results')
+DEFAULT_SCALES = '1000,10000'
+DEFAULT_REPEAT = 5
+# A median this much slower than the baseline is a regression...
+DEFAULT_THRESHOLD = 1.25
+# ...unless it is within this many milliseconds (timer noise)
+NOISE_FLOOR_MS = 1.0
+
+def measure(fn: Callable[[int], Any], repeat: int) -> Dict[str, float]:
+    """
+    Time fn(0), fn(1), ... fn(repeat).
+    
+    The first call is reported on its own as 'first' (it may fill caches);
+    min, median and mean are taken over the remaining calls.
+    
+    Returns:
+        Timings in milliseconds
+    """
+    times = []
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        fn(i)
+        times.append((time.perf_counter() - start) * 1000)
+    rest = times[1:] or times
+    return {
+        'first': round(times[0], 3),
+        'min': round(min(rest), 3),
+        'median': round(statistics.median(rest), 3),
+        'mean': round(statistics.fmean(rest), 3),
+        'runs': len(rest)
+    }
+
+def _route(client, url: str) -> Callable[[int], None]:
+    def fetch(_: int) -> None:
+        response = client.get(url)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+    return fetch
+
+def run_scale(products: int, repeat: int, storage_backend: str, seed: int = 1) -> Dict[str, Any]:
+    """
+    Generate a catalog and time the admin against it, in this process.
+    
+    The admin modules are imported here, after pointing them at the
+    generated site, so this must run in a fresh interpreter (see main).
+    
+    Args:
+        products: Number of products to generate
+        repeat: Timed calls per operation (after the first)
+        storage_backend: 'json' or 'sqlite'
+        seed: Catalog random seed
+    
+    Returns:
+        {'products': n, 'generateMs': ..., 'operations': {name: timings}}
+    """
+    root = tempfile.mkdtemp(prefix='tie-style-bench-')
+    try:
+        start = time.perf_counter()
+        catalog = generate_catalog(products, seed=seed)
+        write_site(root, catalog)
+        generate_ms = (time.perf_counter() - start) * 1000
+
+        os.environ['ADMIN_STATE_DIR'] = os.path.join(root, 'state')
+        os.environ['ADMIN_STORAGE'] = storage_backend
+        os.environ['AUTO_PUBLISH'] = '0'
+        sys.path.insert(0, BASE_DIR)
+        import utils
+        utils.PARENT_DIR = root
+        utils.DATA_DIR = os.path.join(root, 'data')
+        utils.ASSETS_DIR = os.path.join(root, 'assets')
+        utils.IMAGE_DIR = os.path.join(root, 'image')
+        import aggregates
+        import app as app_module
+        app_module.PARENT_DIR = root
+        app_module.ASSETS_FOLDER = app_module.app.config['ASSETS_FOLDER'] = utils.ASSETS_DIR
+        app_module.IMAGE_FOLDER = app_module.app.config['IMAGE_FOLDER'] = utils.IMAGE_DIR
+        client = app_module.app.test_client()
+
+        import ids
+        product_ids = [p['id'] for p in catalog['products.json']]
+        # Products with many color variants, like prod-006
+        colorful = [p['id'] for p in catalog['products.json'] if len(p['colors']) >= 20] or product_ids
+        template = catalog['products.json'][product_ids.index(colorful[0])]
+        category_id = catalog['categories.json'][0]['id']
+        created: List[str] = []
+
+        def update_product(i: int) -> None:
+            product = utils.get_product_by_id(colorful[i % len(colorful)])
+            product['stock'] = product.get('stock', 0) + 1
+            if not utils.save_product(product, is_new=False):
+                raise RuntimeError("save_product failed")
+
+        def create_product(i: int) -> None:
+            product = json.loads(json.dumps(template))
+            product['id'] = f'prod-bench-{i}'
+            product['slug'] = f'bench-{i}'
+            # SKUs must be unique, so don't reuse the template's
+            product['sku'] = f'BENCH-{i}'
+            if not utils.save_product(product, is_new=True):
+                raise RuntimeError("save_product failed")
+            created.append(product['id'])
+
+        def delete_product(i: int) -> None:
+            if not utils.delete_product(created[i]):
+                raise RuntimeError("delete_product failed")
+
+        operations = [
+            ('utils.get_dashboard_stats', lambda i: utils.get_dashboard_stats()),
+            ('aggregates.get_analytics_data', lambda i: aggregates.get_analytics_data()),
+            ('ids.next_product', lambda i: ids.next_product(template['title'])),
+            ('ids.next_id', lambda i: ids.next_id(ids.CATEGORY_PREFIX)),
+            ('utils.save_product (update)', update_product),
+            ('utils.save_product (create)', create_product),
+            ('utils.delete_product', delete_product),
+            ('GET /', _route(client, '/')),
+            ('GET /products', _route(client, '/products')),
+            ('GET /products (filtered)', _route(client, f'/products?category={category_id}&available=1&sort=-price')),
+            ('GET /products/edit/<id>', _route(client, f'/products/edit/{colorful[0]}')),
+            ('GET /categories', _route(client, '/categories')),
+            ('GET /news', _route(client, '/news')),
+            ('GET /analytics', _route(client, '/analytics')),
+            ('GET /api/products', _route(client, '/api/products?per_page=50&sort=title')),
+            ('GET /api/search', _route(client, '/api/search?q=velvet%20clip')),
+            ('GET /api/subcategories/<id>', _route(client, f'/api/subcategories/{category_id}'))
+        ]
+        results = {}
+        for name, fn in operations:
+            results[name] = measure(fn, repeat)
+        return {'products': products, 'generateMs': round(generate_ms, 1), 'operations': results}
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """
+    Find operations whose median got slower than in a baseline run.
+    
+    Args:
+        current: Results of this run
+        baseline: Results of an earlier run
+        threshold: Slowdown ratio that counts as a regression
+    
+    Returns:
+        One entry (scale, operation, baseline, current, ratio) per regression
+    """
+    regressions = []
+    for scale, result in current['scales'].items():
+        before = baseline.get('scales', {}).get(scale)
+        if not before:
+            continue
+        for name, timings in result['operations'].items():
+            old = before['operations'].get(name)
+            if not old:
+                continue
+            ratio = timings['median'] / old['median'] if old['median'] else float('inf')
+            if ratio > threshold and timings['median'] - old['median'] > NOISE_FLOOR_MS:
+                regressions.append({'scale': scale, 'operation': name, 'baseline': old['median'],
+                                    'current': timings['median'], 'ratio': round(ratio, 2)})
+    return regressions
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]]) -> None:
+    for scale, result in results['scales'].items():
+        before = (baseline or {}).get('scales', {}).get(scale, {}).get('operations', {})
+        print(f"\n{int(scale):,} products (generated in {result['generateMs']:.0f} ms)")
+        print(f"  {'operation':<34}{'first':>10}{'median':>10}{'min':>10}{'baseline':>10}")
+        for name, timings in result['operations'].items():
+            old = before.get(name)
+            print(f"  {name:<34}{timings['first']:>10.2f}{timings['median']:>10.2f}{timings['min']:>10.2f}"
+                  f"{old['median'] if old else '':>10}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark the admin against synthetic catalogs.')
+    parser.add_argument('--scales', default=DEFAULT_SCALES, help='Comma-separated product counts (e.g. 1000,10000,100000)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed calls per operation')
+    parser.add_argument('--storage', choices=('json', 'sqlite'), default='json', help='Storage backend to benchmark')
+    parser.add_argument('--seed', type=int, default=1, help='Catalog random seed')
+    parser.add_argument('--out', help='Result file (default: benchmarks/results/<time>-<storage>.json)')
+    parser.add_argument('--baseline', help='Earlier result file to compare with')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Slowdown ratio of the median that counts as a regression')
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--worker-result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_scale(args.worker, args.repeat, args.storage, seed=args.seed)
+        with open(args.worker_result, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    results = {
+        'createdAt': datetime.utcnow().isoformat() + 'Z',
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'storage': args.storage,
+        'repeat': args.repeat,
+        'seed': args.seed,
+        'scales': {}
+    }
+    for scale in [int(s) for s in args.scales.split(',') if s.strip()]:
+        print(f"Benchmarking {scale:,} products...", flush=True)
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as tmp:
+            result_path = tmp.name
+        try:
+            # A fresh interpreter per scale, so no cache or index outlives its catalog
+            subprocess.run([sys.executable, '-m', 'benchmarks.run', '--worker', str(scale),
+                            '--worker-result', result_path, '--repeat', str(args.repeat),
+                            '--storage', args.storage, '--seed', str(args.seed)],
+                           cwd=BASE_DIR, check=True, stdout=subprocess.DEVNULL)
+            with open(result_path, 'r', encoding='utf-8') as f:
+                results['scales'][str(scale)] = json.load(f)
+        finally:
+            os.remove(result_path)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    _report(results, baseline)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{args.storage}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {out}")
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {int(r['scale']):,} products, {r['operation']}: "
+                  f"{r['baseline']:.2f} ms -> {r['current']:.2f} ms ({r['ratio']}x)")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold}x).")
+
+if __name__ == '__main__':
+    main()
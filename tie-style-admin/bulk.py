@@ -0,0 +1,425 @@
+"""
+Bulk import/export of products as CSV or JSON Lines
+"""
+import csv
+import io
+import json
+import time
+from typing import Dict, List, Any, Optional, Iterable, Iterator, Tuple
+
+import ids
+import records
+import utils
+
+# Column order used for CSV export (and accepted on import)
+PRODUCT_FIELDS = [
+    'id', 'sku', 'title', 'slug', 'categoryIds', 'subcategoryId', 'price', 'currency',
+    'stock', 'available', 'images', 'sizes', 'tags', 'attributes', 'colors',
+    'shortDescription', 'description'
+]
+# Multi-value columns, joined with '|' in CSV
+LIST_FIELDS = ('categoryIds', 'images', 'sizes', 'tags')
+# Nested columns, stored as JSON text in CSV
+JSON_FIELDS = ('attributes', 'colors')
+
+FORMATS = ('csv', 'jsonl')
+
+class RowError(ValueError):
+    """Raised for a row that cannot be imported"""
+
+def detect_format(filename: str = '', mimetype: str = '', requested: Optional[str] = None) -> str:
+    """
+    Work out whether an upload is CSV or JSON Lines.
+    
+    Args:
+        filename: Uploaded file name, if any
+        mimetype: Content type of the upload
+        requested: Explicit format from the query string, if any
+    
+    Returns:
+        'csv' or 'jsonl'
+    """
+    if requested:
+        requested = requested.lower()
+        if requested not in FORMATS:
+            raise ValueError(f"Unsupported format '{requested}'. Use one of: {', '.join(FORMATS)}")
+        return requested
+    name = (filename or '').lower()
+    if name.endswith(('.jsonl', '.ndjson')) or 'ndjson' in mimetype or 'jsonl' in mimetype:
+        return 'jsonl'
+    return 'csv'
+
+def iter_rows(stream: Any, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Stream rows out of an uploaded file without loading it all into memory.
+    
+    Args:
+        stream: Binary file-like object
+        fmt: 'csv' or 'jsonl'
+    
+    Yields:
+        (line number, row) pairs; a row is a dict, or a RowError for
+        lines that could not be parsed
+    """
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_no, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, RowError(f"Invalid JSON: {e.msg}")
+            continue
+        if not isinstance(row, dict):
+            yield line_no, RowError("Each line must be a JSON object")
+            continue
+        yield line_no, row
+
+def _as_list(value: Any) -> List[str]:
+    if value is None or value == '':
+        return []
+    if isinstance(value, str):
+        return [item.strip() for item in value.split('|') if item.strip()]
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    raise RowError("Expected a list or '|'-separated text")
+
+def _as_json(value: Any, expected: type, field: str) -> Any:
+    if value is None or value == '':
+        return expected()
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise RowError(f"{field}: invalid JSON ({e.msg})")
+    if not isinstance(value, expected):
+        raise RowError(f"{field}: expected a JSON {'object' if expected is dict else 'array'}")
+    return value
+
+def _as_bool(value: Any) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on', 'y')
+
+def _as_number(value: Any, cast: type, field: str) -> Any:
+    try:
+        number = cast(value if value not in (None, '') else 0)
+    except (TypeError, ValueError):
+        raise RowError(f"{field}: '{value}' is not a valid number")
+    if number < 0:
+        raise RowError(f"{field}: must not be negative")
+    return number
+
+def row_to_product(row: Dict, category_ids: set, subcategory_ids: set) -> Dict:
+    """
+    Validate one import row and convert it to the products.json schema.
+    
+    The 'id' and 'sku' are copied as given (possibly empty); allocating
+    them is left to the caller.
+    
+    Raises:
+        RowError: If the row is invalid
+    """
+    title = str(row.get('title') or '').strip()
+    if not title:
+        raise RowError("title is required")
+    product = {
+        'id': str(row.get('id') or '').strip(),
+        'sku': str(row.get('sku') or '').strip(),
+        'title': title,
+        'slug': str(row.get('slug') or '').strip() or utils.generate_slug(title),
+        'categoryIds': _as_list(row.get('categoryIds')),
+        'subcategoryId': str(row.get('subcategoryId') or '').strip() or None,
+        'price': _as_number(row.get('price'), float, 'price'),
+        'currency': str(row.get('currency') or 'INR').strip(),
+        'stock': _as_number(row.get('stock'), int, 'stock'),
+        'available': _as_bool(row.get('available', False)),
+        'images': _as_list(row.get('images')),
+        'attributes': _as_json(row.get('attributes'), dict, 'attributes'),
+        'shortDescription': row.get('shortDescription') or '',
+        'description': row.get('description') or '',
+        'tags': _as_list(row.get('tags'))
+    }
+    unknown = [c for c in product['categoryIds'] if c not in category_ids]
+    if unknown:
+        raise RowError(f"unknown category ID(s): {', '.join(unknown)}")
+    if product['subcategoryId'] and product['subcategoryId'] not in subcategory_ids:
+        raise RowError(f"unknown subcategory ID: {product['subcategoryId']}")
+    sizes = _as_list(row.get('sizes'))
+    if sizes:
+        product['sizes'] = sizes
+    colors = _as_json(row.get('colors'), list, 'colors')
+    if colors:
+        cleaned = []
+        for color in colors:
+            if not isinstance(color, dict) or not color.get('name') or not color.get('hex'):
+                raise RowError("colors: each color needs a name and a hex value")
+            cleaned.append({
+                'name': str(color['name']).strip(),
+                'hex': str(color['hex']).strip(),
+                'stock': _as_number(color.get('stock'), int, 'colors.stock'),
+                'available': _as_bool(color.get('available', False))
+            })
+        product['colors'] = cleaned
+    return product
+
+def _merge_update(existing: Dict, product: Dict, row: Dict) -> Dict:
+    """Apply only the columns present in an import row to an existing product"""
+    merged = utils.thaw(existing)
+    present = set(row)
+    if 'title' in present:
+        present.add('slug')
+    for field in PRODUCT_FIELDS:
+        if field not in present or field == 'id':
+            continue
+        if field in product:
+            merged[field] = product[field]
+        else:
+            # Optional fields (sizes, colors) are dropped when left empty
+            merged.pop(field, None)
+    return merged
+
+def import_products(rows: Iterable[Tuple[int, Any]], dry_run: bool = False) -> Dict:
+    """
+    Validate import rows, allocate IDs/SKUs in one pass and save them with a single write.
+    
+    Rows with the ID of an existing product update that product; rows
+    without an ID become new products. Invalid rows are skipped and reported.
+    
+    Args:
+        rows: (line number, row) pairs, as produced by iter_rows()
+        dry_run: Validate and report without saving anything
+    
+    Returns:
+        Report dictionary with counts and a per-row result list
+    """
+    # Allocating IDs and saving under the products lock keeps concurrent writers out
+    with utils.file_lock('products.json'), ids.allocating(ids.PRODUCT_PREFIX, persist=not dry_run) as take:
+        index = utils.get_index('products.json')
+        category_ids = set(utils.get_index('categories.json').by_id)
+        subcategory_ids = set(utils.get_index('subcategories.json').by_id)
+        skus = dict(index.by_sku)
+        seen_ids = set()
+
+        to_save = []
+        results = []
+        for line_no, row in rows:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                product = row_to_product(row, category_ids, subcategory_ids)
+                if product['id']:
+                    if product['id'] not in index.by_id:
+                        raise RowError(f"unknown product ID: {product['id']} (leave id empty to create a product)")
+                    if product['id'] in seen_ids:
+                        raise RowError(f"product ID {product['id']} appears more than once")
+                    product = _merge_update(index.by_id[product['id']], product, row)
+                    action = 'updated'
+                else:
+                    number = take()
+                    if not product['sku']:
+                        product['sku'] = utils.generate_sku(product['title'], number)
+                        while product['sku'] in skus:
+                            number = take()
+                            product['sku'] = utils.generate_sku(product['title'], number)
+                    product['id'] = ids.format_id(ids.PRODUCT_PREFIX, number)
+                    action = 'created'
+                if not product['sku']:
+                    product['sku'] = index.by_id[product['id']].get('sku', '')
+                owner = skus.get(product['sku'])
+                existing = index.by_id.get(product['id'])
+                if (product['sku'] and owner not in (None, product['id'])
+                        and (existing is None or existing.get('sku') != product['sku'])):
+                    raise RowError(f"SKU {product['sku']} is already used by {owner}")
+            except RowError as e:
+                results.append({'line': line_no, 'status': 'error', 'error': str(e)})
+                continue
+            seen_ids.add(product['id'])
+            if product['sku']:
+                skus[product['sku']] = product['id']
+            to_save.append(product)
+            results.append({'line': line_no, 'status': action, 'id': product['id'], 'sku': product['sku']})
+
+        saved = True
+        if to_save and not dry_run:
+            saved = utils.save_products(to_save)
+    return {
+        'ok': saved,
+        'dry_run': dry_run,
+        'created': sum(1 for r in results if r['status'] == 'created'),
+        'updated': sum(1 for r in results if r['status'] == 'updated'),
+        'errors': sum(1 for r in results if r['status'] == 'error'),
+        'rows': results
+    }
+
+def product_to_row(product: Dict) -> Dict:
+    """Flatten a product into a CSV row"""
+    row = {}
+    for field in PRODUCT_FIELDS:
+        value = product.get(field)
+        if field in LIST_FIELDS:
+            value = '|'.join(str(v) for v in (value or []))
+        elif field in JSON_FIELDS:
+            value = json.dumps(value, ensure_ascii=False, default=records.json_default) if value else ''
+        elif isinstance(value, bool):
+            value = 'true' if value else 'false'
+        row[field] = '' if value is None else value
+    return row
+
+def export_products(fmt: str, products: Optional[List[Dict]] = None) -> Iterator[str]:
+    """
+    Stream the catalog as CSV or JSON Lines, one row at a time.
+    
+    Args:
+        fmt: 'csv' or 'jsonl'
+        products: Products to export (defaults to the stored catalog)
+    
+    Yields:
+        Chunks of output text
+    """
+    if products is None:
+        products = utils.get_all_products()
+    if fmt == 'jsonl':
+        for product in products:
+            yield json.dumps(product, ensure_ascii=False, default=records.json_default) + '\n'
+        return
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=PRODUCT_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    for product in products:
+        writer.writerow(product_to_row(product))
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+# Fields the bulk update API may change, per level
+PRODUCT_UPDATE_FIELDS = ('stock', 'price', 'available')
+COLOR_UPDATE_FIELDS = ('stock', 'available')
+
+def _apply_update(product: Dict, color_map: Dict[str, Dict], update: Dict) -> Dict:
+    """Apply one update to a (mutable) product and return its result entry"""
+    field = update.get('field')
+    op = update.get('op', 'set')
+    color_name = update.get('color')
+    if op not in ('set', 'inc'):
+        raise RowError(f"op must be 'set' or 'inc', got '{op}'")
+    if color_name:
+        if field not in COLOR_UPDATE_FIELDS:
+            raise RowError(f"field must be one of {', '.join(COLOR_UPDATE_FIELDS)} for a color")
+        target = color_map.get(str(color_name).strip().lower())
+        if target is None:
+            raise RowError(f"product has no color named '{color_name}'")
+    else:
+        if field not in PRODUCT_UPDATE_FIELDS:
+            raise RowError(f"field must be one of {', '.join(PRODUCT_UPDATE_FIELDS)}")
+        if field == 'stock' and product.get('colors'):
+            raise RowError("product has color variants; update the stock of a color instead")
+        target = product
+
+    old = target.get(field)
+    value = update.get('value')
+    if field == 'available':
+        if op != 'set':
+            raise RowError("available only supports op 'set'")
+        new = _as_bool(value)
+    elif op == 'inc':
+        cast = int if field == 'stock' else float
+        try:
+            new = (old or 0) + cast(value)
+        except (TypeError, ValueError):
+            raise RowError(f"{field}: '{value}' is not a valid number")
+        if new < 0:
+            raise RowError(f"{field}: would become negative ({new})")
+    else:
+        new = _as_number(value, int if field == 'stock' else float, field)
+    target[field] = new
+    return {'old': old, 'new': new}
+
+def apply_stock_updates(updates: List[Dict], dry_run: bool = False) -> Dict:
+    """
+    Apply many stock/price/availability changes and persist them with one write.
+    
+    Each update is a dict with 'id', 'field' ('stock', 'price' or
+    'available'), 'value', an optional 'color' (variant name, case
+    insensitive) and an optional 'op' ('set' or 'inc'). A product with color
+    variants keeps its top-level stock equal to the sum of its variants'
+    stock. Invalid updates are skipped and reported; the others still apply.
+    
+    Args:
+        updates: List of update dictionaries
+        dry_run: Validate and report without saving anything
+    
+    Returns:
+        Report dictionary with per-item results and timings in milliseconds
+    """
+    started = time.perf_counter()
+    results = []
+    with utils.file_lock('products.json'):
+        index = utils.get_index('products.json')
+        loaded = time.perf_counter()
+
+        # Copy-on-write: only products that are touched get thawed
+        changed: Dict[str, Dict] = {}
+        color_maps: Dict[str, Dict[str, Dict]] = {}
+        for i, update in enumerate(updates):
+            entry = {'index': i, 'id': update.get('id') if isinstance(update, dict) else None}
+            try:
+                if not isinstance(update, dict):
+                    raise RowError("each update must be an object")
+                if update.get('color'):
+                    entry['color'] = update['color']
+                entry['field'] = update.get('field')
+                product_id = update.get('id')
+                product = changed.get(product_id)
+                if product is None:
+                    stored = index.by_id.get(product_id)
+                    if stored is None:
+                        raise RowError(f"unknown product ID: {product_id}")
+                    product = utils.thaw(stored)
+                    color_maps[product_id] = {str(c.get('name', '')).strip().lower(): c
+                                              for c in reversed(product.get('colors') or [])}
+                # _apply_update validates everything before it assigns,
+                # so a failed update leaves the product untouched
+                entry.update(_apply_update(product, color_maps[product_id], update))
+                if entry['new'] == entry['old']:
+                    entry['status'] = 'unchanged'
+                else:
+                    entry['status'] = 'ok'
+                    changed[product_id] = product
+            except RowError as e:
+                entry['status'] = 'error'
+                entry['error'] = str(e)
+            results.append(entry)
+
+        for product in changed.values():
+            if product.get('colors'):
+                product['stock'] = sum(int(c.get('stock') or 0) for c in product['colors'])
+        applied = time.perf_counter()
+
+        saved = True
+        if changed and not dry_run:
+            # Only the changed products are written (a single row each with the SQLite backend)
+            saved = utils.save_products(list(changed.values()))
+    finished = time.perf_counter()
+
+    return {
+        'ok': saved,
+        'dry_run': dry_run,
+        'applied': sum(1 for r in results if r['status'] == 'ok'),
+        'unchanged': sum(1 for r in results if r['status'] == 'unchanged'),
+        'errors': sum(1 for r in results if r['status'] == 'error'),
+        'products_changed': len(changed),
+        'timings_ms': {
+            'load': round((loaded - started) * 1000, 2),
+            'apply': round((applied - loaded) * 1000, 2),
+            'persist': round((finished - applied) * 1000, 2),
+            'total': round((finished - started) * 1000, 2)
+        },
+        'results': results
+    }
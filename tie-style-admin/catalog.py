@@ -0,0 +1,206 @@
+"""
+Storefront catalog artifacts: per-category/subcategory product shards and a slim listing index
+"""
+import json
+import os
+from collections import defaultdict
+from typing import Dict, List, Any, Optional, Set
+
+import utils
+
+# Artifact paths, relative to the data directory
+CATALOG_DIR = 'catalog'
+INDEX_FILE = f'{CATALOG_DIR}/index.json'
+# Products version and categories as of the last build (admin state)
+STATE_FILE = 'catalog.json'
+# Data files whose categories get shards (products are followed through record listeners)
+CATEGORY_FILES = ('data/categories.json', 'data/subcategories.json')
+
+def shard_path(kind: str, record_id: str) -> str:
+    """
+    Get the path of a product shard.
+    
+    Args:
+        kind: 'categories' or 'subcategories'
+        record_id: Category or subcategory ID
+    
+    Returns:
+        Path relative to data/ (e.g., 'catalog/categories/cat-05.json')
+    """
+    return f'{CATALOG_DIR}/{kind}/{record_id}.json'
+
+def product_card(product: Dict) -> Dict:
+    """
+    Build the listing entry of a product: what product cards and category
+    counts need, without descriptions, attributes or the full image list.
+    """
+    images = product.get('images') or []
+    thumbnail = images[0] if images else ''
+    card = {
+        'id': product.get('id'),
+        'sku': product.get('sku', ''),
+        'slug': product.get('slug', ''),
+        'title': product.get('title', ''),
+        'shortDescription': product.get('shortDescription', ''),
+        'price': product.get('price', 0),
+        'currency': product.get('currency', 'INR'),
+        'stock': product.get('stock', 0),
+        'available': product.get('available', True),
+        'categoryIds': list(product.get('categoryIds') or []),
+        'subcategoryId': product.get('subcategoryId'),
+        'tags': list(product.get('tags') or []),
+        'thumbnail': thumbnail
+    }
+    variants = (product.get('imageVariants') or {}).get(thumbnail)
+    if variants:
+        card['thumbnailVariants'] = variants
+    return card
+
+def _read_index() -> Optional[List[Dict]]:
+    """The listing index as last written, or None if it is missing or unreadable"""
+    try:
+        with open(os.path.join(utils.DATA_DIR, INDEX_FILE), 'r', encoding='utf-8') as f:
+            cards = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return cards if isinstance(cards, list) else None
+
+def _touched(cards: List[Dict], categories: Set[str], subcategories: Set[str]) -> None:
+    """Add the categories and subcategories of some listing entries to the dirty sets"""
+    for card in cards:
+        categories.update(card['categoryIds'])
+        if card['subcategoryId']:
+            subcategories.add(card['subcategoryId'])
+
+def _write(cards: List[Dict], dirty_categories: Set[str], dirty_subcategories: Set[str],
+           write_index: bool, version: Optional[str]) -> Dict[str, Any]:
+    """
+    Write the listing index and the dirty shards (sliced from cards), delete
+    shards of removed categories and record the build. Callers hold the
+    state lock.
+    """
+    category_ids = set(utils.get_index('categories.json').by_id)
+    subcategory_ids = set(utils.get_index('subcategories.json').by_id)
+    state = utils.read_state_file(STATE_FILE, {})
+    # Categories that were added (empty shard) or removed (shard deleted)
+    dirty_categories |= category_ids ^ set(state.get('categories', []))
+    dirty_subcategories |= subcategory_ids ^ set(state.get('subcategories', []))
+
+    by_category, by_subcategory = defaultdict(list), defaultdict(list)
+    if dirty_categories or dirty_subcategories:
+        for card in cards:
+            for category_id in card['categoryIds']:
+                if category_id in dirty_categories:
+                    by_category[category_id].append(card)
+            if card['subcategoryId'] in dirty_subcategories:
+                by_subcategory[card['subcategoryId']].append(card)
+
+    files: Dict[str, Any] = {}
+    stale: List[str] = []
+    for kind, dirty, known, grouped in (('categories', dirty_categories, category_ids, by_category),
+                                        ('subcategories', dirty_subcategories, subcategory_ids, by_subcategory)):
+        for record_id in dirty:
+            if record_id in known:
+                files[shard_path(kind, record_id)] = grouped.get(record_id, [])
+            else:
+                stale.append(shard_path(kind, record_id))
+    if write_index:
+        files[INDEX_FILE] = cards
+
+    if files or stale:
+        if not utils.write_data_artifacts(files, delete=stale):
+            raise RuntimeError("Could not write catalog artifacts")
+    utils.write_state_file(STATE_FILE, {
+        'version': version if version is not None else state.get('version'),
+        'categories': sorted(category_ids),
+        'subcategories': sorted(subcategory_ids)
+    })
+    return {
+        'products': len(cards),
+        'index': write_index,
+        'shardsWritten': len(files) - (1 if write_index else 0),
+        'shardsDeleted': len(stale)
+    }
+
+def build(full: bool = False) -> Dict[str, Any]:
+    """
+    Regenerate the storefront catalog artifacts from every product.
+    
+    Only shards of categories and subcategories containing a product whose
+    listing entry changed (or that moved between categories) are rewritten,
+    by comparing against the listing index written last time. Saves through
+    the admin don't need this; they patch the artifacts (see
+    _on_products_saved).
+    
+    Args:
+        full: Ignore the previous build and rewrite every artifact
+    
+    Returns:
+        Summary of what was written
+    """
+    with utils.file_lock('products.json'), utils.file_lock(STATE_FILE):
+        version = utils.get_data_version('products.json')
+        cards: Dict[str, Dict] = {}
+        for product in utils.get_all_products():
+            if product.get('id') not in cards:
+                card = product_card(product)
+                cards[card['id']] = card
+
+        previous_cards = [] if full else _read_index() or []
+        previous = {card.get('id'): card for card in previous_cards}
+        dirty_categories, dirty_subcategories = set(), set()
+        for product_id in previous.keys() | cards.keys():
+            old, new = previous.get(product_id), cards.get(product_id)
+            if old != new:
+                _touched([card for card in (old, new) if card], dirty_categories, dirty_subcategories)
+        if full:
+            state = utils.read_state_file(STATE_FILE, {})
+            dirty_categories.update(state.get('categories', []))
+            dirty_subcategories.update(state.get('subcategories', []))
+        return _write(list(cards.values()), dirty_categories, dirty_subcategories,
+                      write_index=full or previous_cards != list(cards.values()), version=version)
+
+def _on_products_saved(changes: utils.RecordChanges, before_version: str, after_version: str) -> None:
+    # Patch the last listing index with the saved products' entries instead
+    # of rebuilding it from every product
+    with utils.file_lock(STATE_FILE):
+        state = utils.read_state_file(STATE_FILE, {})
+        cards = _read_index() if state.get('version') == before_version else None
+        if cards is None:
+            # Never built, or a write was missed
+            build()
+            return
+        position = {card.get('id'): i for i, card in enumerate(cards)}
+        dirty_categories, dirty_subcategories = set(), set()
+        changed = False
+        for old, new in changes:
+            product_id = (new or old).get('id')
+            i = position.get(product_id)
+            previous = cards[i] if i is not None else None
+            card = product_card(new) if new is not None else None
+            if card == previous:
+                continue
+            changed = True
+            _touched([c for c in (previous, card) if c], dirty_categories, dirty_subcategories)
+            if card is None:
+                cards[i] = None
+            elif i is None:
+                position[product_id] = len(cards)
+                cards.append(card)
+            else:
+                cards[i] = card
+        cards = [card for card in cards if card is not None]
+        _write(cards, dirty_categories, dirty_subcategories, write_index=changed, version=after_version)
+
+def _on_change(paths: List[str]) -> None:
+    if not any(path in CATEGORY_FILES for path in paths):
+        return
+    with utils.file_lock(STATE_FILE):
+        cards = _read_index()
+        if cards is not None:
+            _write(cards, set(), set(), write_index=False, version=None)
+            return
+    build()
+
+utils.register_record_listener('products.json', _on_products_saved)
+utils.register_change_listener(_on_change)
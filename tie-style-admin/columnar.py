@@ -0,0 +1,168 @@
+"""
+Columnar view of the products snapshot for vectorized analytics (needs NumPy)
+"""
+from typing import Dict, List, Any, Optional, Tuple
+
+import utils
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Python types a price or stock may have for the columns to give exact results
+_NUMBERS = (int, float, bool)
+
+class ProductColumns:
+    """
+    One products snapshot as NumPy columns.
+    
+    price, stock and value (price * stock) hold one entry per product, in
+    file order; updated_rank orders the updatedAt strings. Category
+    membership is a sparse product x category matrix in coordinate form
+    (member_rows[i] is in category member_cols[i]), with categories
+    numbered in order of first appearance (category_ids). Columns whose
+    values are all ints are integer columns, so their sums are exact.
+    """
+    __slots__ = ('snapshot', 'price', 'stock', 'value', 'updated_rank', 'category_ids', 'member_rows', 'member_cols')
+
+    def __init__(self, products: List[Dict], prices: List[Any], stocks: List[Any], updated: List[str]):
+        self.snapshot = products
+        self.price = np.array(prices, dtype=_dtype(prices))
+        self.stock = np.array(stocks, dtype=_dtype(stocks))
+        self.value = self.price * self.stock
+        # Ranks of the timestamps in string order (as Python compares them)
+        self.updated_rank = np.unique(np.array(updated, dtype=str), return_inverse=True)[1].reshape(-1)
+
+        numbers: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        for row, product in enumerate(products):
+            for category_id in product.get('categoryIds') or []:
+                rows.append(row)
+                cols.append(numbers.setdefault(category_id, len(numbers)))
+        self.category_ids = list(numbers)
+        self.member_rows = np.array(rows, dtype=np.int64)
+        self.member_cols = np.array(cols, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.price)
+
+    def totals(self) -> Tuple[int, Any, Any]:
+        """
+        Get the totals over every product.
+        
+        Returns:
+            (products, stock, value)
+        """
+        return len(self), _stock(self.stock, self.stock.sum()), _money(self.value, self.value.sum())
+
+    def category_totals(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get products, stock and value per category.
+        
+        A product listing a category twice counts twice, as in a walk over
+        each product's categoryIds.
+        
+        Returns:
+            {category ID: {'products', 'stock', 'value'}} in order of first appearance
+        """
+        size = len(self.category_ids)
+        counts = np.bincount(self.member_cols, minlength=size)
+        stocks = np.bincount(self.member_cols, weights=self.stock[self.member_rows], minlength=size)
+        values = np.bincount(self.member_cols, weights=self.value[self.member_rows], minlength=size)
+        return {category_id: {'products': int(counts[i]), 'stock': _stock(self.stock, stocks[i]),
+                              'value': _money(self.value, values[i])}
+                for i, category_id in enumerate(self.category_ids)}
+
+    def top(self, k: int, key: str = 'value') -> List[int]:
+        """
+        Get the positions of the k products with the highest value or updatedAt.
+        
+        Ties keep file order, like heapq.nlargest().
+        
+        Args:
+            k: Number of products
+            key: 'value' or 'updatedAt'
+        
+        Returns:
+            Positions into the snapshot, highest first
+        """
+        return top_k(self.value if key == 'value' else self.updated_rank, k)
+
+    def at_most(self, limit: int) -> List[int]:
+        """Get the positions of the products with stock at or below limit, in file order"""
+        return np.flatnonzero(self.stock <= limit).tolist()
+
+def _dtype(values: List[Any]):
+    return np.float64 if any(type(v) is float for v in values) else np.int64
+
+# Sums as the Python numbers a running total gives: ints stay ints, money is
+# rounded to cents like the incremental aggregates
+
+def _stock(column, total) -> Any:
+    return int(total) if column.dtype.kind == 'i' else float(total)
+
+def _money(column, total) -> Any:
+    return int(total) if column.dtype.kind == 'i' else round(float(total), 2)
+
+def top_k(keys, k: int) -> List[int]:
+    """
+    Get the indices of the k largest keys by partial selection.
+    
+    Only the candidates at or above the k-th largest key are sorted, and
+    ties keep index order (as sorted(..., reverse=True)[:k] would).
+    
+    Args:
+        keys: 1-D NumPy array
+        k: Number of indices
+    
+    Returns:
+        Indices, largest key first
+    """
+    n = len(keys)
+    if k <= 0 or n == 0:
+        return []
+    if k < n:
+        kth = np.partition(keys, n - k)[n - k]
+        candidates = np.flatnonzero(keys >= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.argsort(-keys[candidates], kind='stable')
+    return candidates[order[:k]].tolist()
+
+def is_available() -> bool:
+    """Check whether NumPy is installed so the columns can be built"""
+    return np is not None
+
+_columns: Optional[ProductColumns] = None
+
+def get_columns(products: Optional[List[Dict]] = None) -> Optional[ProductColumns]:
+    """
+    Get the columns of a products snapshot, built on first use and kept
+    until the snapshot changes.
+    
+    Args:
+        products: Snapshot to use (defaults to the stored catalog)
+    
+    Returns:
+        ProductColumns, or None if NumPy is missing or some price, stock
+        or updatedAt isn't a plain number or string (callers then fall
+        back to walking the products)
+    """
+    global _columns
+    if np is None:
+        return None
+    if products is None:
+        products = utils.get_all_products()
+    columns = _columns
+    if columns is not None and columns.snapshot is products:
+        return columns
+    prices = [p.get('price', 0) for p in products]
+    stocks = [p.get('stock', 0) for p in products]
+    updated = [p.get('updatedAt', '') for p in products]
+    if (not all(type(v) in _NUMBERS for v in prices) or not all(type(v) in _NUMBERS for v in stocks)
+            or not all(type(v) is str for v in updated)):
+        return None
+    columns = _columns = ProductColumns(products, prices, stocks, updated)
+    return columns
@@ -0,0 +1,108 @@
+"""
+Content-hashed, precompressed copies of the storefront data files for long-term caching
+"""
+import gzip
+import hashlib
+import json
+import os
+from typing import Dict, List, Any, Optional
+
+import utils
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Data files (relative to data/) that get hashed copies
+HASHED_FILES = ('products.json', 'categories.json', 'subcategories.json', 'news.json', 'store.json',
+                'catalog/index.json', 'search-index.json')
+# Hashed copies live outside data/, whose files are served with no-store
+DIST_DIR = 'dist/data'
+# Logical name -> hashed path; small and never cached
+MANIFEST_FILE = 'data-manifest.json'
+# Hashed copies kept per file, so pages loaded just before a publish still find theirs
+KEEP_VERSIONS = 2
+# Admin state: hashed paths written per file, newest first
+STATE_FILE = 'datafiles.json'
+HASH_LENGTH = 10
+
+def hashed_path(name: str, payload: bytes) -> str:
+    """
+    Get the site-relative path of a data file's content-hashed copy.
+    
+    Args:
+        name: Logical name relative to data/ (e.g., 'products.json')
+        payload: File contents
+    
+    Returns:
+        Path like 'dist/data/products.3f9a1c0b2d.json'
+    """
+    stem, ext = os.path.splitext(name)
+    digest = hashlib.sha256(payload).hexdigest()[:HASH_LENGTH]
+    return f"{DIST_DIR}/{stem}.{digest}{ext}"
+
+def _compressed(path: str, payload: bytes) -> Dict[str, bytes]:
+    # mtime=0 keeps the .gz byte-identical between builds
+    files = {f"{path}.gz": gzip.compress(payload, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        files[f"{path}.br"] = brotli.compress(payload, quality=11)
+    return files
+
+def _siblings(path: str) -> List[str]:
+    return [path, f"{path}.gz", f"{path}.br"]
+
+def build(names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Write hashed copies (plus .gz and, if brotli is installed, .br) of data
+    files whose content changed, and update the manifest.
+    
+    Args:
+        names: Logical names to rebuild (default: all of HASHED_FILES)
+    
+    Returns:
+        The manifest and the paths written and deleted
+    """
+    names = [n for n in (names or HASHED_FILES) if n in HASHED_FILES]
+    with utils.file_lock(STATE_FILE):
+        state = utils.read_state_file(STATE_FILE, {})
+        manifest = {name: paths[0] for name, paths in state.items() if paths}
+        files: Dict[str, bytes] = {}
+        stale: List[str] = []
+        for name in names:
+            try:
+                with open(os.path.join(utils.DATA_DIR, name), 'rb') as f:
+                    payload = f.read()
+            except FileNotFoundError:
+                continue
+            path = hashed_path(name, payload)
+            history = [p for p in state.get(name, []) if p != path]
+            if manifest.get(name) != path or not os.path.exists(os.path.join(utils.PARENT_DIR, path)):
+                files[path] = payload
+                files.update(_compressed(path, payload))
+            manifest[name] = path
+            state[name] = [path] + history[:KEEP_VERSIONS - 1]
+            for old_path in history[KEEP_VERSIONS - 1:]:
+                stale.extend(_siblings(old_path))
+
+        manifest_path = os.path.join(utils.DATA_DIR, MANIFEST_FILE)
+        if files or stale or not os.path.exists(manifest_path):
+            files[manifest_path] = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+            if not utils.write_site_files(files, delete=stale):
+                raise RuntimeError("Could not write hashed data files")
+        utils.write_state_file(STATE_FILE, state)
+
+    return {
+        'manifest': manifest,
+        'written': sorted(p for p in files if not p.endswith(MANIFEST_FILE)),
+        'deleted': stale
+    }
+
+def _on_change(paths: List[str]) -> None:
+    # Hashing and compressing a large products.json takes too long to do
+    # inside the save; build once the saves settle (or when publishing)
+    prefix = utils.site_path(utils.DATA_DIR) + '/'
+    if any(p.startswith(prefix) and p[len(prefix):] in HASHED_FILES for p in paths):
+        utils.defer('datafiles', build)
+
+utils.register_change_listener(_on_change)
@@ -0,0 +1,64 @@
+"""
+Conditional GET support (ETag / If-None-Match / 304) for the admin's JSON endpoints
+"""
+import functools
+import hashlib
+from typing import Callable
+
+from flask import make_response, request
+
+import utils
+
+# The admin UI may keep responses but must revalidate them on every use
+DEFAULT_CACHE_CONTROL = 'private, no-cache'
+
+def data_etag(*filenames: str) -> str:
+    """
+    Get a strong ETag for the current request, derived from data file versions.
+    
+    Args:
+        filenames: Data files the response is built from (e.g., 'products.json')
+    
+    Returns:
+        ETag value (without quotes) that changes when any of the files or
+        the request path and query change
+    """
+    storage = utils.get_storage()
+    parts = [storage.name, request.full_path] + [f'{name}={storage.version(name)}' for name in filenames]
+    return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:32]
+
+def conditional_json(*filenames: str, cache_control: str = DEFAULT_CACHE_CONTROL) -> Callable:
+    """
+    Decorate a JSON view with ETags, If-None-Match handling and Cache-Control.
+    
+    With filenames, the ETag comes from the versions of those data files and
+    is checked before the view runs, so a matching request costs no more than
+    a version lookup and is answered 304 without building the body. Without
+    filenames, the ETag is a hash of the body the view returned.
+    Only successful GET/HEAD responses are made conditional.
+    
+    Args:
+        filenames: Data files the response depends on, if known
+        cache_control: Cache-Control header of successful responses
+    """
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            conditional = request.method in ('GET', 'HEAD')
+            etag = data_etag(*filenames) if filenames and conditional else None
+            if etag and request.if_none_match.contains(etag):
+                response = make_response('', 304)
+                response.set_etag(etag)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if not conditional or response.status_code != 200:
+                    return response
+                if etag:
+                    response.set_etag(etag)
+                else:
+                    response.add_etag()
+                response.make_conditional(request)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
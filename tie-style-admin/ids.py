@@ -0,0 +1,160 @@
+"""
+ID and SKU allocation from persisted per-prefix counters
+"""
+import re
+from contextlib import contextmanager
+from typing import Dict, List, Any, Callable, Iterator, Tuple
+
+import utils
+
+# Admin state file holding the highest number handed out per ID prefix
+COUNTERS_FILE = 'id-counters.json'
+PRODUCT_PREFIX = 'prod-'
+CATEGORY_PREFIX = 'cat-'
+# Digits IDs are zero-padded to ('prod-007', 'cat-03', 'subcat-scr-05')
+WIDTHS = {PRODUCT_PREFIX: 3}
+DEFAULT_WIDTH = 2
+
+def _source(prefix: str) -> str:
+    """Data file holding the records that use an ID prefix"""
+    if prefix == PRODUCT_PREFIX:
+        return 'products.json'
+    if prefix.startswith('subcat-'):
+        return 'subcategories.json'
+    return 'categories.json'
+
+def format_id(prefix: str, number: int) -> str:
+    """Format an ID, e.g. format_id('prod-', 7) -> 'prod-007'"""
+    return f'{prefix}{number:0{WIDTHS.get(prefix, DEFAULT_WIDTH)}d}'
+
+def subcategory_prefix(parent_slug: str) -> str:
+    """ID prefix of a category's subcategories, from the first 3 characters of its slug"""
+    return f'subcat-{parent_slug[:3]}-'
+
+def _highest(prefix: str) -> int:
+    """Highest number among the existing IDs with a prefix (0 if none)"""
+    pattern = re.compile(rf'^{re.escape(prefix)}(\d+)$')
+    numbers = [int(m.group(1)) for m in map(pattern.match, utils.get_index(_source(prefix)).by_id) if m]
+    return max(numbers, default=0)
+
+def get_counters() -> Dict[str, int]:
+    """Get the stored high-water mark of every prefix allocated so far"""
+    return utils.read_state_file(COUNTERS_FILE, {}).get('counters', {})
+
+@contextmanager
+def allocating(prefix: str, persist: bool = True) -> Iterator[Callable[[], int]]:
+    """
+    Hand out numbers for an ID prefix while holding the counters lock.
+    
+    Numbers continue from the prefix's stored high-water mark (seeded from
+    the existing IDs on first use), so they are never handed out twice,
+    even across processes or after the product holding one was deleted.
+    Numbers whose ID exists anyway (e.g. records added by hand) are skipped.
+    
+    Args:
+        prefix: ID prefix (e.g., 'prod-', 'cat-', 'subcat-scr-')
+        persist: Save the new high-water mark when the block ends without
+            an error (False to preview, e.g. for a dry run)
+    
+    Yields:
+        A function returning the next free number on each call
+    """
+    with utils.file_lock(COUNTERS_FILE):
+        state = utils.read_state_file(COUNTERS_FILE, {})
+        counters = state.setdefault('counters', {})
+        stored = counters.get(prefix)
+        mark = [stored if stored is not None else _highest(prefix)]
+        taken = utils.get_index(_source(prefix)).by_id
+
+        def next_number() -> int:
+            number = mark[0] + 1
+            while format_id(prefix, number) in taken:
+                number += 1
+            mark[0] = number
+            return number
+
+        yield next_number
+        if persist and mark[0] != stored:
+            counters[prefix] = mark[0]
+            if not utils.write_state_file(COUNTERS_FILE, state):
+                raise IOError(f"Could not save the ID counters to {COUNTERS_FILE}")
+
+def next_id(prefix: str) -> str:
+    """
+    Allocate the next ID for a prefix.
+    
+    Args:
+        prefix: ID prefix (e.g., 'cat-' or subcategory_prefix(slug))
+    
+    Returns:
+        The new ID (e.g., 'cat-09')
+    """
+    with allocating(prefix) as take:
+        return format_id(prefix, take())
+
+def next_product(title: str) -> Tuple[str, str]:
+    """
+    Allocate a product ID and a SKU generated from the title.
+    
+    A number whose generated SKU already belongs to a product is skipped.
+    
+    Args:
+        title: Product title
+    
+    Returns:
+        (product ID, SKU), e.g. ('prod-133', 'PLAI-SCR-133')
+    """
+    skus = utils.get_index('products.json').by_sku
+    with allocating(PRODUCT_PREFIX) as take:
+        while True:
+            number = take()
+            sku = utils.generate_sku(title, number)
+            if sku not in skus:
+                return format_id(PRODUCT_PREFIX, number), sku
+
+def reconcile(reset: bool = False) -> Dict[str, Any]:
+    """
+    Rebuild the counters from the IDs in the data files.
+    
+    Every prefix found in products, categories and subcategories is set to
+    its highest existing number. Stored marks above that (numbers of
+    deleted records) are kept unless reset is given.
+    
+    Args:
+        reset: Lower marks to the highest existing number, so numbers of
+            deleted records can be handed out again
+    
+    Returns:
+        {'counters': {prefix: mark}, 'changed': {prefix: [old, new]},
+         'duplicateSkus': {sku: [product IDs]}}
+    """
+    found: Dict[str, int] = {}
+    patterns = {'products.json': rf'^({re.escape(PRODUCT_PREFIX)})(\d+)$',
+                'categories.json': rf'^({re.escape(CATEGORY_PREFIX)})(\d+)$',
+                'subcategories.json': r'^(subcat-.*-)(\d+)$'}
+    for filename, pattern in patterns.items():
+        compiled = re.compile(pattern)
+        for record_id in utils.get_index(filename).by_id:
+            match = compiled.match(record_id)
+            if match:
+                found[match.group(1)] = max(found.get(match.group(1), 0), int(match.group(2)))
+
+    duplicates: Dict[str, List[str]] = {}
+    for product in utils.get_all_products():
+        sku = product.get('sku')
+        if sku:
+            duplicates.setdefault(sku, []).append(product.get('id'))
+    duplicates = {sku: owners for sku, owners in duplicates.items() if len(owners) > 1}
+
+    with utils.file_lock(COUNTERS_FILE):
+        state = utils.read_state_file(COUNTERS_FILE, {})
+        old = state.get('counters', {})
+        counters = {prefix: mark for prefix, mark in old.items() if not reset}
+        for prefix, highest in found.items():
+            counters[prefix] = max(highest, counters.get(prefix, 0))
+        state['counters'] = dict(sorted(counters.items()))
+        if not utils.write_state_file(COUNTERS_FILE, state):
+            raise IOError(f"Could not save the ID counters to {COUNTERS_FILE}")
+    changed = {prefix: [old.get(prefix), mark] for prefix, mark in state['counters'].items() if old.get(prefix) != mark}
+    changed.update({prefix: [mark, None] for prefix, mark in old.items() if prefix not in state['counters']})
+    return {'counters': state['counters'], 'changed': changed, 'duplicateSkus': duplicates}
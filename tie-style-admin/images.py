@@ -0,0 +1,224 @@
+"""
+Responsive image variants (resized WebP/AVIF copies) for uploaded images
+"""
+import glob
+import os
+import re
+from typing import Dict, List, Optional
+
+import utils
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Widths (in pixels) of the generated variants
+VARIANT_WIDTHS = tuple(int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,1024').split(',') if w.strip())
+WEBP_QUALITY = int(os.getenv('IMAGE_WEBP_QUALITY', '80'))
+AVIF_QUALITY = int(os.getenv('IMAGE_AVIF_QUALITY', '55'))
+# AVIF encoding is slow, so it is opt-in
+AVIF_ENABLED = os.getenv('IMAGE_VARIANT_AVIF', '').lower() in ('1', 'true', 'yes')
+
+# Formats in the order they should be offered to browsers
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp'}
+
+_warned_missing = False
+
+def is_available() -> bool:
+    """Check whether Pillow is installed so variants can be generated"""
+    return Image is not None
+
+def _avif_supported() -> bool:
+    if not AVIF_ENABLED or Image is None:
+        return False
+    try:
+        import pillow_avif  # noqa: F401  (plugin for Pillow < 11.2)
+    except ImportError:
+        pass
+    Image.init()
+    return 'AVIF' in Image.SAVE
+
+def variant_path(image_path: str, width: int, fmt: str) -> str:
+    """
+    Get the relative path of one variant of an image.
+    
+    Args:
+        image_path: Original image path (e.g., 'assets/products/bows/red-bow.jpeg')
+        width: Variant width in pixels
+        fmt: 'webp' or 'avif'
+    
+    Returns:
+        Variant path (e.g., 'assets/products/bows/red-bow-320w.webp')
+    """
+    stem, _ = os.path.splitext(image_path)
+    return f"{stem}-{width}w.{fmt}"
+
+def generate_variants(image_path: str) -> Optional[Dict]:
+    """
+    Generate resized, metadata-free WebP (and optionally AVIF) copies of an image.
+    
+    Widths larger than the original are skipped; an image narrower than the
+    smallest width gets a single variant at its own width.
+    
+    Args:
+        image_path: Image path as stored in JSON (relative to the site root)
+    
+    Returns:
+        Manifest like {'width': 1200, 'height': 900, 'webp': [{'src': ..., 'width': 320}, ...]},
+        or None if Pillow is missing or the image cannot be read
+    """
+    global _warned_missing
+    if Image is None:
+        if not _warned_missing:
+            _warned_missing = True
+            print("Warning: Pillow is not installed, so no image variants are generated "
+                  "(pip install -r requirements-optional.txt)")
+        return None
+    if not image_path:
+        return None
+    full_path = os.path.join(utils.PARENT_DIR, image_path)
+    try:
+        with Image.open(full_path) as original:
+            # Bake in EXIF rotation, since the metadata itself is dropped
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except Exception as e:
+        print(f"Error reading image {image_path}: {e}")
+        return None
+
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+    width, height = image.size
+    widths = sorted({w for w in VARIANT_WIDTHS if w < width}) or [width]
+
+    formats = ['webp'] + (['avif'] if _avif_supported() else [])
+    manifest: Dict = {'width': width, 'height': height}
+    for fmt in formats:
+        entries = []
+        for target_width in widths:
+            target_height = max(1, round(height * target_width / width))
+            resized = image if target_width == width else image.resize((target_width, target_height), Image.LANCZOS)
+            resized.info = {}
+            rel_path = variant_path(image_path, target_width, fmt)
+            try:
+                if fmt == 'webp':
+                    resized.save(os.path.join(utils.PARENT_DIR, rel_path), 'WEBP', quality=WEBP_QUALITY, method=6)
+                else:
+                    resized.save(os.path.join(utils.PARENT_DIR, rel_path), 'AVIF', quality=AVIF_QUALITY)
+            except Exception as e:
+                print(f"Error writing {fmt} variant of {image_path}: {e}")
+                continue
+            entries.append({'src': rel_path, 'width': target_width})
+        if entries:
+            manifest[fmt] = entries
+    utils.record_changes([entry['src'] for fmt in formats for entry in manifest.get(fmt, [])])
+    return manifest
+
+def build_image_variants(images: List[str], existing: Optional[Dict] = None, force: bool = False) -> Dict:
+    """
+    Get the srcset manifest for a record's images list, generating what is missing.
+    
+    Args:
+        images: Image paths of the record (e.g., product['images'])
+        existing: The record's current manifest, reused for unchanged images
+        force: Regenerate variants even if the manifest already has them
+    
+    Returns:
+        Dictionary mapping each image path to its variant manifest
+    """
+    existing = existing or {}
+    variants = {}
+    for image_path in images or []:
+        manifest = None if force else existing.get(image_path)
+        if manifest is None:
+            manifest = generate_variants(image_path)
+        if manifest:
+            variants[image_path] = manifest
+    return variants
+
+def apply_product_variants(product: Dict, force: bool = False) -> bool:
+    """
+    Update product['imageVariants'] to match product['images'].
+    
+    Returns:
+        True if the manifest changed
+    """
+    if not is_available():
+        return False
+    variants = build_image_variants(product.get('images', []), product.get('imageVariants'), force=force)
+    if variants == (product.get('imageVariants') or {}):
+        return False
+    if variants:
+        product['imageVariants'] = variants
+    else:
+        product.pop('imageVariants', None)
+    return True
+
+def srcset(manifest: Optional[Dict], fmt: str = 'webp', prefix: str = '') -> str:
+    """Build an HTML srcset attribute value from a variant manifest, optionally prefixing each path"""
+    if not manifest:
+        return ''
+    return ', '.join(f"{prefix}{entry['src']} {entry['width']}w" for entry in manifest.get(fmt, []))
+
+def delete_variants(image_path: str) -> List[str]:
+    """
+    Delete every generated variant of an image.
+    
+    Returns:
+        Relative paths of the deleted files
+    """
+    if not image_path:
+        return []
+    stem, _ = os.path.splitext(os.path.join(utils.PARENT_DIR, image_path))
+    # The glob alone would also match variants of 'name-2.jpeg' etc.
+    pattern = re.compile(re.escape(os.path.basename(stem)) + r'-\d+w\.(?:' + '|'.join(MIME_TYPES) + ')')
+    deleted = []
+    for fmt in MIME_TYPES:
+        for full_path in glob.glob(f"{glob.escape(stem)}-[0-9]*w.{fmt}"):
+            if not pattern.fullmatch(os.path.basename(full_path)):
+                continue
+            try:
+                os.remove(full_path)
+                deleted.append(os.path.relpath(full_path, utils.PARENT_DIR).replace('\\', '/'))
+            except OSError as e:
+                print(f"Error deleting image variant {full_path}: {e}")
+    return deleted
+
+def backfill_products(force: bool = False) -> Dict:
+    """
+    Generate missing variants for every product and save the manifests in one write.
+    
+    Args:
+        force: Regenerate variants that already exist
+    
+    Returns:
+        Summary with the number of products checked and updated
+    """
+    if not is_available():
+        raise RuntimeError("Pillow is not installed; run 'pip install -r requirements-optional.txt' to generate image variants")
+    updated = []
+    for stored in utils.get_all_products():
+        product = utils.thaw(stored)
+        if apply_product_variants(product, force=force):
+            updated.append(product)
+    if updated:
+        # Only the manifests are written back, so concurrent edits of
+        # other fields made while images were being resized are kept.
+        with utils.file_lock('products.json'):
+            index = utils.get_index('products.json')
+            merged = []
+            for product in updated:
+                current = index.by_id.get(product['id'])
+                if current is None or current.get('images') != product.get('images'):
+                    continue
+                fresh = utils.thaw(current)
+                if 'imageVariants' in product:
+                    fresh['imageVariants'] = product['imageVariants']
+                else:
+                    fresh.pop('imageVariants', None)
+                merged.append(fresh)
+            if merged and not utils.save_products(merged, touch=False):
+                raise RuntimeError("Could not save products.json")
+        updated = merged
+    return {'checked': len(utils.get_all_products()), 'updated': len(updated)}
@@ -0,0 +1,268 @@
+"""
+Local background job queue backed by a persistent job table
+"""
+import os
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+
+import utils
+
+# Job table, stored in the admin state directory
+TABLE = 'jobs.json'
+JOB_WORKERS = int(os.getenv('ADMIN_JOB_WORKERS', '2'))
+MAX_ATTEMPTS = int(os.getenv('ADMIN_JOB_MAX_ATTEMPTS', '3'))
+# Seconds before the first retry; doubles with every further attempt
+RETRY_DELAY = float(os.getenv('ADMIN_JOB_RETRY_DELAY', '2'))
+# Finished jobs kept in the table
+KEEP_FINISHED = int(os.getenv('ADMIN_JOB_KEEP_FINISHED', '200'))
+# Running jobs not updated for this long are considered orphaned (used
+# where the owner process cannot be checked, i.e. on Windows)
+STALE_AFTER = 30 * 60
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+class JobActiveError(Exception):
+    """A job that must not run twice at once is already queued or running"""
+    def __init__(self, job: Dict):
+        super().__init__(f"A {job['type']} job is already {job['status']}")
+        self.job = job
+
+_handlers: Dict[str, Callable] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+# Tells this process's running jobs apart from those of an earlier process with the same pid
+_process_token = uuid.uuid4().hex
+
+def handler(job_type: str) -> Callable:
+    """
+    Register the function that runs jobs of a given type.
+    
+    The function receives the job dictionary and returns a JSON-serialisable
+    result. Raising an exception marks the attempt as failed; it is retried
+    until the job's max_attempts is reached.
+    
+    Args:
+        job_type: Job type name (e.g., 'attach_images')
+    """
+    def register(fn: Callable) -> Callable:
+        _handlers[job_type] = fn
+        return fn
+    return register
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + 'Z'
+
+def _load() -> Dict[str, Dict]:
+    return utils.read_state_file(TABLE, {})
+
+def _save(table: Dict[str, Dict]) -> None:
+    finished = sorted((j for j in table.values() if j['status'] not in ACTIVE_STATUSES),
+                      key=lambda j: j['updatedAt'], reverse=True)
+    for job in finished[KEEP_FINISHED:]:
+        del table[job['id']]
+    utils.write_state_file(TABLE, table)
+
+def _update(job_id: str, **changes: Any) -> Optional[Dict]:
+    with utils.file_lock(TABLE):
+        table = _load()
+        job = table.get(job_id)
+        if job is None:
+            return None
+        job.update(changes)
+        job['updatedAt'] = _now()
+        _save(table)
+        return job
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor, _executor_pid
+    with _executor_lock:
+        # A forked worker must not reuse its parent's threads
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='admin-job')
+            _executor_pid = os.getpid()
+            _recover()
+        return _executor
+
+def _submit(job_id: str, delay: float = 0) -> None:
+    if delay > 0:
+        timer = threading.Timer(delay, _submit, args=(job_id,))
+        timer.daemon = True
+        timer.start()
+        return
+    _get_executor().submit(_run, job_id)
+
+def _is_orphaned(job: Dict) -> bool:
+    if job['status'] != RUNNING:
+        return False
+    if job.get('ownerPid') == os.getpid():
+        # Left over from before a fork/restart with a reused pid
+        return job.get('ownerToken') != _process_token
+    if not utils.pid_alive(job.get('ownerPid')):
+        return True
+    try:
+        updated = datetime.fromisoformat(job['updatedAt'].rstrip('Z'))
+    except (KeyError, ValueError):
+        return True
+    return (datetime.utcnow() - updated).total_seconds() > STALE_AFTER
+
+def _recover() -> None:
+    """Re-queue jobs whose process died and pick up jobs nobody is running"""
+    with utils.file_lock(TABLE):
+        table = _load()
+        pending = []
+        for job in table.values():
+            if _is_orphaned(job):
+                job['status'] = QUEUED
+                job['error'] = 'Worker process stopped while the job was running'
+                job['updatedAt'] = _now()
+            if job['status'] == QUEUED:
+                pending.append(job['id'])
+        if pending:
+            _save(table)
+    for job_id in pending:
+        _executor.submit(_run, job_id)
+
+def ensure_started() -> None:
+    """Start this process's worker pool (and recover pending jobs) if not running yet"""
+    if _executor is None or _executor_pid != os.getpid():
+        _get_executor()
+
+def enqueue(job_type: str, payload: Optional[Dict] = None, max_attempts: Optional[int] = None,
+            unique: bool = False) -> Dict:
+    """
+    Add a job to the table and schedule it on the worker pool.
+    
+    Args:
+        job_type: Registered job type
+        payload: JSON-serialisable job arguments
+        max_attempts: Attempts before the job is marked failed
+        unique: Refuse to queue the job while another job of this type is active
+    
+    Returns:
+        The new job dictionary
+    
+    Raises:
+        JobActiveError: If unique is set and a job of this type is queued or running
+    """
+    if job_type not in _handlers:
+        raise ValueError(f"Unknown job type: {job_type}")
+    now = _now()
+    job = {
+        'id': uuid.uuid4().hex[:12],
+        'type': job_type,
+        'status': QUEUED,
+        'payload': payload or {},
+        'result': None,
+        'error': None,
+        'attempts': 0,
+        'maxAttempts': max_attempts or MAX_ATTEMPTS,
+        'progress': {},
+        'createdAt': now,
+        'updatedAt': now,
+        'startedAt': None,
+        'finishedAt': None
+    }
+    with utils.file_lock(TABLE):
+        table = _load()
+        if unique:
+            for other in table.values():
+                if other['type'] == job_type and other['status'] in ACTIVE_STATUSES and not _is_orphaned(other):
+                    raise JobActiveError(other)
+        table[job['id']] = job
+        _save(table)
+    _submit(job['id'])
+    return job
+
+def _claim(job_id: str) -> Optional[Dict]:
+    """Mark a queued job as running by this process; None if someone else has it"""
+    with utils.file_lock(TABLE):
+        table = _load()
+        job = table.get(job_id)
+        if job is None or job['status'] != QUEUED:
+            return None
+        job['status'] = RUNNING
+        job['attempts'] += 1
+        job['ownerPid'] = os.getpid()
+        job['ownerToken'] = _process_token
+        job['startedAt'] = job['startedAt'] or _now()
+        job['updatedAt'] = _now()
+        _save(table)
+        return job
+
+def _run(job_id: str) -> None:
+    job = _claim(job_id)
+    if job is None:
+        return
+    fn = _handlers.get(job['type'])
+    try:
+        if fn is None:
+            raise RuntimeError(f"No handler registered for job type '{job['type']}'")
+        result = fn(job)
+    except Exception as e:
+        traceback.print_exc()
+        if job['attempts'] < job['maxAttempts']:
+            _update(job_id, status=QUEUED, error=str(e))
+            _submit(job_id, delay=RETRY_DELAY * 2 ** (job['attempts'] - 1))
+        else:
+            _update(job_id, status=FAILED, error=str(e), finishedAt=_now())
+            _cleanup_spool(job)
+        return
+    _update(job_id, status=SUCCEEDED, result=result, error=None, finishedAt=_now())
+    _cleanup_spool(job)
+
+def report_progress(job: Dict, **progress: Any) -> None:
+    """
+    Merge progress information into a running job's 'progress' field.
+    
+    Args:
+        job: Job dictionary passed to the handler
+        progress: Fields to set (e.g., phase='push')
+    """
+    job['progress'].update(progress)
+    _update(job['id'], progress=job['progress'])
+
+def get_job(job_id: str) -> Optional[Dict]:
+    """Get a job by ID"""
+    return _load().get(job_id)
+
+def list_jobs(job_type: Optional[str] = None, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+    """List jobs, newest first, optionally filtered by type and status"""
+    jobs = [j for j in _load().values()
+            if (job_type is None or j['type'] == job_type) and (status is None or j['status'] == status)]
+    jobs.sort(key=lambda j: j['createdAt'], reverse=True)
+    return jobs[:limit]
+
+def wait(job_id: str, timeout: float = 30) -> Optional[Dict]:
+    """
+    Block until a job has finished (mainly for CLI commands and scripts).
+    
+    Returns:
+        The job dictionary, still active if the timeout expired
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = get_job(job_id)
+        if job is None or job['status'] not in ACTIVE_STATUSES or time.monotonic() >= deadline:
+            return job
+        time.sleep(0.05)
+
+# ==================== SPOOLED UPLOADS ====================
+
+def spool_dir() -> str:
+    """Create and return a fresh directory for uploads a job will process"""
+    directory = os.path.join(utils.STATE_DIR, 'spool', uuid.uuid4().hex)
+    utils.ensure_directory_exists(directory)
+    return directory
+
+def _cleanup_spool(job: Dict) -> None:
+    directory = job.get('payload', {}).get('spoolDir')
+    if directory and os.path.isdir(directory):
+        shutil.rmtree(directory, ignore_errors=True)
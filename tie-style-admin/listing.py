@@ -0,0 +1,224 @@
+"""
+Paginated, filtered and sorted product listings for the admin, answered from an index
+"""
+import base64
+import bisect
+import json
+import math
+import threading
+from typing import Dict, List, Any, Callable, Iterator, Mapping, Optional, Tuple
+
+import utils
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _number(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+# Sort keys accepted by ?sort= (prefix with '-' for descending); '' keeps file order
+SORT_KEYS: Dict[str, Callable[[Dict, int], Any]] = {
+    '': lambda p, pos: pos,
+    'title': lambda p, pos: str(p.get('title') or '').casefold(),
+    'price': lambda p, pos: _number(p.get('price')),
+    'stock': lambda p, pos: _number(p.get('stock')),
+    'updatedAt': lambda p, pos: str(p.get('updatedAt') or ''),
+    'createdAt': lambda p, pos: str(p.get('createdAt') or ''),
+    'id': lambda p, pos: str(p.get('id') or '')
+}
+
+class ProductListIndex:
+    """
+    Filter sets and sort orders built over one snapshot of the products.
+    
+    Category, subcategory and availability filters are set intersections;
+    stock ranges are a bisect on the stock order. Sort orders are built on
+    first use and kept until the products change.
+    """
+    __slots__ = ('snapshot', 'by_category', 'by_subcategory', 'available', 'unavailable', 'text', '_orders', '_lock')
+
+    def __init__(self, products: List[Dict]):
+        self.snapshot = products
+        self.by_category: Dict[str, List[int]] = {}
+        self.by_subcategory: Dict[str, List[int]] = {}
+        self.available: List[int] = []
+        self.unavailable: List[int] = []
+        self.text: List[str] = []
+        for pos, product in enumerate(products):
+            for category_id in product.get('categoryIds') or []:
+                self.by_category.setdefault(category_id, []).append(pos)
+            if product.get('subcategoryId'):
+                self.by_subcategory.setdefault(product['subcategoryId'], []).append(pos)
+            (self.available if product.get('available') else self.unavailable).append(pos)
+            self.text.append(' '.join(str(v) for v in (
+                product.get('title'), product.get('sku'), product.get('id'), product.get('slug'),
+                *(product.get('tags') or [])) if v).casefold())
+        self._orders: Dict[str, List[tuple]] = {}
+        self._lock = threading.Lock()
+
+    def order(self, key: str) -> List[tuple]:
+        """Get (sort value, id, position) rows in ascending order"""
+        with self._lock:
+            rows = self._orders.get(key)
+            if rows is None:
+                fn = SORT_KEYS[key]
+                rows = self._orders[key] = sorted(
+                    (fn(p, pos), str(p.get('id') or ''), pos) for pos, p in enumerate(self.snapshot))
+            return rows
+
+_index: Optional[ProductListIndex] = None
+
+def get_list_index() -> ProductListIndex:
+    """Get the listing index over the current products snapshot"""
+    global _index
+    products = utils.get_all_products()
+    index = _index
+    if index is None or index.snapshot is not products:
+        index = _index = ProductListIndex(products)
+    return index
+
+def encode_cursor(row: tuple) -> str:
+    """Encode the sort position after which the next page starts"""
+    return base64.urlsafe_b64encode(json.dumps(row[:2]).encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """
+    Decode a cursor from encode_cursor.
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        value, record_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return value, record_id
+
+def parse_args(args: Mapping[str, str]) -> Dict[str, Any]:
+    """
+    Read listing options from query parameters, ignoring invalid values.
+    
+    Parameters: page, per_page, cursor, category, subcategory, available
+    (1/0), stock_min, stock_max, q and sort (a key of SORT_KEYS, '-' prefix
+    for descending).
+    """
+    def integer(name: str) -> Optional[int]:
+        try:
+            return int(args.get(name, ''))
+        except ValueError:
+            return None
+
+    sort = args.get('sort', '')
+    available = args.get('available', '')
+    return {
+        'page': max(integer('page') or 1, 1),
+        'per_page': min(max(integer('per_page') or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE),
+        'cursor': args.get('cursor') or None,
+        'category': args.get('category') or None,
+        'subcategory': args.get('subcategory') or None,
+        'available': {'1': True, 'true': True, '0': False, 'false': False}.get(available.lower()),
+        'stock_min': integer('stock_min'),
+        'stock_max': integer('stock_max'),
+        'q': args.get('q', '').strip() or None,
+        'sort': sort if sort.lstrip('-') in SORT_KEYS else ''
+    }
+
+def query_products(page: int = 1, per_page: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                   category: Optional[str] = None, subcategory: Optional[str] = None,
+                   available: Optional[bool] = None, stock_min: Optional[int] = None,
+                   stock_max: Optional[int] = None, q: Optional[str] = None, sort: str = '') -> Dict[str, Any]:
+    """
+    Get one page of products matching the filters.
+    
+    Pages are addressed by number or, for stable paging while products
+    change, by the cursor returned with the previous page.
+    
+    Args:
+        page: 1-based page number (ignored when cursor is given)
+        per_page: Products per page
+        cursor: nextCursor of the previous page
+        category: Category ID
+        subcategory: Subcategory ID
+        available: Only available (True) or unavailable (False) products
+        stock_min: Minimum stock, inclusive
+        stock_max: Maximum stock, inclusive
+        q: Words that must all appear in the title, SKU, ID, slug or tags
+        sort: Key of SORT_KEYS; prefix with '-' for descending
+    
+    Returns:
+        Dictionary with 'items' (read-only products), 'total', 'page',
+        'perPage', 'pages' and 'nextCursor'
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    index = get_list_index()
+    candidates: Optional[set] = None
+
+    def narrow(positions) -> None:
+        nonlocal candidates
+        candidates = set(positions) if candidates is None else candidates.intersection(positions)
+
+    if category:
+        narrow(index.by_category.get(category, ()))
+    if subcategory:
+        narrow(index.by_subcategory.get(subcategory, ()))
+    if available is not None:
+        narrow(index.available if available else index.unavailable)
+    if stock_min is not None or stock_max is not None:
+        rows = index.order('stock')
+        low = 0 if stock_min is None else bisect.bisect_left(rows, (stock_min,))
+        high = len(rows) if stock_max is None else bisect.bisect_left(rows, (math.nextafter(stock_max, math.inf),))
+        narrow(row[2] for row in rows[low:high])
+    if q:
+        terms = q.casefold().split()
+        pool = range(len(index.snapshot)) if candidates is None else candidates
+        narrow([pos for pos in pool if all(term in index.text[pos] for term in terms)])
+    total = len(index.snapshot) if candidates is None else len(candidates)
+
+    key, descending = sort.lstrip('-'), sort.startswith('-')
+    rows = index.order(key)
+    if cursor:
+        after = decode_cursor(cursor)
+        try:
+            if descending:
+                start = bisect.bisect_left(rows, after) - 1
+            else:
+                start = bisect.bisect_right(rows, (*after, math.inf))
+        except TypeError:
+            raise ValueError("Cursor does not match the sort order")
+        offset = None
+    else:
+        offset = (page - 1) * per_page
+        start = len(rows) - 1 if descending else 0
+
+    def ordered() -> Iterator[tuple]:
+        positions = range(start, -1, -1) if descending else range(start, len(rows))
+        for i in positions:
+            if candidates is None or rows[i][2] in candidates:
+                yield rows[i]
+
+    matches = ordered()
+    if offset:
+        if candidates is None:
+            # Unfiltered: jump straight to the page
+            start = start - offset if descending else start + offset
+            matches = ordered()
+        else:
+            for _ in zip(range(offset), matches):
+                pass
+    page_rows = [row for _, row in zip(range(per_page + 1), matches)]
+    has_more = len(page_rows) > per_page
+    page_rows = page_rows[:per_page]
+
+    return {
+        'items': [index.snapshot[row[2]] for row in page_rows],
+        'total': total,
+        'page': page if not cursor else None,
+        'perPage': per_page,
+        'pages': max(math.ceil(total / per_page), 1),
+        'nextCursor': encode_cursor(page_rows[-1]) if has_more and page_rows else None
+    }
@@ -0,0 +1,306 @@
+"""
+Fingerprinted (content-hashed) media file names and the asset manifest
+"""
+import hashlib
+import json
+import os
+import re
+import glob
+import shutil
+from typing import Dict, List, Any, Callable, Iterable
+
+import images
+import utils
+
+# Hex digits of the content hash put in file names
+FINGERPRINT_LENGTH = 8
+# Maps logical image keys (e.g. 'assets/categories/scrunchies') to the current
+# fingerprinted path; relative to data/
+MANIFEST_FILE = 'asset-manifest.json'
+
+_FINGERPRINT = re.compile(r'\.[0-9a-f]{%d}$' % FINGERPRINT_LENGTH)
+
+def file_digest(path: str) -> str:
+    """Get the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def fingerprinted_name(name: str, ext: str, digest: str) -> str:
+    """
+    Build a file name that changes whenever the contents change.
+    
+    Args:
+        name: Base name without extension (e.g., 'scrunchies')
+        ext: Extension including the dot (e.g., '.png')
+        digest: Hex digest of the contents (see file_digest)
+    
+    Returns:
+        File name like 'scrunchies.1a2b3c4d.png'
+    """
+    return f"{name}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+def is_fingerprinted(path: str) -> bool:
+    """Check whether an image path already carries a content hash"""
+    stem, _ = os.path.splitext(path)
+    return bool(_FINGERPRINT.search(stem))
+
+def logical_key(path: str) -> str:
+    """
+    Get the manifest key of an image path: the path without hash and extension.
+    
+    Example: 'assets/categories/scrunchies.1a2b3c4d.png' -> 'assets/categories/scrunchies'
+    """
+    stem, _ = os.path.splitext(path)
+    return _FINGERPRINT.sub('', stem)
+
+# ==================== ASSET MANIFEST ====================
+
+def get_manifest() -> Dict[str, str]:
+    """Get the asset manifest as {logical key: fingerprinted path}"""
+    try:
+        with open(os.path.join(utils.DATA_DIR, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def update_manifest(added: Iterable[str] = (), removed: Iterable[str] = ()) -> None:
+    """
+    Point manifest keys at newly saved images and drop deleted ones.
+    
+    Args:
+        added: Fingerprinted paths that were saved
+        removed: Paths that were deleted
+    """
+    added, removed = [p for p in added if p], [p for p in removed if p]
+    if not added and not removed:
+        return
+    with utils.file_lock(MANIFEST_FILE):
+        manifest = get_manifest()
+        before = dict(manifest)
+        for path in removed:
+            if manifest.get(logical_key(path)) == path:
+                del manifest[logical_key(path)]
+        for path in added:
+            manifest[logical_key(path)] = path
+        if manifest != before:
+            utils.write_data_artifacts({MANIFEST_FILE: dict(sorted(manifest.items()))})
+    if removed:
+        # Deleting the last old-style name may make a folder safe to cache for good
+        update_cache_headers()
+
+# ==================== CACHE HEADERS ====================
+
+# Headers file at the site root (Cloudflare Pages / Netlify format)
+HEADERS_FILE = '_headers'
+# Upload locations cached as immutable once all their files have
+# fingerprinted names: (_headers rule, folder, file name prefix)
+IMMUTABLE_RULES = (
+    ('/assets/products/*', 'assets/products', ''),
+    ('/assets/categories/*', 'assets/categories', ''),
+    ('/image/news/*', 'image/news', ''),
+    ('/image/store-*', 'image', 'store-')
+)
+HEADERS_BEGIN = '# BEGIN fingerprinted media (written by the admin, see media.update_cache_headers)'
+HEADERS_END = '# END fingerprinted media'
+
+_VARIANT_SUFFIX = re.compile(r'-\d+w$')
+
+def has_stable_name(path: str) -> bool:
+    """Check whether a file's name changes with its contents (a fingerprinted image or a variant of one)"""
+    stem, _ = os.path.splitext(path)
+    return bool(_FINGERPRINT.search(_VARIANT_SUFFIX.sub('', stem)))
+
+def _rule_files(folder: str, prefix: str) -> Iterable[str]:
+    root = os.path.join(utils.PARENT_DIR, folder)
+    if prefix:
+        # Only files directly in the folder, e.g. image/store-logo.1a2b3c4d.png
+        names = [n for n in os.listdir(root) if n.startswith(prefix)] if os.path.isdir(root) else []
+        return [n for n in names if os.path.isfile(os.path.join(root, n))]
+    files = []
+    for directory, _, names in os.walk(root):
+        files.extend(os.path.join(directory, n) for n in names if not n.startswith('.'))
+    return files
+
+def immutable_rules() -> List[str]:
+    """
+    Get the upload rules that can be cached for good.
+    
+    A folder still holding a file with a plain name (uploaded before names
+    were fingerprinted, or kept by migrate() because a page links to it)
+    could change under the same URL, so it keeps the default caching.
+    
+    Returns:
+        _headers rules (e.g. '/assets/products/*') whose files all have stable names
+    """
+    return [rule for rule, folder, prefix in IMMUTABLE_RULES
+            if all(has_stable_name(path) for path in _rule_files(folder, prefix))]
+
+def update_cache_headers() -> List[str]:
+    """
+    Rewrite the fingerprinted-media block of _headers with immutable_rules().
+    
+    Returns:
+        The rules now in the block
+    """
+    rules = immutable_rules()
+    lines = [HEADERS_BEGIN]
+    for rule in rules:
+        # "! Cache-Control" drops the 1-hour value set by the folder-wide rules
+        lines += [rule, '  ! Cache-Control', '  Cache-Control: public, max-age=31536000, immutable', '']
+    lines.append(HEADERS_END)
+    block = '\n'.join(lines)
+
+    path = os.path.join(utils.PARENT_DIR, HEADERS_FILE)
+    with utils.file_lock(HEADERS_FILE):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            text = ''
+        start, end = text.find(HEADERS_BEGIN), text.find(HEADERS_END)
+        if start != -1 and end > start:
+            updated = text[:start] + block + text[end + len(HEADERS_END):]
+        else:
+            updated = text.rstrip('\n') + ('\n\n' if text.strip() else '') + block + '\n'
+        if updated != text and not utils.write_site_files({path: updated.encode('utf-8')}):
+            raise RuntimeError(f"Could not write {HEADERS_FILE}")
+    return rules
+
+# ==================== MIGRATION ====================
+
+def _image_fields(record_type: str) -> List[str]:
+    return {'products': ['images'], 'categories': ['image'], 'news': ['media'], 'store': ['logo', 'bannerImage']}[record_type]
+
+def _rename_in(record: Dict, fields: List[str], rename: Callable[[str], str]) -> bool:
+    changed = False
+    for field in fields:
+        value = record.get(field)
+        if isinstance(value, list):
+            new_value = [rename(p) for p in value]
+        elif isinstance(value, str) and value:
+            new_value = rename(value)
+        else:
+            continue
+        if new_value != value:
+            record[field] = new_value
+            changed = True
+    return changed
+
+def _rename_variants(product: Dict, renamed: Dict[str, str], moves: Dict[str, str]) -> None:
+    """Carry the variant manifests over to the renamed images (renaming the files too)"""
+    variants = product.get('imageVariants')
+    if not variants:
+        return
+    updated = {}
+    for image_path, manifest in variants.items():
+        new_image = renamed.get(image_path, image_path)
+        if new_image != image_path:
+            manifest = dict(manifest)
+            for fmt in images.MIME_TYPES:
+                entries = []
+                for entry in manifest.get(fmt, []):
+                    new_src = images.variant_path(new_image, entry['width'], fmt)
+                    moves[entry['src']] = new_src
+                    entries.append({'src': new_src, 'width': entry['width']})
+                if entries:
+                    manifest[fmt] = entries
+        updated[new_image] = manifest
+    product['imageVariants'] = updated
+
+# Site files that may name images directly (e.g. <img src="image/navlogo.png">)
+SITE_SOURCES = ('*.html', 'js/*.js', 'css/*.css', 'manifest.json')
+
+def _site_references() -> str:
+    text = []
+    for pattern in SITE_SOURCES:
+        for path in glob.glob(os.path.join(utils.PARENT_DIR, pattern)):
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                text.append(f.read())
+    return '\n'.join(text)
+
+def migrate(dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Give every image referenced by products, categories, news and the store
+    settings a fingerprinted name, and point the records at the new names.
+    
+    New files are created (hard-linked where possible) before the JSON files
+    are rewritten, and the old names are removed only afterwards, so the site
+    never references a missing file. Old names that site pages still use
+    directly (like the nav logo) are kept.
+    
+    Args:
+        dry_run: Only report what would be renamed
+    
+    Returns:
+        Summary with the renamed paths and any referenced files that are missing
+    """
+    renamed: Dict[str, str] = {}
+    missing: List[str] = []
+
+    def rename(path: str) -> str:
+        if path in renamed:
+            return renamed[path]
+        if is_fingerprinted(path):
+            return path
+        full_path = os.path.join(utils.PARENT_DIR, path)
+        if not os.path.isfile(full_path):
+            missing.append(path)
+            return path
+        stem, ext = os.path.splitext(path)
+        new_path = f"{os.path.dirname(stem)}/{fingerprinted_name(os.path.basename(stem), ext, file_digest(full_path))}".lstrip('/')
+        renamed[path] = new_path
+        return new_path
+
+    filenames = {'products': 'products.json', 'categories': 'categories.json', 'news': 'news.json', 'store': 'store.json'}
+    moves: Dict[str, str] = {}
+    with utils.file_lock('products.json'), utils.file_lock('categories.json'), \
+            utils.file_lock('news.json'), utils.file_lock('store.json'):
+        updated: Dict[str, List[Dict]] = {}
+        for record_type, filename in filenames.items():
+            if record_type == 'store':
+                records = [utils.get_store_info()]
+            else:
+                records = utils.thaw(utils.get_storage().records(filename))
+            for record in records:
+                if _rename_in(record, _image_fields(record_type), rename):
+                    updated.setdefault(filename, []).append(record)
+                    if record_type == 'products':
+                        _rename_variants(record, renamed, moves)
+        moves.update(renamed)
+
+        if dry_run or not moves:
+            if not dry_run:
+                update_cache_headers()
+            return {'renamed': renamed, 'variants': len(moves) - len(renamed), 'missing': missing, 'dryRun': dry_run}
+
+        for old_path, new_path in moves.items():
+            old_full, new_full = os.path.join(utils.PARENT_DIR, old_path), os.path.join(utils.PARENT_DIR, new_path)
+            if not os.path.exists(old_full) or os.path.exists(new_full):
+                continue
+            try:
+                os.link(old_full, new_full)
+            except OSError:
+                shutil.copy2(old_full, new_full)
+        for filename, records in updated.items():
+            if filename == 'store.json':
+                saved = utils.save_store_info(records[0])
+            else:
+                saved = utils.save_records(filename, records)
+            if not saved:
+                raise RuntimeError(f"Could not save {filename}")
+        site_text = _site_references()
+        for old_path in moves:
+            if old_path in site_text:
+                continue
+            try:
+                os.remove(os.path.join(utils.PARENT_DIR, old_path))
+            except FileNotFoundError:
+                pass
+        utils.record_changes(list(moves) + list(moves.values()))
+        update_manifest(added=renamed.values())
+    update_cache_headers()
+
+    return {'renamed': renamed, 'variants': len(moves) - len(renamed), 'missing': missing, 'dryRun': False}
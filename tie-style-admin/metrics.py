@@ -0,0 +1,307 @@
+"""
+Request latency and data I/O metrics, shared across worker processes and exposed in Prometheus text format
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+PUBLISH_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# name -> (type, help, histogram buckets)
+METRICS: Dict[str, Tuple[str, str, Tuple[float, ...]]] = {
+    'tiestyle_http_request_duration_seconds': (
+        'histogram', 'Time to handle a request, including template rendering, by Flask endpoint.', LATENCY_BUCKETS),
+    'tiestyle_http_requests_total': ('counter', 'Requests handled, by Flask endpoint and status code.', ()),
+    'tiestyle_json_read_seconds': (
+        'histogram', 'Time to read and parse a data file (cache misses; hits only cost an fstat).', LATENCY_BUCKETS),
+    'tiestyle_json_read_bytes_total': ('counter', 'Bytes of data files read and parsed.', ()),
+    'tiestyle_json_write_seconds': ('histogram', 'Time to encode and atomically write a data file.', LATENCY_BUCKETS),
+    'tiestyle_json_write_bytes_total': ('counter', 'Bytes of data files written.', ()),
+    'tiestyle_upload_seconds': ('histogram', 'Time to save and fingerprint an uploaded file.', LATENCY_BUCKETS),
+    'tiestyle_upload_bytes_total': ('counter', 'Bytes of uploaded files saved.', ()),
+    'tiestyle_publish_phase_seconds': ('histogram', 'Duration of each phase of a publish to GitHub.', PUBLISH_BUCKETS)
+}
+
+# Workers write their values to state/metrics/<pid>.json at most this often (seconds)...
+FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+# ...and only while /metrics was scraped within this many seconds
+SCRAPE_IDLE = float(os.getenv('METRICS_SCRAPE_IDLE_SECONDS', '600'))
+SCRAPED_MARKER = 'scraped'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+# (name, labels) -> [value] for counters, [bucket counts..., sum, count] for histograms
+_values: Dict[Tuple[str, Labels], List[float]] = {}
+_dirty = False
+_next_flush = 0.0
+# Writes the values left over at the end of an interval, so an idle worker's last requests are shared
+_flush_timer: Optional[threading.Timer] = None
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def inc(name: str, amount: float = 1, **labels: Any) -> None:
+    """
+    Add to a counter.
+    
+    Args:
+        name: Counter name (a key of METRICS)
+        amount: Amount to add
+        labels: Label values
+    """
+    global _dirty
+    key = (name, _labels(labels))
+    with _lock:
+        values = _values.get(key)
+        if values is None:
+            values = _values[key] = [0.0]
+        values[0] += amount
+        _dirty = True
+    _maybe_flush()
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """
+    Record one observation in a histogram.
+    
+    Args:
+        name: Histogram name (a key of METRICS)
+        value: Observed value (seconds)
+        labels: Label values
+    """
+    global _dirty
+    buckets = METRICS[name][2]
+    key = (name, _labels(labels))
+    with _lock:
+        values = _values.get(key)
+        if values is None:
+            values = _values[key] = [0.0] * (len(buckets) + 2)
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                values[i] += 1
+                break
+        values[-2] += value
+        values[-1] += 1
+        _dirty = True
+    _maybe_flush()
+
+@contextmanager
+def timed(name: str, **labels: Any) -> Iterator[None]:
+    """Observe how long the block takes in a histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+# ==================== SHARING BETWEEN WORKERS ====================
+
+def _metrics_dir() -> str:
+    # utils imports this module, so look it up late
+    import utils
+    return os.path.join(utils.STATE_DIR, 'metrics')
+
+def _own_file() -> str:
+    return os.path.join(_metrics_dir(), f'{os.getpid()}.json')
+
+def _scraped_recently() -> bool:
+    try:
+        return time.time() - os.path.getmtime(os.path.join(_metrics_dir(), SCRAPED_MARKER)) < SCRAPE_IDLE
+    except OSError:
+        return False
+
+def _maybe_flush() -> None:
+    global _next_flush, _flush_timer
+    now = time.monotonic()
+    if now < _next_flush:
+        with _lock:
+            # Not alive after a fork: timers don't survive into the child
+            if _flush_timer is None or not _flush_timer.is_alive():
+                _flush_timer = threading.Timer(_next_flush - now, _flush_due)
+                _flush_timer.daemon = True
+                _flush_timer.start()
+        return
+    _next_flush = now + FLUSH_INTERVAL
+    if _scraped_recently():
+        flush()
+
+def _flush_due() -> None:
+    global _next_flush, _flush_timer
+    with _lock:
+        _flush_timer = None
+    _next_flush = time.monotonic() + FLUSH_INTERVAL
+    if _scraped_recently():
+        flush()
+
+def flush() -> None:
+    """Write this process's values for other workers' /metrics to pick up"""
+    global _dirty
+    with _lock:
+        if not _dirty:
+            return
+        snapshot = [[name, list(labels), values[:]] for (name, labels), values in _values.items()]
+        _dirty = False
+    path = _own_file()
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Error writing metrics to {path}: {e}")
+
+def remove_dead_processes() -> List[int]:
+    """
+    Delete the files of workers that are no longer running, so their values
+    stop being reported (like prometheus_client's mark_process_dead).
+    
+    Returns:
+        PIDs whose files were removed
+    """
+    import utils
+    removed = []
+    for path in glob.glob(os.path.join(_metrics_dir(), '*.json')):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not name.isdigit() or utils.pid_alive(int(name)):
+            continue
+        try:
+            os.remove(path)
+            removed.append(int(name))
+        except OSError:
+            pass
+    return removed
+
+def _on_exit() -> None:
+    if _scraped_recently():
+        flush()
+
+atexit.register(_on_exit)
+
+def _merged() -> Dict[Tuple[str, Labels], List[float]]:
+    """Values of this process plus the last ones written by every other worker"""
+    merged: Dict[Tuple[str, Labels], List[float]] = {}
+    own = _own_file()
+    for path in glob.glob(os.path.join(_metrics_dir(), '*.json')):
+        if path == own:
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, values in entries:
+            if name not in METRICS:
+                continue
+            _add(merged, (name, tuple(tuple(pair) for pair in labels)), values)
+    with _lock:
+        for key, values in _values.items():
+            _add(merged, key, values)
+    return merged
+
+def _add(merged: Dict[Tuple[str, Labels], List[float]], key: Tuple[str, Labels], values: List[float]) -> None:
+    current = merged.get(key)
+    if current is None:
+        merged[key] = list(values)
+    elif len(current) == len(values):
+        for i, value in enumerate(values):
+            current[i] += value
+
+# ==================== EXPOSITION ====================
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+def _format_number(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+def render() -> str:
+    """
+    Get every metric of every worker in Prometheus text format.
+    
+    Also marks the metrics as being scraped, so workers start sharing their
+    values, and shares this worker's own; the first scrape after a quiet
+    period may lack other workers' latest values.
+    
+    Returns:
+        Exposition text (version 0.0.4)
+    """
+    marker = os.path.join(_metrics_dir(), SCRAPED_MARKER)
+    try:
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        with open(marker, 'a'):
+            os.utime(marker)
+    except OSError as e:
+        print(f"Error marking metrics as scraped: {e}")
+    flush()
+
+    by_name: Dict[str, List[Tuple[Labels, List[float]]]] = {}
+    for (name, labels), values in _merged().items():
+        by_name.setdefault(name, []).append((labels, values))
+
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, values in sorted(by_name.get(name, [])):
+            if kind == 'counter':
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(values[0])}')
+                continue
+            cumulative = 0.0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", repr(bound)))} {_format_number(cumulative)}')
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {_format_number(values[-1])}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(values[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {_format_number(values[-1])}')
+    return '\n'.join(lines) + '\n'
+
+# ==================== FLASK ====================
+
+def instrument(app) -> None:
+    """
+    Time every request of a Flask app by endpoint.
+    
+    Args:
+        app: The Flask application
+    """
+    from flask import g, request
+
+    # Left behind by workers of earlier runs
+    remove_dead_processes()
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    def _record(status: int) -> None:
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        endpoint = request.endpoint or 'unmatched'
+        observe('tiestyle_http_request_duration_seconds', time.perf_counter() - started,
+                endpoint=endpoint, method=request.method)
+        inc('tiestyle_http_requests_total', endpoint=endpoint, method=request.method, status=status)
+
+    @app.after_request
+    def _record_response(response):
+        _record(response.status_code)
+        return response
+
+    @app.teardown_request
+    def _record_failure(error):
+        # Only reached with the timer still set if the request raised
+        _record(500)
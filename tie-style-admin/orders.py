@@ -0,0 +1,376 @@
+"""
+Order event store: an append-only, segmented event log with daily rollups
+"""
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+import utils
+
+# Event log segments and rollups, in the admin state directory (orders hold
+# customer details and are never published)
+ORDERS_DIR = 'orders'
+ROLLUPS_FILE = f'{ORDERS_DIR}/rollups.json'
+# A new segment is started once the current one reaches this size
+SEGMENT_BYTES = int(os.getenv('ORDER_LOG_SEGMENT_BYTES', str(4 * 1024 * 1024)))
+LOG_LOCK = 'orders-log'
+
+# Statuses whose orders don't count towards revenue
+CANCELLED_STATUSES = ('cancelled',)
+DEFAULT_SOURCE = 'Website'
+# Chart order of the statuses used by the storefront and the orders admin page
+ORDER_STATUSES = ('pending', 'processing', 'packed', 'dispatched', 'in-transit', 'out-for-delivery',
+                  'delivered', 'completed', 'cancelled')
+PAYMENT_STATUSES = ('pending', 'confirmed', 'failed')
+
+def _log_dir() -> str:
+    return os.path.join(utils.STATE_DIR, ORDERS_DIR)
+
+def _segment_path(number: int) -> str:
+    return os.path.join(_log_dir(), f'events-{number:06d}.jsonl')
+
+def _segments() -> List[int]:
+    try:
+        names = os.listdir(_log_dir())
+    except FileNotFoundError:
+        return []
+    return sorted(int(n[7:13]) for n in names if n.startswith('events-') and n.endswith('.jsonl'))
+
+def _now() -> str:
+    return datetime.utcnow().isoformat() + 'Z'
+
+def _day(timestamp: Optional[str]) -> str:
+    try:
+        return datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).strftime('%Y-%m-%d')
+    except ValueError:
+        return datetime.utcnow().strftime('%Y-%m-%d')
+
+# ==================== EVENTS ====================
+
+def _customer_key(customer: Dict) -> Optional[str]:
+    """Identify a customer by phone (or email) without keeping it in the rollups"""
+    contact = ''.join(ch for ch in str(customer.get('phone') or '') if ch.isdigit())[-10:]
+    if not contact:
+        contact = str(customer.get('email') or '').strip().lower()
+    return hashlib.sha256(contact.encode('utf-8')).hexdigest()[:16] if contact else None
+
+def _placed_event(order: Dict) -> Dict:
+    order_id = order.get('orderId') or order.get('id')
+    if not order_id:
+        raise ValueError("Order has no orderId")
+    totals = order.get('totals') or {}
+    try:
+        total = float(order.get('total', totals.get('total', 0)) or 0)
+        units = sum(int(item.get('quantity', 1) or 0) for item in order.get('items') or [])
+    except (TypeError, ValueError, AttributeError):
+        raise ValueError(f"Order {order_id} has an invalid total or item quantity")
+    placed_at = order.get('createdAt') or order.get('date') or _now()
+    return {
+        'type': 'placed',
+        'orderId': str(order_id),
+        'at': placed_at,
+        'day': _day(placed_at),
+        'total': round(total, 2),
+        'units': units,
+        'status': order.get('status') or 'pending',
+        'paymentStatus': order.get('paymentStatus') or 'pending',
+        'source': order.get('source') or DEFAULT_SOURCE,
+        'customer': _customer_key(order.get('customer') or {}),
+        'order': order
+    }
+
+def normalize_events(data: Any, known: Dict[str, Dict]) -> Tuple[List[Dict], List[str]]:
+    """
+    Turn ingested JSON into log events.
+    
+    Accepts one item or a list of them. An item is either an event
+    ({'type': 'status', 'orderId', 'status'} or {'type': 'payment', 'orderId',
+    'paymentStatus'}) or an order as stored by the storefront (the
+    whshop_orders_v1 localStorage entries). Orders seen before become status
+    and payment events if those changed, and are skipped otherwise, so the
+    same order list can be posted again safely.
+    
+    Args:
+        data: Parsed request body
+        known: Current state of every ingested order (see get_rollups)
+    
+    Returns:
+        Tuple of (events to append, error messages)
+    """
+    items = data if isinstance(data, list) else [data]
+    events, errors = [], []
+    # Orders earlier in this batch count as known too
+    known = dict(known)
+    for item in items:
+        if not isinstance(item, dict):
+            errors.append("Each item must be a JSON object")
+            continue
+        order_id = str(item.get('orderId') or item.get('id') or '')
+        kind = item.get('type')
+        try:
+            if kind in ('status', 'payment'):
+                field = 'status' if kind == 'status' else 'paymentStatus'
+                if order_id not in known:
+                    raise ValueError(f"Unknown order {order_id or '(missing orderId)'}")
+                if not item.get(field):
+                    raise ValueError(f"Missing '{field}' for order {order_id}")
+                candidates = [{'type': kind, 'orderId': order_id, field: str(item[field])}]
+            elif kind in (None, 'placed'):
+                order = item.get('order', item) if kind == 'placed' else item
+                if order_id in known:
+                    candidates = [{'type': 'status', 'orderId': order_id, 'status': order.get('status')},
+                                  {'type': 'payment', 'orderId': order_id, 'paymentStatus': order.get('paymentStatus')}]
+                else:
+                    candidates = [_placed_event(order)]
+            else:
+                raise ValueError(f"Unknown event type '{kind}'")
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        for event in candidates:
+            if event['type'] == 'placed':
+                known[event['orderId']] = {'status': event['status'], 'paymentStatus': event['paymentStatus']}
+            else:
+                field = 'status' if event['type'] == 'status' else 'paymentStatus'
+                if not event[field] or known[order_id].get(field) == event[field]:
+                    continue
+                known[order_id] = dict(known[order_id], **{field: event[field]})
+            event.setdefault('at', _now())
+            events.append(event)
+    return events, errors
+
+# ==================== ROLLUPS ====================
+
+def _empty_rollups() -> Dict[str, Any]:
+    return {
+        # Log position up to which events have been applied
+        'position': {'segment': 1, 'offset': 0},
+        'days': {},
+        'orders': {},
+        'customers': {},
+        'repeatCustomers': 0,
+        'customerRevenue': 0
+    }
+
+def _bump(counts: Dict[str, int], key: str, delta: int) -> None:
+    counts[key] = counts.get(key, 0) + delta
+    if counts[key] <= 0:
+        del counts[key]
+
+def _revenue(order: Dict) -> float:
+    return 0 if order['status'] in CANCELLED_STATUSES else order['total']
+
+def _apply(rollups: Dict, event: Dict) -> None:
+    """Apply one event to the daily rollups"""
+    orders = rollups['orders']
+    if event['type'] == 'placed':
+        if event['orderId'] in orders:
+            return
+        order = {k: event[k] for k in ('day', 'total', 'units', 'status', 'paymentStatus', 'source', 'customer')}
+        orders[event['orderId']] = order
+        day = rollups['days'].setdefault(order['day'], {
+            'orders': 0, 'revenue': 0, 'units': 0, 'newCustomers': 0, 'status': {}, 'payment': {}, 'source': {}
+        })
+        day['orders'] += 1
+        day['units'] += order['units']
+        day['revenue'] = round(day['revenue'] + _revenue(order), 2)
+        _bump(day['status'], order['status'], 1)
+        _bump(day['payment'], order['paymentStatus'], 1)
+        _bump(day['source'], order['source'], 1)
+        if order['customer']:
+            customer = rollups['customers'].get(order['customer'])
+            if customer is None:
+                customer = rollups['customers'][order['customer']] = {'orders': 0, 'revenue': 0, 'firstDay': order['day']}
+                day['newCustomers'] += 1
+            customer['orders'] += 1
+            customer['revenue'] = round(customer['revenue'] + _revenue(order), 2)
+            rollups['customerRevenue'] = round(rollups['customerRevenue'] + _revenue(order), 2)
+            if customer['orders'] == 2:
+                rollups['repeatCustomers'] += 1
+        return
+
+    order = orders.get(event['orderId'])
+    if order is None:
+        return
+    day = rollups['days'][order['day']]
+    if event['type'] == 'status':
+        revenue_before = _revenue(order)
+        _bump(day['status'], order['status'], -1)
+        order['status'] = event['status']
+        _bump(day['status'], order['status'], 1)
+        delta = _revenue(order) - revenue_before
+        day['revenue'] = round(day['revenue'] + delta, 2)
+        if order['customer'] in rollups['customers']:
+            customer = rollups['customers'][order['customer']]
+            customer['revenue'] = round(customer['revenue'] + delta, 2)
+            rollups['customerRevenue'] = round(rollups['customerRevenue'] + delta, 2)
+    elif event['type'] == 'payment':
+        _bump(day['payment'], order['paymentStatus'], -1)
+        order['paymentStatus'] = event['paymentStatus']
+        _bump(day['payment'], order['paymentStatus'], 1)
+
+def _catch_up(rollups: Dict) -> bool:
+    """
+    Apply events appended after the rollups' recorded log position.
+    
+    Returns:
+        True if any events were applied
+    """
+    position = rollups['position']
+    changed = False
+    for number in _segments():
+        if number < position['segment']:
+            continue
+        path = _segment_path(number)
+        offset = position['offset'] if number == position['segment'] else 0
+        if os.path.getsize(path) <= offset:
+            continue
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # Partially written last line; picked up once complete
+                    break
+                offset += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    print(f"Skipping unreadable order event in {path} at byte {offset - len(line)}")
+                    continue
+                _apply(rollups, event)
+                changed = True
+        rollups['position'] = position = {'segment': number, 'offset': offset}
+    return changed
+
+def get_rollups() -> Dict[str, Any]:
+    """
+    Get the daily rollups, applying any events not yet rolled up.
+    
+    Returns:
+        Dictionary with 'days' (per-day order counts, revenue, units and
+        status/payment/source breakdowns), 'orders' (current state of every
+        order), 'customers' and 'repeatCustomers'
+    """
+    with utils.file_lock(LOG_LOCK):
+        rollups = utils.read_state_file(ROLLUPS_FILE, None) or _empty_rollups()
+        if _catch_up(rollups):
+            utils.write_state_file(ROLLUPS_FILE, rollups)
+    return rollups
+
+def rebuild() -> Dict[str, Any]:
+    """Recompute the rollups by replaying the whole event log"""
+    with utils.file_lock(LOG_LOCK):
+        rollups = _empty_rollups()
+        _catch_up(rollups)
+        utils.write_state_file(ROLLUPS_FILE, rollups)
+    return rollups
+
+def _append(events: List[Dict]) -> None:
+    """Append events to the current log segment, starting a new one when it is full"""
+    utils.ensure_directory_exists(_log_dir())
+    segments = _segments()
+    number = segments[-1] if segments else 1
+    path = _segment_path(number)
+    if os.path.exists(path) and os.path.getsize(path) >= SEGMENT_BYTES:
+        number += 1
+        path = _segment_path(number)
+    payload = ''.join(json.dumps(e, ensure_ascii=False, separators=(',', ':')) + '\n' for e in events)
+    with open(path, 'a+b') as f:
+        # Terminate a line left half-written by a crash, so it can't swallow the next event
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                payload = '\n' + payload
+        f.write(payload.encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+def ingest(data: Any) -> Dict[str, Any]:
+    """
+    Record orders and order updates.
+    
+    Events are appended to the log first and then folded into the rollups,
+    so a crash in between only delays the rollups until the next read.
+    
+    Args:
+        data: Parsed JSON (see normalize_events)
+    
+    Returns:
+        Summary with the number of events accepted and any errors
+    """
+    with utils.file_lock(LOG_LOCK):
+        rollups = get_rollups()
+        events, errors = normalize_events(data, rollups['orders'])
+        if events:
+            _append(events)
+            _catch_up(rollups)
+            utils.write_state_file(ROLLUPS_FILE, rollups)
+    return {
+        'accepted': len(events),
+        'placed': sum(1 for e in events if e['type'] == 'placed'),
+        'errors': errors
+    }
+
+# ==================== DASHBOARD ====================
+
+def _trend(current: float, previous: float) -> str:
+    if previous <= 0:
+        return '—' if current <= 0 else '↑ new'
+    change = (current - previous) / previous * 100
+    return f"{'↑' if change >= 0 else '↓'} {abs(change):.1f}%"
+
+def get_dashboard(days: int = 30) -> Dict[str, Any]:
+    """
+    Summarise the last `days` days of orders for the analytics page.
+    
+    Only the per-day rollups of this period and the one before it are read,
+    never the raw events.
+    
+    Returns:
+        Dictionary with totals, trends and chart series
+    """
+    rollups = get_rollups()
+    today = datetime.utcnow().date()
+    period = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days - 1, -1, -1)]
+    previous = [(today - timedelta(days=days + i)).strftime('%Y-%m-%d') for i in range(days)]
+    empty = {'orders': 0, 'revenue': 0, 'units': 0, 'newCustomers': 0, 'status': {}, 'payment': {}, 'source': {}}
+    current_days = [rollups['days'].get(d, empty) for d in period]
+    previous_days = [rollups['days'].get(d, empty) for d in previous]
+
+    def total(rows: List[Dict], field: str) -> float:
+        return sum(r[field] for r in rows)
+
+    def breakdown(field: str, order: Tuple[str, ...] = ()) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for row in current_days:
+            for key, count in row[field].items():
+                counts[key] = counts.get(key, 0) + count
+        rank = {key: i for i, key in enumerate(order)}
+        return dict(sorted(counts.items(), key=lambda kv: (rank.get(kv[0], len(rank)), -kv[1])))
+
+    revenue, orders = total(current_days, 'revenue'), total(current_days, 'orders')
+    customers = rollups['customers']
+    return {
+        'revenue': round(revenue, 2),
+        'revenueTrend': _trend(revenue, total(previous_days, 'revenue')),
+        'orders': orders,
+        'ordersTrend': _trend(orders, total(previous_days, 'orders')),
+        'units': total(current_days, 'units'),
+        'customers': len(customers),
+        'newCustomers': total(current_days, 'newCustomers'),
+        'repeatCustomers': round(rollups['repeatCustomers'] / len(customers) * 100, 1) if customers else 0,
+        'avgOrderValue': revenue / orders if orders else 0,
+        'lifetimeValue': rollups['customerRevenue'] / len(customers) if customers else 0,
+        'revenueByDay': {
+            'labels': [datetime.strptime(d, '%Y-%m-%d').strftime('%b %d') for d in period],
+            'data': [round(r['revenue'], 2) for r in current_days]
+        },
+        'period': (period[0], period[-1]),
+        'status': breakdown('status', ORDER_STATUSES),
+        'payment': dict({s: 0 for s in PAYMENT_STATUSES}, **breakdown('payment', PAYMENT_STATUSES)),
+        'source': breakdown('source')
+    }
@@ -0,0 +1,235 @@
+"""
+Opt-in request profiling (cProfile or tracemalloc), saved to a rotating profiles directory
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+import utils
+
+# Share of requests to profile (0 = only requests carrying PROFILE_HEADER)
+SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0') or 0)
+# 'cpu' (cProfile) or 'memory' (tracemalloc peak and top allocations)
+DEFAULT_MODE = os.getenv('PROFILE_MODE', 'cpu')
+# Requests with this header set to PROFILE_TOKEN are always profiled; unset disables the header
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_HEADER = 'X-Admin-Profile'
+# Optional header choosing the mode of a header-triggered profile
+MODE_HEADER = 'X-Admin-Profile-Mode'
+# Profiles kept; older ones are deleted
+KEEP_PROFILES = int(os.getenv('PROFILE_KEEP', '50'))
+PROFILES_DIR = os.path.join(utils.STATE_DIR, 'profiles')
+MODES = {'cpu': 'prof', 'memory': 'json'}
+# Allocation sites listed in a memory profile
+TOP_ALLOCATIONS = 25
+
+# Profilers are process-wide (tracemalloc) or exclusive (cProfile on 3.12+),
+# so concurrent requests are profiled one at a time and the others skipped
+_busy = threading.Lock()
+
+_NAME = re.compile(r'^(?P<stamp>\d{8}-\d{6}-\d{3})_(?P<method>[A-Z]+)_(?P<route>[\w-]+)_(?P<status>\d{3})_'
+                   r'(?P<ms>\d+)ms(?:_peak-(?P<peak>\d+))?\.(?P<ext>prof|json)$')
+
+def _requested_mode(environ: Dict) -> Optional[str]:
+    """Get the profiling mode for a request, or None to leave it alone"""
+    token = environ.get('HTTP_' + PROFILE_HEADER.upper().replace('-', '_'))
+    if token and PROFILE_TOKEN and hmac.compare_digest(token, PROFILE_TOKEN):
+        mode = environ.get('HTTP_' + MODE_HEADER.upper().replace('-', '_'), DEFAULT_MODE)
+        return mode if mode in MODES else DEFAULT_MODE
+    if SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE:
+        return DEFAULT_MODE if DEFAULT_MODE in MODES else 'cpu'
+    return None
+
+def _route_slug(path: str) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '-', path).strip('-')[:60] or 'root'
+
+def profile_filename(method: str, path: str, status: int, ms: float, mode: str, peak: Optional[int] = None) -> str:
+    """
+    Name a profile after its time, request, status and duration.
+    
+    Returns:
+        e.g. '20261017-101530-123_GET_products-edit-prod-006_200_245ms.prof'
+    """
+    now = datetime.now()
+    stamp = now.strftime('%Y%m%d-%H%M%S-') + f'{now.microsecond // 1000:03d}'
+    peak_part = f'_peak-{peak}' if peak is not None else ''
+    return f'{stamp}_{method}_{_route_slug(path)}_{status}_{round(ms)}ms{peak_part}.{MODES[mode]}'
+
+def _rotate() -> None:
+    names = sorted(name for name in os.listdir(PROFILES_DIR) if _NAME.match(name))
+    for name in names[:max(len(names) - KEEP_PROFILES, 0)]:
+        try:
+            os.remove(os.path.join(PROFILES_DIR, name))
+        except OSError:
+            pass
+
+def _memory_report(snapshot: tracemalloc.Snapshot, current: int, peak: int) -> Dict[str, Any]:
+    top = snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+    return {
+        'currentBytes': current,
+        'peakBytes': peak,
+        'top': [{
+            'location': f'{stat.traceback[0].filename}:{stat.traceback[0].lineno}',
+            'bytes': stat.size,
+            'count': stat.count
+        } for stat in top]
+    }
+
+class _ProfiledBody:
+    """
+    Response body of a profiled request. Profiling goes on while the server
+    iterates it, so streamed responses (generators, send_file) are covered
+    too, and the profile is saved when the server closes it.
+    """
+
+    def __init__(self, body, finish):
+        self.body = body
+        self._finish = finish
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self) -> None:
+        try:
+            if hasattr(self.body, 'close'):
+                self.body.close()
+        finally:
+            finish, self._finish = self._finish, None
+            if finish is not None:
+                finish()
+
+class ProfilingMiddleware:
+    """
+    WSGI middleware profiling whole requests (routing, view, templates,
+    response hooks and sending the body) when they are sampled or carry the
+    profiling header.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        mode = _requested_mode(environ)
+        if mode is None or not _busy.acquire(blocking=False):
+            return self.wsgi_app(environ, start_response)
+        # Released once the profile is saved (see _profile)
+        return self._profile(mode, environ, start_response)
+
+    def _profile(self, mode: str, environ, start_response):
+        status = [0]
+
+        def capture_status(status_line, headers, exc_info=None):
+            status[0] = int(status_line.split(' ', 1)[0])
+            return start_response(status_line, headers, exc_info)
+
+        profiler = cProfile.Profile() if mode == 'cpu' else None
+        was_tracing = tracemalloc.is_tracing()
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. a debugger) owns the hook
+                _busy.release()
+                return self.wsgi_app(environ, start_response)
+        else:
+            if not was_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+
+        def finish() -> None:
+            try:
+                ms = (time.perf_counter() - started) * 1000
+                report = None
+                if profiler is not None:
+                    profiler.disable()
+                else:
+                    current, peak = tracemalloc.get_traced_memory()
+                    report = _memory_report(tracemalloc.take_snapshot(), current, peak)
+                    if not was_tracing:
+                        tracemalloc.stop()
+                self._save(mode, environ, status[0] or 500, ms, profiler, report)
+            finally:
+                _busy.release()
+
+        try:
+            body = self.wsgi_app(environ, capture_status)
+        except BaseException:
+            finish()
+            raise
+        return _ProfiledBody(body, finish)
+
+    def _save(self, mode: str, environ, status: int, ms: float, profiler: Optional[cProfile.Profile],
+              report: Optional[Dict]) -> None:
+        name = profile_filename(environ.get('REQUEST_METHOD', 'GET'), environ.get('PATH_INFO', '/'), status, ms, mode,
+                                peak=report['peakBytes'] if report else None)
+        path = os.path.join(PROFILES_DIR, name)
+        try:
+            utils.ensure_directory_exists(PROFILES_DIR)
+            if profiler is not None:
+                profiler.dump_stats(path)
+            else:
+                with open(path, 'w', encoding='utf-8') as f:
+                    json.dump(dict(report, path=environ.get('PATH_INFO', '/'), ms=round(ms, 1)), f, indent=2)
+            _rotate()
+        except OSError as e:
+            print(f"Error saving profile {path}: {e}")
+
+def instrument(app) -> None:
+    """
+    Enable opt-in profiling of a Flask app's requests.
+    
+    Args:
+        app: The Flask application
+    """
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+
+def list_profiles(limit: int = 50) -> List[Dict[str, Any]]:
+    """
+    List saved profiles, newest first.
+    
+    Returns:
+        Dictionaries with name, mode, method, route, status, ms, peakBytes
+        (memory profiles), size and createdAt
+    """
+    try:
+        names = sorted((name for name in os.listdir(PROFILES_DIR) if _NAME.match(name)), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names[:limit]:
+        match = _NAME.match(name)
+        stamp = datetime.strptime(match['stamp'][:15], '%Y%m%d-%H%M%S')
+        profiles.append({
+            'name': name,
+            'mode': 'cpu' if match['ext'] == 'prof' else 'memory',
+            'method': match['method'],
+            'route': match['route'],
+            'status': int(match['status']),
+            'ms': int(match['ms']),
+            'peakBytes': int(match['peak']) if match['peak'] else None,
+            'size': os.path.getsize(os.path.join(PROFILES_DIR, name)),
+            'createdAt': stamp.isoformat()
+        })
+    return profiles
+
+def profile_path(name: str) -> Optional[str]:
+    """Get the path of a saved profile, or None if the name isn't one"""
+    path = os.path.join(PROFILES_DIR, name)
+    return path if _NAME.match(name) and os.path.isfile(path) else None
+
+def cpu_summary(name: str, limit: int = 40) -> str:
+    """Render the top functions of a cProfile profile by cumulative time"""
+    out = io.StringIO()
+    pstats.Stats(profile_path(name), stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
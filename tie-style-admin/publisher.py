@@ -0,0 +1,490 @@
+"""
+Publishing the site to GitHub (git add, commit and push) as a background job
+"""
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Iterator, Optional
+
+import datafiles
+import jobs
+import metrics
+import utils
+
+try:
+    from git import Repo, GitCommandError
+except ImportError:
+    Repo = None
+    GitCommandError = Exception
+
+JOB_TYPE = 'publish'
+PHASES = ('build', 'scan', 'stage', 'commit', 'push')
+DEFAULT_MESSAGE = 'Auto commit from Flask App'
+# Paths passed to one 'git add' call, to stay below command line limits
+STAGE_BATCH = 200
+
+# Auto-publish: publish once no change was made for AUTO_PUBLISH_QUIET seconds,
+# but no later than AUTO_PUBLISH_MAX_DELAY seconds after the first unpublished change
+AUTO_PUBLISH = os.getenv('AUTO_PUBLISH', '').lower() in ('1', 'true', 'yes')
+AUTO_PUBLISH_QUIET = float(os.getenv('AUTO_PUBLISH_QUIET_SECONDS', '120'))
+AUTO_PUBLISH_MAX_DELAY = float(os.getenv('AUTO_PUBLISH_MAX_DELAY_SECONDS', '900'))
+
+# Generated image variants, left out of the image counts in summaries
+_VARIANT_PATTERN = re.compile(r'-\d+w\.(?:webp|avif)$')
+
+class PublishError(Exception):
+    """Publishing failed; the message is shown to the user"""
+    def __init__(self, message: str, status: int = 500):
+        super().__init__(message)
+        self.status = status
+
+def get_settings() -> Dict[str, Any]:
+    """
+    Read the publish configuration from the environment (.env).
+    
+    Raises:
+        PublishError: If GitPython is missing or the token/repo URL are not set
+    """
+    if Repo is None:
+        raise PublishError("GitPython not installed")
+    settings = {
+        'repo_dir': os.getenv("REPO_DIR", os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        'token': os.getenv("GITHUB_TOKEN"),
+        'repo_url': os.getenv("GITHUB_REPO_URL"),
+        'branch': os.getenv("PUBLISH_BRANCH", "dev"),
+        'remote_name': os.getenv("REMOTE_NAME", "origin")
+    }
+    if not settings['token'] or not settings['repo_url']:
+        raise PublishError("GITHUB_TOKEN and GITHUB_REPO_URL must be set in .env", status=400)
+    if not os.path.exists(os.path.join(settings['repo_dir'], '.git')):
+        raise PublishError(f"Not a git repository: {settings['repo_dir']}. Make sure .git folder exists.", status=400)
+    return settings
+
+def _push_url(repo_url: str, token: str) -> str:
+    # Inject token into URL for HTTPS push
+    if repo_url.startswith("https://"):
+        at_idx = repo_url.find("//")
+        return repo_url[:at_idx+2] + f"x-access-token:{token}@" + repo_url[at_idx+2:]
+    return repo_url
+
+def _open_repo(repo_dir: str):
+    try:
+        return Repo(repo_dir)
+    except Exception:
+        # Try to fix git ownership issue
+        try:
+            os.system(f'git config --global --add safe.directory "{repo_dir}"')
+            return Repo(repo_dir)
+        except Exception:
+            raise PublishError(f"Cannot access git repository. Try running: git config --global --add safe.directory \"{repo_dir}\"")
+
+def _changed_files(repo) -> List[str]:
+    """List modified, deleted and untracked paths with a single 'git status' run"""
+    output = repo.git.status('--porcelain', '-z', '--untracked-files=all')
+    entries = output.split('\0')
+    changed = []
+    i = 0
+    while i < len(entries):
+        entry = entries[i]
+        i += 1
+        if len(entry) < 4:
+            continue
+        changed.append(entry[3:])
+        # Renames/copies are followed by the original path
+        if entry[0] in 'RC':
+            i += 1
+    return changed
+
+def _tracked_changes(repo_dir: str, pending: Dict[str, str]) -> List[str]:
+    """Map the admin's site-relative change set to repository paths, dropping any outside the repo"""
+    changed = []
+    for path in sorted(pending):
+        rel_path = os.path.relpath(os.path.join(utils.PARENT_DIR, path), repo_dir).replace('\\', '/')
+        if rel_path != '..' and not rel_path.startswith('../'):
+            changed.append(rel_path)
+    return changed
+
+def _batches(paths: List[str]) -> Iterator[List[str]]:
+    for i in range(0, len(paths), STAGE_BATCH):
+        yield paths[i:i + STAGE_BATCH]
+
+def _stage_paths(repo, repo_dir: str, paths: List[str]) -> None:
+    """Stage additions, modifications and deletions of the given paths only"""
+    # 'git add' rejects paths that neither exist nor are tracked (e.g. an
+    # image uploaded and deleted again before publishing)
+    stageable = [p for p in paths if os.path.lexists(os.path.join(repo_dir, p))]
+    missing = [p for p in paths if not os.path.lexists(os.path.join(repo_dir, p))]
+    for batch in _batches(missing):
+        tracked = set(repo.git.ls_files('-z', '--', *batch).split('\0'))
+        stageable.extend(p for p in batch if p in tracked)
+    for batch in _batches(stageable):
+        repo.git.add('-A', '--', *batch)
+
+def _staged_files(repo, repo_dir: str) -> Dict[str, int]:
+    """Get the files that will go into the commit, with their sizes in bytes (0 for deletions)"""
+    staged = {}
+    for path in repo.git.diff('--cached', '--name-only', '-z').split('\0'):
+        if path:
+            full_path = os.path.join(repo_dir, path)
+            staged[path] = os.path.getsize(full_path) if os.path.isfile(full_path) else 0
+    return staged
+
+def _format_bytes(size: int) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024 or unit == 'MB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _friendly_git_error(error_msg: str) -> str:
+    # Provide helpful error messages
+    if "Could not resolve host" in error_msg:
+        return "❌ Cannot connect to GitHub. Check your internet connection."
+    if "Authentication failed" in error_msg or "Invalid username or password" in error_msg:
+        return "❌ GitHub authentication failed. Check your GITHUB_TOKEN in .env file."
+    if "Repository not found" in error_msg:
+        return "❌ Repository not found. Check GITHUB_REPO_URL in .env file."
+    if "failed to push" in error_msg:
+        return f"❌ Push failed: {error_msg}"
+    return error_msg
+
+def _force_push(remote, branch: str) -> None:
+    print(f"⚠️ Attempting FORCE PUSH to {branch}...")
+    try:
+        remote.push(refspec=f"{branch}:{branch}", force=True)
+        print(f"✅ Successfully FORCE PUSHED to {branch}")
+    except Exception as force_err:
+        raise PublishError(f"Push rejected and force push failed: {str(force_err)}")
+
+def _unpushed(repo, remote_name: str, branch: str) -> bool:
+    """Check whether the branch has commits its remote-tracking branch lacks (e.g. after a failed push)"""
+    try:
+        return int(repo.git.rev_list('--count', f'{remote_name}/{branch}..{branch}')) > 0
+    except GitCommandError:
+        pass
+    # Never pushed: anything committed is waiting
+    try:
+        repo.git.rev_parse('--verify', '--quiet', f'{branch}^{{commit}}')
+        return True
+    except GitCommandError:
+        return False
+
+def _push(repo, remote_name: str, push_url: str, branch: str) -> None:
+    """Push the branch, falling back to a force push if the remote rejects it"""
+    # Temporarily set remote URL with token and push
+    remote = repo.remote(name=remote_name)
+    original_url = remote.url
+    remote.set_url(push_url)
+    try:
+        push_info = remote.push(refspec=f"{branch}:{branch}")
+        if push_info and len(push_info) > 0:
+            push_result = push_info[0]
+            if push_result.flags & push_result.ERROR:
+                summary = push_result.summary.lower()
+                if "rejected" not in summary and "fetch first" not in summary:
+                    raise PublishError(f"Push failed: {push_result.summary}")
+                print(f"⚠️ Push rejected: {push_result.summary}")
+                _force_push(remote, branch)
+            elif push_result.flags & push_result.REJECTED:
+                _force_push(remote, branch)
+    except GitCommandError as git_err:
+        raise PublishError(_friendly_git_error(str(git_err)))
+    finally:
+        # Restore original URL (never leave the token in .git/config)
+        try:
+            remote.set_url(original_url)
+        except Exception:
+            pass
+
+@contextmanager
+def _phase(job: Optional[Dict], timings: Dict[str, int], name: str) -> Iterator[None]:
+    """Report a publish phase as current and record how long it took (in ms, and in the metrics)"""
+    if job is not None:
+        jobs.report_progress(job, phase=name, timings=timings)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings[name] = round(elapsed * 1000)
+        metrics.observe('tiestyle_publish_phase_seconds', elapsed, phase=name)
+        if job is not None:
+            jobs.report_progress(job, timings=timings)
+
+def publish(message: str = DEFAULT_MESSAGE, job: Optional[Dict] = None, full: bool = False) -> Dict:
+    """
+    Commit changes in the site repository and push them to GitHub.
+    
+    By default only the files the admin recorded as written or deleted (see
+    utils.record_changes) are staged, which avoids scanning the whole working
+    tree. With full=True, git scans for and stages every change instead, e.g.
+    for files edited outside the admin.
+    
+    Args:
+        message: Commit message
+        job: The publish job, if running as one; phases and timings are reported on it
+        full: Scan the whole working tree instead of using the change set
+    
+    Returns:
+        Result dictionary with the commit, changed files and per-phase timings (ms)
+    
+    Raises:
+        PublishError: If the repository is not configured or git fails
+    """
+    settings = get_settings()
+    timings: Dict[str, int] = {}
+    started = time.perf_counter()
+
+    repo_dir = settings['repo_dir']
+    mode = 'full' if full else 'incremental'
+    no_changes = {
+        "ok": True,
+        "message": "ℹ️ No new changes to commit",
+        "branch": settings['branch'],
+        "mode": mode,
+        "changes": [],
+        "files": 0,
+        "bytes": 0,
+        "timings": timings
+    }
+
+    repo = _open_repo(repo_dir)
+    # Derived files still waiting for saves to settle go into this publish;
+    # the hashed copies are checked here too in case another worker's build
+    # hadn't run yet
+    with _phase(job, timings, 'build'):
+        utils.run_deferred()
+        datafiles.build()
+    # Taken before staging, so files changed while publishing stay pending
+    pending = utils.get_pending_changes()
+    try:
+        with _phase(job, timings, 'scan'):
+            changed_files = _changed_files(repo) if full else _tracked_changes(repo_dir, pending)
+
+        staged: Dict[str, int] = {}
+        if changed_files:
+            with _phase(job, timings, 'stage'):
+                if full:
+                    repo.git.add(all=True)
+                else:
+                    _stage_paths(repo, repo_dir, changed_files)
+                staged = _staged_files(repo, repo_dir)
+
+        if staged:
+            with _phase(job, timings, 'commit'):
+                commit = str(repo.index.commit(message))[:8]
+        elif _unpushed(repo, settings['remote_name'], settings['branch']):
+            # Nothing new (e.g. the changes went into a commit whose push failed), but commits are waiting
+            commit = repo.head.commit.hexsha[:8]
+        else:
+            # e.g. a data file saved with unchanged content
+            utils.clear_changes(pending)
+            return no_changes
+    except GitCommandError as git_e:
+        raise PublishError(f"Git error: {str(git_e)}")
+
+    with _phase(job, timings, 'push'):
+        _push(repo, settings['remote_name'], _push_url(settings['repo_url'], settings['token']), settings['branch'])
+    # Only cleared once pushed: after a failed push the changes stay pending,
+    # and the next publish pushes the commit holding them
+    utils.clear_changes(pending)
+
+    timings['total'] = round((time.perf_counter() - started) * 1000)
+    shipped_bytes = sum(staged.values())
+    if staged:
+        result_message = f"✅ Successfully Published to GitHub! ({len(staged)} files, {_format_bytes(shipped_bytes)})"
+    else:
+        result_message = "✅ Pushed the changes of an earlier publish to GitHub"
+    return {
+        "ok": True,
+        "message": result_message,
+        "branch": settings['branch'],
+        "mode": mode,
+        "commit": commit,
+        "changes": list(staged)[:10],  # Show first 10 changed files
+        "files": len(staged),
+        "bytes": shipped_bytes,
+        "timings": timings
+    }
+
+@jobs.handler(JOB_TYPE)
+def publish_job(job: Dict) -> Dict:
+    """Run a queued publish"""
+    payload = job['payload']
+    return publish(payload.get('message') or DEFAULT_MESSAGE, job=job, full=payload.get('full', False))
+
+def start_publish(message: str = DEFAULT_MESSAGE, full: bool = False) -> Dict:
+    """
+    Queue a publish job.
+    
+    Publishing is not retried automatically (a half-finished push is better
+    looked at by a person), and only one publish can be queued or running.
+    
+    Args:
+        message: Commit message
+        full: Scan the whole working tree instead of using the admin's change set
+    
+    Returns:
+        The new job
+    
+    Raises:
+        PublishError: If publishing is not configured
+        jobs.JobActiveError: If a publish is already in progress
+    """
+    get_settings()
+    return jobs.enqueue(JOB_TYPE, {'message': message, 'full': full}, max_attempts=1, unique=True)
+
+def get_status(job: Dict) -> Dict:
+    """Summarise a publish job for the status endpoint"""
+    progress = job.get('progress') or {}
+    status = {
+        'ok': job['status'] != jobs.FAILED,
+        'jobId': job['id'],
+        'status': job['status'],
+        'done': job['status'] not in jobs.ACTIVE_STATUSES,
+        'phase': progress.get('phase'),
+        'timings': progress.get('timings', {}),
+        'createdAt': job['createdAt'],
+        'finishedAt': job['finishedAt']
+    }
+    if job['status'] == jobs.SUCCEEDED and job['result']:
+        status.update(job['result'])
+    if job['error']:
+        status['error'] = job['error']
+    return status
+
+# ==================== AUTO-PUBLISH ====================
+
+_auto_timer: Optional[threading.Timer] = None
+_auto_due: Optional[datetime] = None
+_auto_pid: Optional[int] = None
+_auto_started_pid: Optional[int] = None
+_auto_lock = threading.Lock()
+
+def summarize_changes(pending: Dict[str, str]) -> str:
+    """
+    Build a commit message for a batch of changes.
+    
+    Args:
+        pending: Change set as returned by utils.get_pending_changes()
+    
+    Returns:
+        Message like 'Auto-publish: update news, products; 3 images added or changed (11 files)'
+    """
+    data_files = sorted({os.path.splitext(os.path.basename(p))[0] for p in pending if p.startswith('data/')})
+    changed_images = removed_images = 0
+    for path in pending:
+        if path.startswith('data/') or _VARIANT_PATTERN.search(path):
+            continue
+        if os.path.exists(os.path.join(utils.PARENT_DIR, path)):
+            changed_images += 1
+        else:
+            removed_images += 1
+
+    parts = []
+    if data_files:
+        parts.append('update ' + ', '.join(data_files))
+    if changed_images:
+        parts.append(f"{changed_images} image{'s' if changed_images != 1 else ''} added or changed")
+    if removed_images:
+        parts.append(f"{removed_images} image{'s' if removed_images != 1 else ''} removed")
+    summary = '; '.join(parts) or 'update generated files'
+    return f"Auto-publish: {summary} ({len(pending)} file{'s' if len(pending) != 1 else ''})"
+
+def _parse_time(timestamp: str) -> datetime:
+    return datetime.fromisoformat(timestamp.rstrip('Z'))
+
+def auto_publish_due(window: Optional[Dict] = None) -> Optional[datetime]:
+    """
+    Work out when the pending changes should be auto-published.
+    
+    Args:
+        window: Result of utils.get_change_window(), read if not given
+    
+    Returns:
+        UTC time the publish is due, or None if nothing is pending
+    """
+    window = window or utils.get_change_window()
+    if not window['files']:
+        return None
+    quiet_until = _parse_time(window['lastChangeAt']) + timedelta(seconds=AUTO_PUBLISH_QUIET)
+    latest = _parse_time(window['firstChangeAt'] or window['lastChangeAt']) + timedelta(seconds=AUTO_PUBLISH_MAX_DELAY)
+    return min(quiet_until, latest)
+
+def _schedule_auto_publish(due: datetime) -> None:
+    """Make sure this process checks again at (or before) the due time"""
+    global _auto_timer, _auto_due, _auto_pid
+    with _auto_lock:
+        if (_auto_timer is not None and _auto_pid == os.getpid() and _auto_timer.is_alive()
+                and _auto_due <= due):
+            return
+        if _auto_timer is not None and _auto_pid == os.getpid():
+            _auto_timer.cancel()
+        delay = max(0.0, (due - datetime.utcnow()).total_seconds())
+        _auto_timer = threading.Timer(delay, _auto_publish_check)
+        _auto_timer.daemon = True
+        _auto_due, _auto_pid = due, os.getpid()
+        _auto_timer.start()
+
+def _auto_publish_check() -> None:
+    """Publish the pending changes if they are due, otherwise check again later"""
+    global _auto_timer
+    with _auto_lock:
+        if _auto_timer is threading.current_thread():
+            _auto_timer = None
+    due = auto_publish_due()
+    if due is None:
+        return
+    if due > datetime.utcnow():
+        # More edits came in meanwhile
+        _schedule_auto_publish(due)
+        return
+    try:
+        job = start_publish(summarize_changes(utils.get_pending_changes()))
+        print(f"Auto-publish started (job {job['id']})")
+    except jobs.JobActiveError:
+        # A publish is running (possibly in another worker); anything it
+        # does not cover is published after another quiet period
+        _schedule_auto_publish(datetime.utcnow() + timedelta(seconds=AUTO_PUBLISH_QUIET))
+    except PublishError as e:
+        print(f"Auto-publish skipped: {e}")
+
+def _on_change(paths: List[str]) -> None:
+    due = auto_publish_due()
+    if due is not None:
+        _schedule_auto_publish(due)
+
+def ensure_auto_publish() -> None:
+    """
+    Start auto-publishing in this process if it is enabled.
+    
+    Picks up changes left pending by a restart; afterwards every recorded
+    change reschedules the publish.
+    """
+    global _auto_started_pid
+    if not AUTO_PUBLISH or _auto_started_pid == os.getpid():
+        return
+    with _auto_lock:
+        if _auto_started_pid == os.getpid():
+            return
+        _auto_started_pid = os.getpid()
+    utils.register_change_listener(_on_change)
+    due = auto_publish_due()
+    if due is not None:
+        _schedule_auto_publish(due)
+
+def get_auto_publish_status() -> Dict[str, Any]:
+    """Auto-publish settings and the changes waiting for it"""
+    window = utils.get_change_window()
+    due = auto_publish_due(window) if AUTO_PUBLISH else None
+    return {
+        'enabled': AUTO_PUBLISH,
+        'quietSeconds': AUTO_PUBLISH_QUIET,
+        'maxDelaySeconds': AUTO_PUBLISH_MAX_DELAY,
+        'pendingFiles': window['files'],
+        'firstChangeAt': window['firstChangeAt'],
+        'lastChangeAt': window['lastChangeAt'],
+        'dueAt': due.isoformat() + 'Z' if due else None
+    }
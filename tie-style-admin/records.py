@@ -0,0 +1,368 @@
+"""
+Compact, read-only record types for cached catalog snapshots
+
+Cached products, categories, subcategories and news items are held as
+slot-based records instead of dicts, and a product's color variants are held
+column-wise (names, packed RGB ints, stock counts and an availability bit
+mask) instead of one dict per color. Records behave like the read-only dicts
+they replace (get, [], in, iteration in the original key order, ==, Jinja
+attribute access), and convert back to exactly the same JSON, so templates,
+the storefront files and the JSON APIs see no difference.
+"""
+import os
+import re
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from operator import attrgetter
+from typing import Dict, List, Any, Iterator, Optional
+
+# Set COMPACT_RECORDS=0 to cache plain read-only dicts instead
+ENABLED = os.getenv('COMPACT_RECORDS', '1') != '0'
+
+COLOR_KEYS = ('name', 'hex', 'stock', 'available')
+_HEX = re.compile(r'#[0-9A-F]{6}')
+
+# Identical key orders share one tuple (most records of a file have the same keys)
+_key_orders: Dict[tuple, tuple] = {}
+# Key order -> getter of all those fields at once (for records without extra keys)
+_getters: Dict[tuple, attrgetter] = {}
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError("Cached catalog data is read-only; use utils.thaw() to get a mutable copy")
+
+def _thaw(value: Any) -> Any:
+    # utils imports this module, so look it up late
+    import utils
+    return utils.thaw(value)
+
+class ColorVariants(Sequence):
+    """
+    A product's color variants, stored column-wise.
+    
+    Items are ColorVariant views ({'name', 'hex', 'stock', 'available'});
+    use pack() to build one from a list of color dicts.
+    """
+    __slots__ = ('names', 'rgb', 'stocks', 'available_bits')
+
+    def __init__(self, names: tuple, rgb: array, stocks: array, available_bits: int):
+        object.__setattr__(self, 'names', names)
+        object.__setattr__(self, 'rgb', rgb)
+        object.__setattr__(self, 'stocks', stocks)
+        object.__setattr__(self, 'available_bits', available_bits)
+
+    __setattr__ = __delattr__ = _readonly
+
+    @classmethod
+    def pack(cls, colors: List[Any]) -> Optional['ColorVariants']:
+        """
+        Pack color dicts into columns.
+        
+        Returns:
+            ColorVariants, or None if any color doesn't have exactly the
+            standard keys in order with canonical values ('#RRGGBB' in
+            upper case, an int stock and a bool availability), which could
+            not be restored byte for byte
+        """
+        names, rgb, stocks, bits = [], [], [], 0
+        fullmatch, intern = _HEX.fullmatch, sys.intern
+        for i, color in enumerate(colors):
+            if not isinstance(color, dict) or tuple(color) != COLOR_KEYS:
+                return None
+            name, hex_value, stock, available = color.values()
+            if (type(name) is not str or type(hex_value) is not str or not fullmatch(hex_value)
+                    or type(stock) is not int or type(available) is not bool):
+                return None
+            names.append(intern(name))
+            rgb.append(int(hex_value[1:], 16))
+            stocks.append(stock)
+            if available:
+                bits |= 1 << i
+        try:
+            return cls(tuple(names), array('L', rgb), array('q', stocks), bits)
+        except OverflowError:
+            return None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [ColorVariant(self, i) for i in range(*index.indices(len(self.names)))]
+        if index < 0:
+            index += len(self.names)
+        if not 0 <= index < len(self.names):
+            raise IndexError('color index out of range')
+        return ColorVariant(self, index)
+
+    def __iter__(self) -> Iterator['ColorVariant']:
+        for i in range(len(self.names)):
+            yield ColorVariant(self, i)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, ColorVariants):
+            return (self.names == other.names and self.rgb == other.rgb and self.stocks == other.stocks
+                    and self.available_bits == other.available_bits)
+        if isinstance(other, (list, tuple)):
+            return len(other) == len(self.names) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Get the colors as a list of plain dicts"""
+        bits = self.available_bits
+        return [{'name': name, 'hex': '#%06X' % rgb, 'stock': stock, 'available': bool(bits >> i & 1)}
+                for i, (name, rgb, stock) in enumerate(zip(self.names, self.rgb, self.stocks))]
+
+    def copy(self) -> List[Dict[str, Any]]:
+        return self.to_list()
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo) -> List[Dict[str, Any]]:
+        return self.to_list()
+
+    def __reduce__(self):
+        return (ColorVariants, (self.names, self.rgb, self.stocks, self.available_bits))
+
+    def __repr__(self) -> str:
+        return f'ColorVariants({self.to_list()!r})'
+
+class ColorVariant(Mapping):
+    """Read-only view of one color in ColorVariants, like {'name', 'hex', 'stock', 'available'}"""
+    __slots__ = ('_colors', '_index')
+
+    def __init__(self, colors: ColorVariants, index: int):
+        object.__setattr__(self, '_colors', colors)
+        object.__setattr__(self, '_index', index)
+
+    __setattr__ = __delattr__ = _readonly
+
+    @property
+    def name(self) -> str:
+        return self._colors.names[self._index]
+
+    @property
+    def hex(self) -> str:
+        return '#%06X' % self._colors.rgb[self._index]
+
+    @property
+    def stock(self) -> int:
+        return self._colors.stocks[self._index]
+
+    @property
+    def available(self) -> bool:
+        return bool(self._colors.available_bits >> self._index & 1)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in COLOR_KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key) if key in COLOR_KEYS else default
+
+    def __contains__(self, key: Any) -> bool:
+        return key in COLOR_KEYS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(COLOR_KEYS)
+
+    def __len__(self) -> int:
+        return len(COLOR_KEYS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the color as a plain dict"""
+        return {'name': self.name, 'hex': self.hex, 'stock': self.stock, 'available': self.available}
+
+    def copy(self) -> Dict[str, Any]:
+        return self.to_dict()
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo) -> Dict[str, Any]:
+        return self.to_dict()
+
+    def __reduce__(self):
+        return (dict, (self.to_dict(),))
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+class Record(Mapping):
+    """
+    Read-only record with its known fields in slots.
+    
+    Subclasses list the fields in FIELDS; any other keys are kept aside, and
+    the original key order is kept (shared between records) so the record
+    converts back to the same JSON.
+    """
+    __slots__ = ('_keys', '_extra')
+    FIELDS: tuple = ()
+    _FIELD_SET: frozenset = frozenset()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._FIELD_SET = frozenset(cls.FIELDS)
+
+    def __init__(self, data: Dict[str, Any]):
+        fields, extra = self._FIELD_SET, None
+        for key, value in data.items():
+            if key in fields:
+                object.__setattr__(self, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        keys = tuple(data)
+        object.__setattr__(self, '_keys', _key_orders.setdefault(keys, keys))
+        object.__setattr__(self, '_extra', extra)
+
+    __setattr__ = __delattr__ = _readonly
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._FIELD_SET:
+            return getattr(self, key, default)
+        return self._extra.get(key, default) if self._extra is not None else default
+
+    def __contains__(self, key: Any) -> bool:
+        if key in self._FIELD_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get the record as a shallow dict in the original key order"""
+        keys, extra = self._keys, self._extra
+        if extra is None and len(keys) > 1:
+            getter = _getters.get(keys)
+            if getter is None:
+                getter = _getters.setdefault(keys, attrgetter(*keys))
+            return dict(zip(keys, getter(self)))
+        fields = self._FIELD_SET
+        return {key: getattr(self, key) if key in fields else extra[key] for key in keys}
+
+    def copy(self) -> Dict[str, Any]:
+        """Get a shallow mutable dict (use utils.thaw() for a deep copy)"""
+        return self.to_dict()
+
+    __copy__ = copy
+
+    def __deepcopy__(self, memo) -> Dict[str, Any]:
+        return _thaw(self)
+
+    def __reduce__(self):
+        return (type(self), (self.to_dict(),))
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+class Product(Record):
+    """A products.json record; colors in the standard form are stored as ColorVariants"""
+    FIELDS = ('id', 'sku', 'title', 'slug', 'categoryIds', 'subcategoryId', 'price', 'currency', 'stock',
+              'available', 'images', 'sizes', 'attributes', 'shortDescription', 'description', 'tags', 'colors',
+              'imageVariants', 'createdAt', 'updatedAt')
+    __slots__ = FIELDS
+
+    def __init__(self, data: Dict[str, Any]):
+        super().__init__(data)
+        colors = getattr(self, 'colors', None)
+        if isinstance(colors, list) and colors:
+            packed = ColorVariants.pack(colors)
+            if packed is not None:
+                object.__setattr__(self, 'colors', packed)
+
+class Category(Record):
+    """A categories.json record"""
+    FIELDS = ('id', 'name', 'slug', 'description', 'image', 'parentId', 'order', 'active')
+    __slots__ = FIELDS
+
+class Subcategory(Record):
+    """A subcategories.json record"""
+    FIELDS = ('id', 'name', 'slug', 'description', 'parentCategoryId', 'order', 'active')
+    __slots__ = FIELDS
+
+class NewsItem(Record):
+    """A news.json record"""
+    FIELDS = ('id', 'title', 'slug', 'type', 'content', 'media', 'startsAt', 'endsAt', 'active', 'cta')
+    __slots__ = FIELDS
+
+# Data file -> record type of its entries
+RECORD_TYPES = {
+    'products.json': Product,
+    'categories.json': Category,
+    'subcategories.json': Subcategory,
+    'news.json': NewsItem
+}
+
+def compact(filename: Optional[str], record: Any) -> Any:
+    """
+    Convert one parsed (frozen) record of a data file to its compact type.
+    
+    Args:
+        filename: Data file the record belongs to (e.g., 'products.json')
+        record: The record as a read-only dict
+    
+    Returns:
+        A compact record, or the record unchanged for other files, non-dict
+        entries or when ENABLED is off
+    """
+    record_type = RECORD_TYPES.get(filename) if ENABLED else None
+    if record_type is None or not isinstance(record, dict):
+        return record
+    return record_type(record)
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Record):
+        data = value.to_dict()
+        colors = data.get('colors')
+        if isinstance(colors, ColorVariants):
+            data['colors'] = colors.to_list()
+        return data
+    return value
+
+def plain(data: Any) -> Any:
+    """
+    Replace compact records in a record or list of records with plain dicts.
+    
+    json.dumps() with an indent runs the pure-Python encoder, which is much
+    slower through a default hook than on dicts, so writers of whole data
+    files convert first.
+    
+    Args:
+        data: A record, a list of records, or anything else (returned as is)
+    
+    Returns:
+        Data that json.dumps() encodes without json_default (except records
+        nested deeper, which still need it)
+    """
+    if isinstance(data, list):
+        return [_plain(item) for item in data]
+    return _plain(data)
+
+def json_default(value: Any) -> Any:
+    """
+    json.dumps() default hook encoding compact records like the dicts and
+    lists they replace, e.g. json.dumps(product, default=records.json_default).
+    """
+    if isinstance(value, (Record, ColorVariant)):
+        return value.to_dict()
+    if isinstance(value, ColorVariants):
+        return value.to_list()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
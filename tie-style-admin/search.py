@@ -0,0 +1,341 @@
+"""
+Full-text product search: an inverted index with prefix and typo-tolerant matching
+"""
+import bisect
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections.abc import Mapping
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+import utils
+
+# Static index for the storefront, relative to the data directory
+INDEX_FILE = 'search-index.json'
+INDEX_FORMAT = 1
+# Weight of a term by the field it appears in (a term keeps its best field)
+FIELD_WEIGHTS = {
+    'title': 8,
+    'tags': 5,
+    'sku': 4,
+    'colors': 4,
+    'attributes': 3,
+    'shortDescription': 2,
+    'description': 1
+}
+# Score multiplier by how a query word matched a term
+EXACT, PREFIX, TYPO = 1.0, 0.7, 0.5
+# Words shorter than this only match exactly or as a prefix
+TYPO_MIN_LENGTH = 4
+# Prefix expansions considered per query word
+PREFIX_LIMIT = 50
+DEFAULT_LIMIT = 20
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+
+def tokenize(text: Any) -> List[str]:
+    """
+    Split text into lowercase, accent-free words.
+    
+    Args:
+        text: Any value; non-strings are converted with str()
+    
+    Returns:
+        Words in order of appearance; single letters are dropped
+    """
+    if not text:
+        return []
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return [word for word in _TOKEN.findall(text) if len(word) > 1 or word.isdigit()]
+
+def product_fields(product: Dict) -> Dict[str, List[str]]:
+    """Get the searchable text of a product by field name"""
+    attributes = product.get('attributes') or {}
+    return {
+        'title': [product.get('title')],
+        'tags': list(product.get('tags') or []),
+        'sku': [product.get('sku')],
+        'colors': [color.get('name') for color in product.get('colors') or [] if isinstance(color, Mapping)],
+        'attributes': list(attributes.values()) if isinstance(attributes, dict) else [],
+        'shortDescription': [product.get('shortDescription')],
+        'description': [product.get('description')]
+    }
+
+def product_terms(product: Dict) -> Dict[str, int]:
+    """
+    Get the indexed terms of a product.
+    
+    Returns:
+        Mapping of term to the weight of the best field it appears in
+    """
+    terms: Dict[str, int] = {}
+    for field, values in product_fields(product).items():
+        weight = FIELD_WEIGHTS[field]
+        for value in values:
+            for term in tokenize(value):
+                if terms.get(term, 0) < weight:
+                    terms[term] = weight
+    return terms
+
+def _deletes(term: str) -> Set[str]:
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Whether a and b differ by one inserted, deleted, replaced or swapped letter at most"""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    i = 0
+    while i < len(a) and i < len(b) and a[i] == b[i]:
+        i += 1
+    if len(a) == len(b):
+        return a[i + 1:] == b[i + 1:] or a[i:i + 2] == b[i:i + 2][::-1] and a[i + 2:] == b[i + 2:]
+    return a[i + 1:] == b[i:] if len(a) > len(b) else a[i:] == b[i + 1:]
+
+class SearchIndex:
+    """
+    Inverted index over the products of one products.json version.
+    
+    Prefix matches are a bisect on the sorted term list. Typos (one letter
+    missing, extra, wrong or two swapped) are found through a map from every
+    single-letter deletion of a term to the term, so no term list is scanned.
+    """
+
+    def __init__(self, version: str):
+        self.version = version
+        self.docs: Dict[str, Dict[str, int]] = {}
+        self.meta: Dict[str, Dict] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.terms: List[str] = []
+        self.deletes: Dict[str, Set[str]] = {}
+
+    def add(self, product: Dict) -> None:
+        """Index a product, replacing any earlier entry with its ID"""
+        product_id = product.get('id')
+        if not product_id:
+            return
+        self.remove(product_id)
+        terms = product_terms(product)
+        self.docs[product_id] = terms
+        images = product.get('images') or []
+        self.meta[product_id] = {
+            'id': product_id,
+            'slug': product.get('slug', ''),
+            'title': product.get('title', ''),
+            'sku': product.get('sku', ''),
+            'thumbnail': images[0] if images else '',
+            'price': product.get('price', 0),
+            'available': bool(product.get('available', True))
+        }
+        for term, weight in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                bisect.insort(self.terms, term)
+                if len(term) >= TYPO_MIN_LENGTH:
+                    for variant in _deletes(term):
+                        self.deletes.setdefault(variant, set()).add(term)
+            posting[product_id] = weight
+
+    def remove(self, product_id: str) -> None:
+        """Drop a product from the index"""
+        terms = self.docs.pop(product_id, None)
+        self.meta.pop(product_id, None)
+        for term in terms or ():
+            posting = self.postings[term]
+            del posting[product_id]
+            if posting:
+                continue
+            del self.postings[term]
+            del self.terms[bisect.bisect_left(self.terms, term)]
+            if len(term) >= TYPO_MIN_LENGTH:
+                for variant in _deletes(term):
+                    similar = self.deletes[variant]
+                    similar.discard(term)
+                    if not similar:
+                        del self.deletes[variant]
+
+    def expand(self, word: str) -> Dict[str, float]:
+        """
+        Find the indexed terms a query word matches.
+        
+        Returns:
+            Mapping of term to match quality (EXACT, PREFIX or TYPO)
+        """
+        matches: Dict[str, float] = {}
+        start = bisect.bisect_left(self.terms, word)
+        for term in self.terms[start:start + PREFIX_LIMIT]:
+            if not term.startswith(word):
+                break
+            matches[term] = EXACT if term == word else PREFIX
+        if len(word) >= TYPO_MIN_LENGTH:
+            variants = _deletes(word)
+            similar = set(self.deletes.get(word, ()))
+            for variant in variants:
+                if variant in self.postings and len(variant) >= TYPO_MIN_LENGTH:
+                    similar.add(variant)
+                similar.update(self.deletes.get(variant, ()))
+            for term in similar:
+                # Deletions shared by two words can also hide two edits
+                if term not in matches and _within_one_edit(word, term):
+                    matches[term] = TYPO
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = DEFAULT_LIMIT) -> List[Tuple[str, float]]:
+        """
+        Find products containing every word of the query.
+        
+        Args:
+            query: Search text
+            limit: Maximum number of results (None for all)
+        
+        Returns:
+            (product ID, score) pairs, best first
+        """
+        scores: Optional[Dict[str, float]] = None
+        for word in dict.fromkeys(tokenize(query)):
+            word_scores: Dict[str, float] = {}
+            for term, quality in self.expand(word).items():
+                for product_id, weight in self.postings[term].items():
+                    score = weight * quality
+                    if word_scores.get(product_id, 0) < score:
+                        word_scores[product_id] = score
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {pid: total + word_scores[pid] for pid, total in scores.items() if pid in word_scores}
+            if not scores:
+                return []
+        if not scores:
+            return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.meta[item[0]]['title'].lower(), item[0]))
+        return ranked if limit is None else ranked[:limit]
+
+    def to_static(self) -> Dict[str, Any]:
+        """
+        Build the compact storefront index.
+        
+        Returns:
+            {"format": 1, "docs": [[id, slug, title, thumbnail, price, available], ...],
+            "terms": {term: [doc number, weight, doc number, weight, ...]}}
+        """
+        numbers = {product_id: n for n, product_id in enumerate(self.meta)}
+        docs = [[m['id'], m['slug'], m['title'], m['thumbnail'], m['price'], 1 if m['available'] else 0]
+                for m in self.meta.values()]
+        terms = {}
+        for term in self.terms:
+            flat: List[Any] = []
+            for product_id, weight in self.postings[term].items():
+                flat += (numbers[product_id], weight)
+            terms[term] = flat
+        return {'format': INDEX_FORMAT, 'docs': docs, 'terms': terms}
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+# Serialises writes of the storefront file, so the last one is the newest
+_static_lock = threading.Lock()
+# Name of the deferred build writing the storefront file (see utils.defer)
+STATIC_BUILD = 'search-index'
+
+def _build(products: Iterable[Dict], version: str) -> SearchIndex:
+    index = SearchIndex(version)
+    seen = set()
+    for product in products:
+        # Like the catalog index, the first product wins when an ID repeats
+        if product.get('id') not in seen:
+            seen.add(product.get('id'))
+            index.add(product)
+    return index
+
+def write_static() -> bool:
+    """
+    Write the storefront index file from the current search index, unless it
+    already matches.
+    
+    Saves only update the index in memory and defer this, so the file is
+    encoded once per burst of saves and outside the products lock.
+    
+    Returns:
+        True if the file is up to date
+    """
+    with _static_lock:
+        index = _index
+        if index is None or index.version != utils.get_data_version('products.json'):
+            index = _reindex()
+        with _index_lock:
+            data = index.to_static()
+        try:
+            with open(os.path.join(utils.DATA_DIR, INDEX_FILE), 'r', encoding='utf-8') as f:
+                if json.load(f) == data:
+                    # Unchanged (e.g. rebuilt after a restart); don't queue a publish
+                    return True
+        except (OSError, ValueError):
+            pass
+        if not utils.write_data_artifacts({INDEX_FILE: data}):
+            print(f"Error writing {INDEX_FILE}")
+            return False
+        return True
+
+def _reindex() -> SearchIndex:
+    global _index
+    with utils.file_lock('products.json'), _index_lock:
+        index = _index = _build(utils.get_all_products(), utils.get_data_version('products.json'))
+    return index
+
+def rebuild() -> Dict[str, Any]:
+    """
+    Reindex every product and rewrite the storefront index file.
+    
+    Returns:
+        Summary with the number of products and terms indexed
+    """
+    index = _reindex()
+    write_static()
+    return {'products': len(index.docs), 'terms': len(index.terms)}
+
+def get_index() -> SearchIndex:
+    """Get the search index, rebuilding it if products.json changed behind its back"""
+    index = _index
+    if index is None or index.version != utils.get_data_version('products.json'):
+        index = _reindex()
+        # The storefront file may be behind as well
+        utils.defer(STATIC_BUILD, write_static)
+    return index
+
+def search_products(query: str, limit: Optional[int] = DEFAULT_LIMIT) -> List[Dict]:
+    """
+    Search products by title, tags, SKU, colors, attributes and descriptions.
+    
+    Args:
+        query: Search text; words may be prefixes or contain a typo
+        limit: Maximum number of results (None for all)
+    
+    Returns:
+        Summaries (id, slug, title, sku, thumbnail, price, available, score)
+        of matching products, best first
+    """
+    index = get_index()
+    with _index_lock:
+        return [dict(index.meta[product_id], score=round(score, 2))
+                for product_id, score in index.search(query, limit)]
+
+def _on_products_saved(changes: utils.RecordChanges, before_version: str, after_version: str) -> None:
+    global _index
+    with _index_lock:
+        index = _index
+        if index is not None and index.version == before_version:
+            for old, new in changes:
+                if old is not None:
+                    index.remove(old.get('id'))
+                if new is not None:
+                    index.add(new)
+            index.version = after_version
+        else:
+            # Not built yet in this process, or a write was missed; the next
+            # search (or the deferred write) rebuilds it
+            _index = None
+    utils.defer(STATIC_BUILD, write_static)
+
+utils.register_record_listener('products.json', _on_products_saved)
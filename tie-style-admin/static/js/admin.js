@@ -1,4 +1,28 @@
 // --- Publish to GitHub ---
+const PUBLISH_PHASES = {
+  queued: "Waiting...",
+  build: "Preparing files...",
+  scan: "Checking changes...",
+  stage: "Staging...",
+  commit: "Committing...",
+  push: "Pushing...",
+};
+
+// Poll a publish job until it has finished
+async function waitForPublish(statusUrl, btn) {
+  while (true) {
+    const res = await fetch(statusUrl);
+    const data = await res.json();
+    if (!res.ok || data.done) {
+      return data;
+    }
+    if (btn) {
+      btn.textContent = PUBLISH_PHASES[data.phase || data.status] || "Publishing...";
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+}
+
 window.publishToGitHub = async function () {
   const btn = document.getElementById("publishBtn");
   if (btn) {
@@ -8,9 +32,16 @@ window.publishToGitHub = async function () {
   try {
     const res = await fetch(
       "/publish?message=" + encodeURIComponent("Publish from Admin"),
-      { method: "GET" }
+      { method: "POST" }
     );
-    const data = await res.json();
+    let data = await res.json();
+    if (res.status === 409 && data.statusUrl) {
+      // Someone else started a publish; follow that one instead
+      alert("ℹ️ A publish is already in progress. Waiting for it to finish.");
+    }
+    if (data.statusUrl) {
+      data = await waitForPublish(data.statusUrl, btn);
+    }
     if (data.ok) {
       let message = data.message;
       if (data.changes && data.changes.length > 0) {
@@ -0,0 +1,457 @@
+"""
+Storage backends for the catalog records: the JSON data files, or SQLite
+"""
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Mapping
+from typing import Dict, List, Any, Optional, Tuple
+
+import records
+import utils
+
+# 'json' (default) or 'sqlite'
+BACKEND = os.getenv('ADMIN_STORAGE', 'json').lower()
+# SQLite database, kept with the admin state (the data files are exported from it)
+DB_PATH = os.getenv('ADMIN_DB_PATH', os.path.join(utils.STATE_DIR, 'catalog.db'))
+
+# List-shaped data files and the document-shaped one
+COLLECTIONS = ('products.json', 'categories.json', 'subcategories.json', 'news.json')
+DOCUMENTS = ('store.json',)
+
+class JsonStorage:
+    """
+    Records kept in the data/*.json files, each rewritten whole on save.
+    
+    Callers hold utils.file_lock(filename) around writes.
+    """
+    name = 'json'
+
+    def records(self, filename: str) -> List[Dict]:
+        """Get every record of a collection (read-only snapshot)"""
+        return utils.read_json_file(filename)
+
+    def get(self, filename: str, record_id: str) -> Optional[Dict]:
+        """Get one record by ID (read-only)"""
+        return utils.get_index(filename).by_id.get(record_id)
+
+    def select(self, filename: str, field: str, value: Any) -> List[Dict]:
+        """Get the records whose field equals value (read-only)"""
+        index = utils.get_index(filename)
+        if field == 'slug':
+            record = index.by_id.get(index.by_slug.get(value))
+            return [record] if record is not None else []
+        if field == 'parentCategoryId':
+            return index.by_parent.get(value, utils.FrozenList())
+        return [r for r in index.snapshot if r.get(field) == value]
+
+    def version(self, filename: str) -> str:
+        """Get a string that changes whenever the collection changes"""
+        return utils.get_file_version(filename)
+
+    def put(self, filename: str, records: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Replace records with the same ID in place and append the others.
+        
+        Returns:
+            The previous version of each record (None for new ones)
+        
+        Raises:
+            IOError: If the file could not be written
+        """
+        version = utils.get_file_version(filename)
+        index = utils.get_index(filename)
+        stored = list(index.snapshot)
+        positions = dict(index.position)
+        previous = []
+        for record in records:
+            position = positions.get(record.get('id'))
+            if position is None:
+                previous.append(None)
+                positions[record.get('id')] = len(stored)
+                stored.append(record)
+            else:
+                previous.append(stored[position])
+                stored[position] = record
+        if not utils.write_json_file(filename, stored, expected_version=version):
+            raise IOError(f"Could not write {filename}")
+        return previous
+
+    def delete(self, filename: str, record_id: str) -> List[Dict]:
+        """
+        Remove every record with the given ID.
+        
+        Returns:
+            The removed records
+        """
+        version = utils.get_file_version(filename)
+        snapshot = utils.read_json_file(filename)
+        removed = [r for r in snapshot if r.get('id') == record_id]
+        if removed and not utils.write_json_file(filename, [r for r in snapshot if r.get('id') != record_id],
+                                                 expected_version=version):
+            raise IOError(f"Could not write {filename}")
+        return removed
+
+    def document(self, filename: str) -> Dict:
+        """Get a document-shaped file such as store.json (read-only)"""
+        return utils.read_json_file(filename)
+
+    def put_document(self, filename: str, data: Dict) -> None:
+        """Replace a document-shaped file"""
+        if not utils.write_json_file(filename, data, expected_version=utils.get_file_version(filename)):
+            raise IOError(f"Could not write {filename}")
+
+# ==================== SQLITE ====================
+
+# filename -> (table, [(column, record field, SQL type)]); the full record is
+# kept in 'data', the columns are indexed copies for lookups and queries
+TABLES: Dict[str, Tuple[str, List[Tuple[str, str, str]]]] = {
+    'products.json': ('products', [('sku', 'sku', 'TEXT'), ('slug', 'slug', 'TEXT'), ('title', 'title', 'TEXT'),
+                                   ('price', 'price', 'REAL'), ('stock', 'stock', 'INTEGER'),
+                                   ('available', 'available', 'INTEGER'),
+                                   ('subcategory_id', 'subcategoryId', 'TEXT'), ('updated_at', 'updatedAt', 'TEXT')]),
+    'categories.json': ('categories', [('slug', 'slug', 'TEXT'), ('name', 'name', 'TEXT')]),
+    'subcategories.json': ('subcategories', [('slug', 'slug', 'TEXT'), ('parent_category_id', 'parentCategoryId', 'TEXT')]),
+    'news.json': ('news', [('slug', 'slug', 'TEXT'), ('active', 'active', 'INTEGER')])
+}
+INDEXES = (
+    'products(slug)', 'products(sku)', 'products(subcategory_id)', 'products(updated_at)',
+    'categories(slug)', 'subcategories(slug)', 'subcategories(parent_category_id)', 'news(slug)'
+)
+
+SCHEMA = '\n'.join(
+    [f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, position INTEGER NOT NULL, "
+     + ''.join(f"{column} {kind}, " for column, _, kind in columns) + "data TEXT NOT NULL);"
+     for table, columns in TABLES.values()]
+    + [f"CREATE INDEX IF NOT EXISTS {spec.replace('(', '_').rstrip(')')} ON {spec};" for spec in INDEXES]
+    + [f"CREATE INDEX IF NOT EXISTS {table}_position ON {table}(position);" for table, _ in TABLES.values()]
+    + [
+        # Product category membership and color variants, one row each
+        "CREATE TABLE IF NOT EXISTS product_categories (product_id TEXT NOT NULL, category_id TEXT NOT NULL, "
+        "PRIMARY KEY (product_id, category_id));",
+        "CREATE INDEX IF NOT EXISTS product_categories_category ON product_categories(category_id);",
+        "CREATE TABLE IF NOT EXISTS product_colors (product_id TEXT NOT NULL, position INTEGER NOT NULL, "
+        "name TEXT, hex TEXT, stock INTEGER, available INTEGER, PRIMARY KEY (product_id, position));",
+        "CREATE INDEX IF NOT EXISTS product_colors_name ON product_colors(name);",
+        "CREATE TABLE IF NOT EXISTS documents (name TEXT PRIMARY KEY, data TEXT NOT NULL);",
+        # Bumped on every write, per data file
+        "CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL);"
+    ]
+)
+
+def _fragment(record: Dict) -> str:
+    """Encode a record exactly as write_json_file lays it out inside the list"""
+    payload = json.dumps(records.plain(record), indent=2, ensure_ascii=False, default=records.json_default)
+    return '  ' + payload.replace('\n', '\n  ')
+
+def _document(data: Dict) -> str:
+    """Encode a document-shaped file exactly as write_json_file lays it out"""
+    return json.dumps(records.plain(data), indent=2, ensure_ascii=False, default=records.json_default)
+
+def _column_value(value: Any) -> Any:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (str, int, float)) or value is None:
+        return value
+    return json.dumps(value, default=records.json_default)
+
+class SqliteStorage:
+    """
+    Records kept in indexed SQLite tables; a save writes only the changed rows.
+    
+    After a write the affected data file is exported for the storefront, as
+    a deferred build (see utils.defer), so a burst of saves exports each file
+    once. Each row keeps its record pre-encoded in the export's layout, so an
+    export concatenates the stored text without decoding or re-encoding any
+    record, and produces the same bytes the JSON backend would write.
+    """
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # filename -> (version, frozen snapshot)
+        self._snapshots: Dict[str, Tuple[int, Any]] = {}
+        self._lock = threading.Lock()
+
+    def connection(self) -> sqlite3.Connection:
+        """Get this thread's connection, creating the schema (and importing the data files) on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            utils.ensure_directory_exists(os.path.dirname(self.path))
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+            if conn.execute('SELECT COUNT(*) FROM versions').fetchone()[0] == 0:
+                with utils.file_lock('catalog.db'):
+                    if conn.execute('SELECT COUNT(*) FROM versions').fetchone()[0] == 0:
+                        self.import_files()
+        return conn
+
+    def _version(self, conn: sqlite3.Connection, filename: str) -> int:
+        row = conn.execute('SELECT version FROM versions WHERE name = ?', (filename,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, conn: sqlite3.Connection, filename: str) -> None:
+        conn.execute('INSERT INTO versions (name, version) VALUES (?, 1) '
+                     'ON CONFLICT(name) DO UPDATE SET version = version + 1', (filename,))
+
+    def version(self, filename: str) -> str:
+        """Get a string that changes whenever the collection changes"""
+        return f"db-{self._version(self.connection(), filename)}"
+
+    def _payload(self, conn: sqlite3.Connection, filename: str) -> str:
+        if filename in DOCUMENTS:
+            row = conn.execute('SELECT data FROM documents WHERE name = ?', (filename,)).fetchone()
+            return row[0] if row else '{}'
+        table = TABLES[filename][0]
+        fragments = [row[0] for row in conn.execute(f'SELECT data FROM {table} ORDER BY position')]
+        return '[\n' + ',\n'.join(fragments) + '\n]' if fragments else '[]'
+
+    def _snapshot(self, filename: str) -> Any:
+        conn = self.connection()
+        version = self._version(conn, filename)
+        with self._lock:
+            cached = self._snapshots.get(filename)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        # Read the payload and its version in one transaction so they match
+        conn.execute('BEGIN')
+        try:
+            version = self._version(conn, filename)
+            payload = self._payload(conn, filename)
+        finally:
+            conn.execute('COMMIT')
+        data = utils.parse_json_snapshot(payload, filename)
+        with self._lock:
+            self._snapshots[filename] = (version, data)
+        return data
+
+    def records(self, filename: str) -> List[Dict]:
+        """Get every record of a collection (read-only snapshot)"""
+        return self._snapshot(filename)
+
+    def get(self, filename: str, record_id: str) -> Optional[Dict]:
+        """Get one record by ID (read-only)"""
+        table = TABLES[filename][0]
+        row = self.connection().execute(f'SELECT data FROM {table} WHERE id = ?', (record_id,)).fetchone()
+        return utils.parse_json_snapshot(row[0], filename) if row else None
+
+    def select(self, filename: str, field: str, value: Any) -> List[Dict]:
+        """Get the records whose field equals value (read-only); indexed for the columns in TABLES"""
+        table, columns = TABLES[filename]
+        column = next((c for c, f, _ in columns if f == field), None)
+        if column is None:
+            return [r for r in self.records(filename) if r.get(field) == value]
+        rows = self.connection().execute(f'SELECT data FROM {table} WHERE {column} = ? ORDER BY position',
+                                         (_column_value(value),))
+        return utils.FrozenList(utils.parse_json_snapshot(row[0], filename) for row in rows)
+
+    def _write_rows(self, conn: sqlite3.Connection, filename: str, records: List[Dict],
+                    position: Optional[int] = None) -> None:
+        table, columns = TABLES[filename]
+        names = ['id', 'position'] + [c for c, _, _ in columns] + ['data']
+        updates = ', '.join(f'{n} = excluded.{n}' for n in names[2:])
+        sql = (f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+               f"ON CONFLICT(id) DO UPDATE SET {updates}")
+        if position is None:
+            position = conn.execute(f'SELECT COALESCE(MAX(position), -1) + 1 FROM {table}').fetchone()[0]
+        for record in records:
+            conn.execute(sql, [record.get('id'), position]
+                         + [_column_value(record.get(f)) for _, f, _ in columns] + [_fragment(record)])
+            position += 1
+            if table == 'products':
+                self._write_product_rows(conn, record)
+
+    def _write_product_rows(self, conn: sqlite3.Connection, product: Dict) -> None:
+        product_id = product.get('id')
+        conn.execute('DELETE FROM product_categories WHERE product_id = ?', (product_id,))
+        conn.execute('DELETE FROM product_colors WHERE product_id = ?', (product_id,))
+        conn.executemany('INSERT OR IGNORE INTO product_categories (product_id, category_id) VALUES (?, ?)',
+                         [(product_id, c) for c in product.get('categoryIds') or []])
+        conn.executemany('INSERT INTO product_colors (product_id, position, name, hex, stock, available) '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         [(product_id, i, c.get('name'), c.get('hex'), _column_value(c.get('stock')),
+                           _column_value(c.get('available')))
+                          for i, c in enumerate(product.get('colors') or []) if isinstance(c, Mapping)])
+
+    def _write_export(self, filename: str) -> None:
+        """Write the storefront's copy of a data file"""
+        payload = self._payload(self.connection(), filename)
+        if not utils.write_site_files({os.path.join(utils.DATA_DIR, filename): payload.encode('utf-8')}):
+            raise IOError(f"Could not export {filename}")
+        utils.invalidate_cache(filename)
+
+    def _export(self, filename: str) -> None:
+        """
+        Export a data file once saves have been quiet for utils.DEFER_SECONDS.
+        
+        The whole file is rewritten, so exporting on every save made a bulk
+        edit quadratic in the catalog size. Publishing and migrate() run
+        waiting exports first.
+        """
+        utils.defer(f'export:{filename}', lambda: self._write_export(filename))
+
+    def put(self, filename: str, records: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Insert or update records (existing records keep their position).
+        
+        Returns:
+            The previous version of each record (None for new ones)
+        """
+        conn = self.connection()
+        table = TABLES[filename][0]
+        previous = []
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for record in records:
+                row = conn.execute(f'SELECT data FROM {table} WHERE id = ?', (record.get('id'),)).fetchone()
+                previous.append(utils.parse_json_snapshot(row[0], filename) if row else None)
+                self._write_rows(conn, filename, [record])
+            self._bump(conn, filename)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._export(filename)
+        return previous
+
+    def delete(self, filename: str, record_id: str) -> List[Dict]:
+        """
+        Remove the record with the given ID.
+        
+        Returns:
+            The removed records
+        """
+        conn = self.connection()
+        table = TABLES[filename][0]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(f'SELECT data FROM {table} WHERE id = ?', (record_id,)).fetchone()
+            if row:
+                conn.execute(f'DELETE FROM {table} WHERE id = ?', (record_id,))
+                if table == 'products':
+                    conn.execute('DELETE FROM product_categories WHERE product_id = ?', (record_id,))
+                    conn.execute('DELETE FROM product_colors WHERE product_id = ?', (record_id,))
+                self._bump(conn, filename)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if not row:
+            return []
+        self._export(filename)
+        return [utils.parse_json_snapshot(row[0], filename)]
+
+    def document(self, filename: str) -> Dict:
+        """Get a document-shaped record such as store.json (read-only)"""
+        return self._snapshot(filename)
+
+    def put_document(self, filename: str, data: Dict) -> None:
+        """Replace a document-shaped record"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT INTO documents (name, data) VALUES (?, ?) '
+                         'ON CONFLICT(name) DO UPDATE SET data = excluded.data',
+                         (filename, _document(data)))
+            self._bump(conn, filename)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self._export(filename)
+
+    def import_files(self) -> Dict[str, int]:
+        """
+        Replace the database contents with the current data files.
+        
+        Returns:
+            Number of records imported per file; records repeating an
+            earlier ID are skipped (the JSON backend ignores them too)
+        """
+        conn = self.connection()
+        counts = {}
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for filename, (table, _) in TABLES.items():
+                conn.execute(f'DELETE FROM {table}')
+                if table == 'products':
+                    conn.execute('DELETE FROM product_categories')
+                    conn.execute('DELETE FROM product_colors')
+                records, seen = [], set()
+                for record in utils.read_json_file(filename):
+                    if record.get('id') not in seen:
+                        seen.add(record.get('id'))
+                        records.append(record)
+                self._write_rows(conn, filename, records, position=0)
+                self._bump(conn, filename)
+                counts[filename] = len(records)
+            for filename in DOCUMENTS:
+                conn.execute('INSERT INTO documents (name, data) VALUES (?, ?) '
+                             'ON CONFLICT(name) DO UPDATE SET data = excluded.data',
+                             (filename, _document(utils.read_json_file(filename))))
+                self._bump(conn, filename)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        with self._lock:
+            self._snapshots.clear()
+        return counts
+
+    def export_files(self) -> List[str]:
+        """Write every data file from the database"""
+        filenames = list(COLLECTIONS + DOCUMENTS)
+        for filename in filenames:
+            self._write_export(filename)
+        return filenames
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    """Get the configured storage backend (see ADMIN_STORAGE)"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if BACKEND == 'sqlite':
+                    _backend = SqliteStorage(DB_PATH)
+                elif BACKEND == 'json':
+                    _backend = JsonStorage()
+                else:
+                    raise ValueError(f"Unknown ADMIN_STORAGE backend: {BACKEND}")
+    return _backend
+
+def migrate(target: str, db_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Move the catalog between backends.
+    
+    'sqlite' imports the data files into the database (replacing what it
+    held, e.g. after pulling changes made elsewhere); 'json' writes the data
+    files from the database, after which ADMIN_STORAGE can be set back to json.
+    
+    Args:
+        target: 'sqlite' or 'json'
+        db_path: Database to use (default: DB_PATH)
+    
+    Returns:
+        Summary of what was imported or exported
+    """
+    if target not in ('sqlite', 'json'):
+        raise ValueError(f"Unknown storage backend: {target}")
+    # Exports still waiting would otherwise be overwritten or re-imported stale
+    utils.run_deferred()
+    store = get_backend() if BACKEND == 'sqlite' and not db_path else SqliteStorage(db_path or DB_PATH)
+    # Keep saves out while the whole catalog moves
+    with contextlib.ExitStack() as locks:
+        for filename in COLLECTIONS + DOCUMENTS + ('catalog.db',):
+            locks.enter_context(utils.file_lock(filename))
+        if target == 'sqlite':
+            return {'imported': store.import_files(), 'database': store.path}
+        return {'exported': store.export_files(), 'database': store.path}
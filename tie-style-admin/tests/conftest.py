@@ -0,0 +1,42 @@
+"""
+Fixtures pointing the admin at a throwaway copy of the site data
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+import utils  # noqa: E402
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    """Copy data/ into a temp site directory and point utils (and its state directory) at it"""
+    root = tmp_path / 'site'
+    shutil.copytree(os.path.join(utils.PARENT_DIR, 'data'), root / 'data')
+    monkeypatch.setattr(utils, 'PARENT_DIR', str(root))
+    monkeypatch.setattr(utils, 'DATA_DIR', str(root / 'data'))
+    # Outside the site, like the admin's own state directory
+    monkeypatch.setattr(utils, 'STATE_DIR', str(tmp_path / 'state'))
+    monkeypatch.setattr(utils, 'DEFER_SECONDS', 0)
+    utils.invalidate_cache()
+    yield root
+    utils.run_deferred()
+    utils.invalidate_cache()
+
+@pytest.fixture
+def admin(site, monkeypatch):
+    """The Flask app module, saving uploads into the temp site"""
+    import app as app_module
+    for name, folder in (('ASSETS', 'assets'), ('IMAGE', 'image')):
+        path = str(site / folder)
+        os.makedirs(path, exist_ok=True)
+        monkeypatch.setattr(utils, f'{name}_DIR', path)
+        monkeypatch.setattr(app_module, f'{name}_FOLDER', path)
+        monkeypatch.setitem(app_module.app.config, f'{name}_FOLDER', path)
+    monkeypatch.setattr(app_module, 'PARENT_DIR', str(site))
+    monkeypatch.setitem(app_module.app.config, 'TESTING', True)
+    return app_module
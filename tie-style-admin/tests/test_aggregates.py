@@ -0,0 +1,63 @@
+import json
+
+import aggregates
+import utils
+
+def _incremental():
+    state = utils.read_state_file(aggregates.STATE_FILE, None)
+    assert state['version'] == utils.get_data_version('products.json')
+    return state
+
+def _same(left, right):
+    assert left['totals'] == right['totals']
+    assert left['categories'] == right['categories']
+    assert left['lowStock'] == right['lowStock']
+    shown = aggregates.TOP_LIMIT
+    assert [e['value'] for e in left['top'][:shown]] == [e['value'] for e in right['top'][:shown]]
+    assert [e['updatedAt'] for e in left['recent'][:shown]] == [e['updatedAt'] for e in right['recent'][:shown]]
+
+def test_saves_update_the_stored_aggregates(site):
+    aggregates.rebuild()
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['stock'] = 1
+    product['price'] = 10 ** 8
+    assert utils.save_product(product, is_new=False)
+
+    state = _incremental()
+    assert state['lowStock']['prod-006']['stock'] == 1
+    assert state['top'][0]['id'] == 'prod-006'
+    assert state['recent'][0]['id'] == 'prod-006'
+    _same(state, aggregates.rebuild())
+
+def test_deletes_update_the_stored_aggregates(site):
+    first = aggregates.rebuild()
+    top_id = first['top'][0]['id']
+    assert utils.delete_product(top_id)
+
+    state = _incremental()
+    assert state['totals']['products'] == first['totals']['products'] - 1
+    assert top_id not in [e['id'] for e in state['top']]
+    _same(state, aggregates.rebuild())
+
+def test_external_edit_triggers_a_rebuild(site):
+    aggregates.rebuild()
+    products = utils.thaw(utils.get_all_products())
+    products[0]['stock'] = products[0].get('stock', 0) + 5
+    # Written around the record listeners, like a hand edit of products.json
+    (site / 'data' / 'products.json').write_text(json.dumps(products))
+    utils.invalidate_cache()
+    assert aggregates.get_aggregates()['totals']['stock'] == sum(p.get('stock', 0) for p in products)
+
+def test_inventory_alerts_show_five_out_of_stock_first(site):
+    products = utils.thaw(utils.get_all_products())
+    for product, stock in zip(products[:8], (7, 0, 3, 0, 9, 1, 0, 5)):
+        product['stock'] = stock
+    assert utils.save_products(products[:8])
+
+    alerts = aggregates.get_analytics_data()['inventory_alerts']
+    assert len(alerts) == aggregates.TOP_LIMIT
+    stocks = [alert['stock'] for alert in alerts]
+    assert stocks == sorted(stocks)
+    assert stocks[0] == 0
+    assert all(alert['type'] == 'alert' for alert in alerts if alert['stock'] == 0)
+    assert all(alert['type'] == 'warning' for alert in alerts if alert['stock'] > 0)
@@ -0,0 +1,83 @@
+import io
+
+import pytest
+
+import bulk
+import ids
+import utils
+
+def _export(fmt):
+    return ''.join(bulk.export_products(fmt))
+
+def _import(text, fmt, dry_run=False):
+    return bulk.import_products(bulk.iter_rows(io.BytesIO(text.encode('utf-8')), fmt), dry_run=dry_run)
+
+def _comparable(products):
+    # Imports strip surrounding whitespace (a few stored titles have some)
+    return [{field: value.strip() if isinstance(value, str) else value
+             for field, value in ((field, product.get(field)) for field in bulk.PRODUCT_FIELDS)}
+            for product in products]
+
+@pytest.mark.parametrize('fmt', bulk.FORMATS)
+def test_export_import_round_trip(site, fmt):
+    before = utils.thaw(utils.get_all_products())
+    report = _import(_export(fmt), fmt)
+    assert report['ok'] and report['errors'] == 0
+    assert report['updated'] == len(before) and report['created'] == 0
+    assert _comparable(utils.get_all_products()) == _comparable(before)
+
+def test_import_creates_products_with_new_ids(site):
+    before = len(utils.get_all_products())
+    text = 'title,price,stock\nImported Bow,12.5,4\nImported Tie,20,1\n'
+    report = _import(text, 'csv')
+    assert report['created'] == 2 and report['errors'] == 0
+    created = [utils.get_product_by_id(row['id']) for row in report['rows']]
+    assert [p['title'] for p in created] == ['Imported Bow', 'Imported Tie']
+    assert len({p['sku'] for p in created}) == 2
+    assert len(utils.get_all_products()) == before + 2
+
+def test_dry_run_saves_nothing(site):
+    version = utils.get_file_version('products.json')
+    counters = ids.get_counters()
+    report = _import('title,price,stock\nPreview Bow,5,1\n', 'csv', dry_run=True)
+    assert report['dry_run'] and report['created'] == 1
+    assert utils.get_file_version('products.json') == version
+    assert ids.get_counters() == counters
+
+def test_invalid_rows_are_reported_and_skipped(site):
+    taken = utils.get_all_products()[0]['sku']
+    text = f'id,title,price,stock,sku\nprod-999,Unknown,1,1,\n,Taken Sku,1,1,{taken}\n,Good Bow,1,1,\n'
+    report = _import(text, 'csv')
+    assert report['errors'] == 2 and report['created'] == 1
+    assert [row['status'] for row in report['rows']] == ['error', 'error', 'created']
+
+def test_stock_updates_keep_variant_totals(site):
+    report = bulk.apply_stock_updates([
+        {'id': 'prod-006', 'color': 'white', 'field': 'stock', 'op': 'inc', 'value': 5},
+        {'id': 'prod-006', 'field': 'price', 'value': '99.5'},
+        {'id': 'prod-060', 'field': 'stock', 'value': 7}
+    ])
+    assert report['ok'] and report['applied'] == 3 and report['errors'] == 0
+    product = utils.get_product_by_id('prod-006')
+    white = next(c for c in product['colors'] if c['name'] == 'White')
+    assert white['stock'] == 105
+    assert product['price'] == 99.5
+    assert product['stock'] == sum(c['stock'] for c in product['colors'])
+    assert utils.get_product_by_id('prod-060')['stock'] == 7
+
+def test_invalid_stock_updates_are_skipped(site):
+    report = bulk.apply_stock_updates([
+        {'id': 'prod-006', 'field': 'stock', 'value': 1},
+        {'id': 'prod-006', 'color': 'No Such Color', 'field': 'stock', 'value': 1},
+        {'id': 'prod-060', 'field': 'stock', 'op': 'inc', 'value': -1},
+        {'id': 'prod-unknown', 'field': 'price', 'value': 1},
+        {'id': 'prod-060', 'field': 'price', 'value': 120}
+    ])
+    assert [r['status'] for r in report['results']] == ['error', 'error', 'error', 'error', 'ok']
+    assert utils.get_product_by_id('prod-060')['price'] == 120
+
+def test_stock_update_dry_run_saves_nothing(site):
+    version = utils.get_file_version('products.json')
+    report = bulk.apply_stock_updates([{'id': 'prod-060', 'field': 'stock', 'value': 3}], dry_run=True)
+    assert report['applied'] == 1
+    assert utils.get_file_version('products.json') == version
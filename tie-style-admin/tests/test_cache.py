@@ -0,0 +1,41 @@
+import json
+import os
+
+import pytest
+
+import utils
+
+def _stats(filename):
+    return utils.get_cache_stats()['files'].get(filename, {'hits': 0, 'misses': 0, 'invalidations': 0})
+
+def test_repeated_reads_hit_the_cache(site):
+    first = utils.read_json_file('products.json')
+    misses = _stats('products.json')['misses']
+    assert utils.read_json_file('products.json') is first
+    assert _stats('products.json')['misses'] == misses
+    assert _stats('products.json')['hits'] >= 1
+
+def test_snapshots_are_read_only(site):
+    products = utils.read_json_file('products.json')
+    with pytest.raises(TypeError):
+        products[0]['title'] = 'Changed'
+
+def test_write_invalidates_and_keeps_version(site):
+    products = utils.thaw(utils.read_json_file('products.json'))
+    products[0]['title'] = 'Renamed Scrunchie'
+    assert utils.write_json_file('products.json', products)
+    version = utils.get_file_version('products.json')
+    # The version comes from the write; the data is parsed again on the next read
+    assert utils.read_json_file('products.json')[0]['title'] == 'Renamed Scrunchie'
+    assert utils.get_file_version('products.json') == version
+
+def test_external_change_is_picked_up(site):
+    before = utils.get_file_version('news.json')
+    path = os.path.join(utils.DATA_DIR, 'news.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        news = json.load(f)
+    news[0]['title'] = 'Edited by hand'
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(news, f, indent=4)
+    assert utils.read_json_file('news.json')[0]['title'] == 'Edited by hand'
+    assert utils.get_file_version('news.json') != before
@@ -0,0 +1,67 @@
+import json
+import os
+
+import catalog
+import utils
+
+def _read(rel_path):
+    with open(os.path.join(utils.DATA_DIR, rel_path), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _expected_shard(category_id):
+    return [catalog.product_card(p) for p in utils.get_all_products() if category_id in (p.get('categoryIds') or [])]
+
+def test_full_build_writes_index_and_shards(site):
+    summary = catalog.build(full=True)
+    products = utils.get_all_products()
+    assert summary['products'] == len(products)
+    assert _read(catalog.INDEX_FILE) == [catalog.product_card(p) for p in products]
+    for category in utils.read_json_file('categories.json'):
+        assert _read(catalog.shard_path('categories', category['id'])) == _expected_shard(category['id'])
+
+def test_cards_leave_out_the_heavy_fields(site):
+    card = catalog.product_card(utils.get_product_by_id('prod-006'))
+    assert 'description' not in card and 'colors' not in card and 'images' not in card
+    assert card['thumbnail'] == utils.get_product_by_id('prod-006')['images'][0]
+
+def test_saves_patch_the_artifacts(site):
+    catalog.build(full=True)
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    old_category = product['categoryIds'][0]
+    new_category = next(c['id'] for c in utils.read_json_file('categories.json') if c['id'] != old_category)
+    product['categoryIds'] = [new_category]
+    product['title'] = 'Moved Scrunchie'
+    assert utils.save_product(product, is_new=False)
+
+    cards = _read(catalog.INDEX_FILE)
+    assert next(c for c in cards if c['id'] == 'prod-006')['title'] == 'Moved Scrunchie'
+    assert 'prod-006' not in [c['id'] for c in _read(catalog.shard_path('categories', old_category))]
+    assert 'prod-006' in [c['id'] for c in _read(catalog.shard_path('categories', new_category))]
+    # Same result as building from scratch
+    patched = {path: _read(path) for path in (catalog.INDEX_FILE, catalog.shard_path('categories', old_category),
+                                               catalog.shard_path('categories', new_category))}
+    catalog.build(full=True)
+    assert patched == {path: _read(path) for path in patched}
+
+def test_unchanged_cards_write_nothing(site):
+    catalog.build(full=True)
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['description'] = 'Not part of the listing card'
+    assert utils.save_product(product, is_new=False)
+    assert catalog.build() == {'products': len(utils.get_all_products()), 'index': False,
+                               'shardsWritten': 0, 'shardsDeleted': 0}
+
+def test_deleted_products_leave_the_shards(site):
+    catalog.build(full=True)
+    product = utils.get_product_by_id('prod-006')
+    assert utils.delete_product('prod-006')
+    assert 'prod-006' not in [c['id'] for c in _read(catalog.INDEX_FILE)]
+    for category_id in product['categoryIds']:
+        assert 'prod-006' not in [c['id'] for c in _read(catalog.shard_path('categories', category_id))]
+
+def test_category_changes_add_and_remove_shards(site):
+    catalog.build(full=True)
+    assert utils.save_category({'id': 'cat-99', 'name': 'New', 'slug': 'new'})
+    assert _read(catalog.shard_path('categories', 'cat-99')) == []
+    assert utils.delete_category('cat-99')
+    assert not os.path.exists(os.path.join(utils.DATA_DIR, catalog.shard_path('categories', 'cat-99')))
@@ -0,0 +1,58 @@
+import random
+
+import pytest
+
+import aggregates
+import columnar
+import utils
+
+np = pytest.importorskip('numpy')
+
+def _product(i, price, stock, updated, categories):
+    return {'id': f'p{i}', 'title': f'Product {i}', 'price': price, 'stock': stock,
+            'updatedAt': updated, 'categoryIds': categories}
+
+def _catalogs():
+    rng = random.Random(7)
+    mixed = [_product(i, rng.choice([45, 80.5, 120.0, 0, 19.99]), rng.choice([0, 3, 10, 11, 500]),
+                      f'2026-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T00:00:00Z',
+                      rng.sample(['c1', 'c2', 'c3', 'c4'], rng.randint(0, 2)))
+             for i in range(300)]
+    ints = [_product(i, 100, i % 7, '2026-01-01T00:00:00Z', ['c1', 'c1'] if i % 5 == 0 else ['c2'])
+            for i in range(60)]
+    return {'mixed': mixed, 'ties': ints, 'one': mixed[:1], 'empty': []}
+
+@pytest.mark.parametrize('name', ['mixed', 'ties', 'one', 'empty'])
+def test_columns_give_the_same_aggregates_as_a_walk(name):
+    products = _catalogs()[name]
+    columns = columnar.get_columns(products)
+    assert columns is not None
+    assert aggregates._columnar_state(products, columns) == aggregates._walk_state(products)
+
+def test_stored_catalog_matches_with_and_without_numpy(site, monkeypatch):
+    with_numpy = aggregates.rebuild()
+    monkeypatch.setattr(columnar, 'np', None)
+    assert columnar.get_columns() is None
+    without = aggregates.rebuild()
+    assert with_numpy == without
+
+def test_unusual_values_fall_back_to_the_walk(site):
+    products = _catalogs()['mixed'][:10]
+    products[3] = dict(products[3], price='45')
+    assert columnar.get_columns(products) is None
+    products[3] = dict(products[3], price=45, updatedAt=None)
+    assert columnar.get_columns(products) is None
+
+def test_columns_are_reused_until_the_products_change(site):
+    columns = columnar.get_columns()
+    assert columnar.get_columns() is columns
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['stock'] = 1
+    assert utils.save_product(product, is_new=False)
+    assert columnar.get_columns() is not columns
+
+def test_top_k_keeps_index_order_for_ties():
+    keys = np.array([5, 9, 5, 9, 1, 5])
+    assert columnar.top_k(keys, 3) == [1, 3, 0]
+    assert columnar.top_k(keys, 10) == sorted(range(6), key=lambda i: -keys[i])
+    assert columnar.top_k(keys, 0) == []
@@ -0,0 +1,56 @@
+import gzip
+import json
+import os
+
+import datafiles
+import utils
+
+def _manifest():
+    with open(os.path.join(utils.DATA_DIR, datafiles.MANIFEST_FILE), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _site_file(path):
+    with open(os.path.join(utils.PARENT_DIR, path), 'rb') as f:
+        return f.read()
+
+def test_build_writes_hashed_and_compressed_copies(site):
+    datafiles.build()
+    manifest = _manifest()
+    with open(os.path.join(utils.DATA_DIR, 'products.json'), 'rb') as f:
+        payload = f.read()
+    path = manifest['products.json']
+    assert path == datafiles.hashed_path('products.json', payload)
+    assert _site_file(path) == payload
+    assert gzip.decompress(_site_file(path + '.gz')) == payload
+
+def test_unchanged_files_are_not_rewritten(site):
+    datafiles.build()
+    assert datafiles.build()['written'] == []
+
+def test_saves_build_the_changed_file_once_they_settle(site, monkeypatch):
+    datafiles.build()
+    before = _manifest()
+    monkeypatch.setattr(utils, 'DEFER_SECONDS', 60)
+    news = utils.thaw(utils.read_json_file('news.json'))
+    news[0]['title'] = 'Fresh news'
+    assert utils.write_json_file('news.json', news)
+    # Not inside the save...
+    assert _manifest() == before
+    # ...but once the saves settle (or a publish runs them)
+    utils.run_deferred()
+    after = _manifest()
+    assert after['news.json'] != before['news.json']
+    assert {name: path for name, path in after.items() if name != 'news.json'} == \
+        {name: path for name, path in before.items() if name != 'news.json'}
+
+def test_old_copies_are_kept_then_deleted(site):
+    paths = []
+    for title in ('One', 'Two', 'Three'):
+        news = utils.thaw(utils.read_json_file('news.json'))
+        news[0]['title'] = title
+        assert utils.write_json_file('news.json', news)
+        datafiles.build(['news.json'])
+        paths.append(_manifest()['news.json'])
+    assert os.path.exists(os.path.join(utils.PARENT_DIR, paths[1]))
+    for sibling in (paths[0], paths[0] + '.gz'):
+        assert not os.path.exists(os.path.join(utils.PARENT_DIR, sibling))
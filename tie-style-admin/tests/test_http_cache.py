@@ -0,0 +1,43 @@
+import http_cache
+import utils
+
+def test_unchanged_catalog_data_is_answered_304(admin, monkeypatch):
+    client = admin.app.test_client()
+    parent_id = utils.get_all_subcategories()[0]['parentCategoryId']
+    first = client.get(f'/api/subcategories/{parent_id}')
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == http_cache.DEFAULT_CACHE_CONTROL
+    etag = first.headers['ETag']
+
+    def unexpected(*args):
+        raise AssertionError('a matching ETag must not build the body')
+    monkeypatch.setattr(utils, 'get_subcategories_by_parent', unexpected)
+    again = client.get(f'/api/subcategories/{parent_id}', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert again.headers['ETag'] == etag
+
+def test_etags_change_with_the_data_and_the_query(admin):
+    client = admin.app.test_client()
+    etag = client.get('/api/products?per_page=5').headers['ETag']
+    assert client.get('/api/products?per_page=6').headers['ETag'] != etag
+
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['stock'] = product.get('stock', 0) + 1
+    assert utils.save_product(product, is_new=False)
+    response = client.get('/api/products?per_page=5', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+def test_other_endpoints_hash_the_body(admin):
+    client = admin.app.test_client()
+    first = client.get('/api/orders/summary')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/api/orders/summary', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+def test_errors_are_not_cached(admin):
+    response = admin.app.test_client().get('/api/jobs/job-missing')
+    assert response.status_code == 404
+    assert 'ETag' not in response.headers
+    assert response.headers.get('Cache-Control') != http_cache.DEFAULT_CACHE_CONTROL
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import images
+import utils
+
+Image = pytest.importorskip('PIL.Image')
+
+def _save_image(site, name, size):
+    path = os.path.join('assets', 'products', name)
+    os.makedirs(os.path.join(site, 'assets', 'products'), exist_ok=True)
+    Image.new('RGB', size, (200, 30, 60)).save(os.path.join(site, path), 'JPEG')
+    return path.replace('\\', '/')
+
+def test_variants_are_generated_per_width(site):
+    path = _save_image(site, 'red-bow.jpeg', (800, 400))
+    manifest = images.generate_variants(path)
+    assert manifest['width'] == 800 and manifest['height'] == 400
+    assert [entry['width'] for entry in manifest['webp']] == [w for w in images.VARIANT_WIDTHS if w < 800]
+    for entry in manifest['webp']:
+        with Image.open(os.path.join(utils.PARENT_DIR, entry['src'])) as variant:
+            assert variant.format == 'WEBP' and variant.width == entry['width']
+
+def test_small_images_get_one_variant(site):
+    path = _save_image(site, 'tiny.jpeg', (100, 50))
+    assert [entry['width'] for entry in images.generate_variants(path)['webp']] == [100]
+
+def test_delete_variants_leaves_similar_names(site):
+    path = _save_image(site, 'bow.jpeg', (800, 400))
+    other = _save_image(site, 'bow-2.jpeg', (800, 400))
+    images.generate_variants(path)
+    images.generate_variants(other)
+    deleted = images.delete_variants(path)
+    assert deleted and all(p.startswith('assets/products/bow-') and 'bow-2' not in p for p in deleted)
+    assert os.path.exists(os.path.join(utils.PARENT_DIR, images.variant_path(other, 320, 'webp')))
+
+def test_missing_pillow_warns_once(site, monkeypatch, capsys):
+    monkeypatch.setattr(images, 'Image', None)
+    monkeypatch.setattr(images, '_warned_missing', False)
+    assert images.generate_variants('assets/products/red-bow.jpeg') is None
+    assert images.generate_variants('assets/products/red-bow.jpeg') is None
+    assert capsys.readouterr().out.count('Pillow is not installed') == 1
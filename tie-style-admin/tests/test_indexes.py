@@ -0,0 +1,29 @@
+import utils
+
+def test_lookups_match_a_scan(site):
+    products = utils.get_all_products()
+    for product in products[:10]:
+        assert utils.get_product_by_id(product['id']) == product
+        assert utils.get_product_by_slug(product['slug'])['id'] == product['id']
+    assert utils.get_product_by_id('prod-does-not-exist') is None
+
+def test_subcategories_by_parent(site):
+    subcategories = utils.read_json_file('subcategories.json')
+    parent = subcategories[0]['parentCategoryId']
+    expected = [s['id'] for s in subcategories if s.get('parentCategoryId') == parent]
+    assert [s['id'] for s in utils.get_subcategories_by_parent(parent)] == expected
+
+def test_index_is_reused_until_the_data_changes(site):
+    index = utils.get_index('products.json')
+    assert utils.get_index('products.json') is index
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['sku'] = 'TEST-SKU-006'
+    assert utils.save_product(product, is_new=False)
+    index = utils.get_index('products.json')
+    assert index.by_sku['TEST-SKU-006'] == 'prod-006'
+    assert 'PLAI-SCR-006' not in index.by_sku
+
+def test_first_record_wins_on_duplicate_ids():
+    index = utils.CatalogIndex([{'id': 'a', 'slug': 'one'}, {'id': 'a', 'slug': 'two'}])
+    assert index.by_id['a']['slug'] == 'one'
+    assert 'two' not in index.by_slug
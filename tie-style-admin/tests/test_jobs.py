@@ -0,0 +1,113 @@
+import os
+
+import pytest
+
+import jobs
+
+calls = []
+
+@jobs.handler('test_echo')
+def _echo(job):
+    calls.append(job['id'])
+    jobs.report_progress(job, step='done')
+    return {'echo': job['payload'].get('value')}
+
+@jobs.handler('test_flaky')
+def _flaky(job):
+    if job['attempts'] < 2:
+        raise RuntimeError('not yet')
+    return 'ok'
+
+@jobs.handler('test_broken')
+def _broken(job):
+    raise RuntimeError('always broken')
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(jobs, 'RETRY_DELAY', 0.01)
+
+def test_job_runs_and_records_its_result(site):
+    job = jobs.enqueue('test_echo', {'value': 42})
+    done = jobs.wait(job['id'], timeout=5)
+    assert done['status'] == jobs.SUCCEEDED
+    assert done['result'] == {'echo': 42}
+    assert done['progress'] == {'step': 'done'}
+    assert done['attempts'] == 1 and done['finishedAt']
+    assert job['id'] in calls
+
+def test_failed_attempts_are_retried(site):
+    done = jobs.wait(jobs.enqueue('test_flaky')['id'], timeout=5)
+    assert done['status'] == jobs.SUCCEEDED and done['attempts'] == 2
+
+def test_job_fails_after_max_attempts(site):
+    done = jobs.wait(jobs.enqueue('test_broken', max_attempts=2)['id'], timeout=5)
+    assert done['status'] == jobs.FAILED
+    assert done['attempts'] == 2 and done['error'] == 'always broken'
+
+def test_unknown_job_type_is_refused(site):
+    with pytest.raises(ValueError):
+        jobs.enqueue('test_no_such_type')
+
+def test_unique_jobs_are_not_queued_twice(site):
+    with jobs.utils.file_lock(jobs.TABLE):
+        # Holding the table lock keeps the first job from being claimed
+        first = jobs.enqueue('test_echo', unique=True)
+        with pytest.raises(jobs.JobActiveError) as error:
+            jobs.enqueue('test_echo', unique=True)
+    assert error.value.job['id'] == first['id']
+    assert jobs.wait(first['id'], timeout=5)['status'] == jobs.SUCCEEDED
+
+def test_jobs_of_dead_workers_are_requeued(site, monkeypatch):
+    job = jobs.enqueue('test_echo', {'value': 1})
+    jobs.wait(job['id'], timeout=5)
+    with jobs.utils.file_lock(jobs.TABLE):
+        table = jobs._load()
+        table[job['id']].update(status=jobs.RUNNING, ownerPid=os.getpid(), ownerToken='earlier-process')
+        jobs._save(table)
+    # A new worker pool (e.g. after a restart) picks the job up again
+    monkeypatch.setattr(jobs, '_executor', None)
+    jobs.ensure_started()
+    done = jobs.wait(job['id'], timeout=5)
+    assert done['status'] == jobs.SUCCEEDED and done['attempts'] == 2
+
+def test_spool_is_removed_when_the_job_finishes(site):
+    directory = jobs.spool_dir()
+    open(os.path.join(directory, 'upload.jpeg'), 'wb').close()
+    jobs.wait(jobs.enqueue('test_echo', {'spoolDir': directory})['id'], timeout=5)
+    assert not os.path.exists(directory)
+
+def _image_job(admin, old_image):
+    directory = jobs.spool_dir()
+    spool = os.path.join(directory, '0-offer.jpg')
+    with open(spool, 'wb') as f:
+        f.write(b'new image')
+    payload = {'spoolDir': directory, 'record': 'news', 'recordId': 'news-001', 'field': 'image',
+               'replace': [old_image], 'multiple': False,
+               'uploads': [{'spool': spool, 'filename': 'offer.jpg', 'subfolder': 'news',
+                            'useImageDir': True, 'customFilename': None}]}
+    return {'id': 'test-job', 'payload': payload, 'progress': {}}
+
+def _old_image(site):
+    os.makedirs(site / 'image' / 'news', exist_ok=True)
+    (site / 'image' / 'news' / 'old.jpg').write_bytes(b'old image')
+    return 'image/news/old.jpg'
+
+def test_attach_images_replaces_old_images(admin, site):
+    old_image = _old_image(site)
+    result = admin.attach_images_job(_image_job(admin, old_image))
+    new_image = result['images'][0]
+    assert jobs.utils.get_news_by_id('news-001')['image'] == new_image
+    assert os.path.exists(site / new_image)
+    assert not os.path.exists(site / old_image)
+
+def test_attach_images_keeps_old_images_if_the_update_fails(admin, site, monkeypatch):
+    old_image = _old_image(site)
+
+    def fail(*args):
+        raise RuntimeError('disk full')
+
+    monkeypatch.setattr(admin, 'update_record_fields', fail)
+    with pytest.raises(RuntimeError):
+        admin.attach_images_job(_image_job(admin, old_image))
+    assert os.path.exists(site / old_image)
+    assert os.listdir(site / 'image' / 'news') == ['old.jpg']
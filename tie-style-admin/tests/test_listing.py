@@ -0,0 +1,81 @@
+import pytest
+
+import listing
+import utils
+
+def _expected(sort='', **filters):
+    products = list(enumerate(utils.get_all_products()))
+    if 'category' in filters:
+        products = [(i, p) for i, p in products if filters['category'] in (p.get('categoryIds') or [])]
+    if 'available' in filters:
+        products = [(i, p) for i, p in products if bool(p.get('available')) == filters['available']]
+    if 'stock_min' in filters:
+        products = [(i, p) for i, p in products if listing._number(p.get('stock')) >= filters['stock_min']]
+    if 'stock_max' in filters:
+        products = [(i, p) for i, p in products if listing._number(p.get('stock')) <= filters['stock_max']]
+    key = sort.lstrip('-')
+    rows = sorted((listing.SORT_KEYS[key](p, i), str(p.get('id') or ''), i) for i, p in products)
+    if sort.startswith('-'):
+        rows.reverse()
+    return [row[1] for row in rows]
+
+def _ids(page):
+    return [p['id'] for p in page['items']]
+
+@pytest.mark.parametrize('sort', ['', 'title', '-price', 'stock', '-updatedAt'])
+def test_filters_and_sorts_match_a_full_scan(site, sort):
+    index = listing.get_list_index()
+    category = max(index.by_category, key=lambda c: len(index.by_category[c]))
+    filters = {'category': category, 'available': True, 'stock_min': 1, 'stock_max': 50000}
+    expected = _expected(sort, **filters)
+    page = listing.query_products(per_page=listing.MAX_PAGE_SIZE, sort=sort, **filters)
+    assert page['total'] == len(expected) > 10
+    assert _ids(page) == expected[:listing.MAX_PAGE_SIZE]
+
+def test_numbered_pages_cover_the_catalog(site):
+    expected = _expected('-price')
+    seen = []
+    for number in range(1, listing.query_products(per_page=7)['pages'] + 1):
+        seen += _ids(listing.query_products(page=number, per_page=7, sort='-price'))
+    assert seen == expected
+
+@pytest.mark.parametrize('sort', ['title', '-stock'])
+def test_cursor_pages_are_stable_while_products_are_added(site, sort):
+    first = listing.query_products(per_page=10, sort=sort)
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product.update(id='prod-new', sku='NEW-001', slug='brand-new', title='AAA First', stock=10 ** 6)
+    assert utils.save_product(product)
+
+    seen = _ids(first)
+    cursor = first['nextCursor']
+    while cursor:
+        page = listing.query_products(per_page=10, sort=sort, cursor=cursor)
+        seen += _ids(page)
+        cursor = page['nextCursor']
+    # Sorted before the first page's end, so it is not shown and nothing repeats
+    assert 'prod-new' not in seen
+    assert sorted(seen) == sorted(set(seen))
+    assert len(seen) == len(utils.get_all_products()) - 1
+
+def test_text_match_needs_every_word(site):
+    product = utils.get_product_by_id('prod-006')
+    words = product['title'].split()[:2]
+    page = listing.query_products(q=' '.join(words).upper(), per_page=listing.MAX_PAGE_SIZE)
+    assert 'prod-006' in _ids(page)
+    assert all(all(w.casefold() in listing.get_list_index().text[utils.get_index('products.json').position[p['id']]]
+                   for w in words) for p in page['items'])
+
+def test_bad_input_is_ignored_or_refused(site):
+    assert listing.parse_args({'page': 'x', 'per_page': '9999', 'sort': 'bogus', 'available': 'maybe'}) == \
+        listing.parse_args({'per_page': str(listing.MAX_PAGE_SIZE)})
+    with pytest.raises(ValueError):
+        listing.query_products(cursor='not-a-cursor')
+
+def test_products_routes(admin):
+    client = admin.app.test_client()
+    response = client.get('/api/products?per_page=5&sort=-stock')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['items']) == 5 and body['nextCursor']
+    assert client.get('/api/products?cursor=zzz').status_code == 400
+    assert client.get('/products?per_page=5&cursor=zzz').status_code == 200
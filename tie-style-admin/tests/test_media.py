@@ -0,0 +1,92 @@
+import hashlib
+import os
+
+import media
+import utils
+
+def _write(site, path, content=b'image'):
+    full_path = site / path
+    os.makedirs(full_path.parent, exist_ok=True)
+    full_path.write_bytes(content)
+
+def _fingerprinted(path, content=b'image'):
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:media.FINGERPRINT_LENGTH]}{ext}"
+
+def test_names_follow_the_contents():
+    digest = 'ab' * 32
+    assert media.fingerprinted_name('bow', '.png', digest) == 'bow.abababab.png'
+    assert media.is_fingerprinted('assets/categories/bow.abababab.png')
+    assert not media.is_fingerprinted('assets/categories/bow.png')
+    assert media.logical_key('assets/categories/bow.abababab.png') == 'assets/categories/bow'
+
+def test_variants_of_fingerprinted_images_have_stable_names():
+    assert media.has_stable_name('assets/products/bow.abababab-320w.webp')
+    assert not media.has_stable_name('assets/products/bow-320w.webp')
+
+def test_manifest_follows_uploads_and_deletes(site):
+    media.update_manifest(added=['assets/categories/bow.abababab.png'])
+    assert media.get_manifest() == {'assets/categories/bow': 'assets/categories/bow.abababab.png'}
+    media.update_manifest(added=['assets/categories/bow.cdcdcdcd.png'])
+    media.update_manifest(removed=['assets/categories/bow.abababab.png'])
+    assert media.get_manifest() == {'assets/categories/bow': 'assets/categories/bow.cdcdcdcd.png'}
+    media.update_manifest(removed=['assets/categories/bow.cdcdcdcd.png'])
+    assert media.get_manifest() == {}
+
+def test_folders_with_old_names_are_not_cached_for_good(site):
+    _write(site, 'assets/products/bows/red.jpeg')
+    _write(site, _fingerprinted('assets/categories/bows.png'))
+    rules = media.update_cache_headers()
+    assert '/assets/products/*' not in rules
+    assert '/assets/categories/*' in rules
+    headers = (site / media.HEADERS_FILE).read_text(encoding='utf-8')
+    assert '/assets/categories/*\n  ! Cache-Control\n  Cache-Control: public, max-age=31536000, immutable' in headers
+    assert '/assets/products/*' not in headers
+
+def test_block_is_replaced_in_place(site):
+    (site / media.HEADERS_FILE).write_text(
+        f'/js/*.js\n  Cache-Control: no-cache\n\n{media.HEADERS_BEGIN}\n/old/*\n{media.HEADERS_END}\n\n/video/*\n',
+        encoding='utf-8')
+    _write(site, 'image/news/offer.jpg')
+    media.update_cache_headers()
+    headers = (site / media.HEADERS_FILE).read_text(encoding='utf-8')
+    assert headers.startswith('/js/*.js\n') and headers.endswith('\n\n/video/*\n')
+    assert '/old/*' not in headers and '/image/news/*' not in headers
+    assert headers.count(media.HEADERS_BEGIN) == 1
+
+def test_migrate_renames_images_and_enables_caching(site):
+    _write(site, 'assets/categories/bows.png', b'category image')
+    categories = utils.thaw(utils.read_json_file('categories.json'))
+    categories[0]['image'] = 'assets/categories/bows.png'
+    assert utils.write_json_file('categories.json', categories)
+    assert '/assets/categories/*' not in media.immutable_rules()
+
+    summary = media.migrate()
+    new_path = _fingerprinted('assets/categories/bows.png', b'category image')
+    assert summary['renamed']['assets/categories/bows.png'] == new_path
+    assert utils.read_json_file('categories.json')[0]['image'] == new_path
+    assert (site / new_path).read_bytes() == b'category image'
+    assert not (site / 'assets/categories/bows.png').exists()
+    assert media.get_manifest()['assets/categories/bows'] == new_path
+    assert '/assets/categories/*' in (site / media.HEADERS_FILE).read_text(encoding='utf-8')
+
+def test_migrate_keeps_names_linked_from_pages(site):
+    _write(site, 'assets/categories/bows.png', b'category image')
+    (site / 'index.html').write_text('<img src="assets/categories/bows.png">', encoding='utf-8')
+    categories = utils.thaw(utils.read_json_file('categories.json'))
+    categories[0]['image'] = 'assets/categories/bows.png'
+    assert utils.write_json_file('categories.json', categories)
+    media.migrate()
+    assert (site / 'assets/categories/bows.png').exists()
+    assert '/assets/categories/*' not in media.immutable_rules()
+
+def test_dry_run_changes_nothing(site):
+    _write(site, 'image/news/offer.jpg')
+    news = utils.thaw(utils.read_json_file('news.json'))
+    news[0]['media'] = 'image/news/offer.jpg'
+    assert utils.write_json_file('news.json', news)
+    version = utils.get_file_version('news.json')
+    summary = media.migrate(dry_run=True)
+    assert 'image/news/offer.jpg' in summary['renamed'] and summary['dryRun']
+    assert utils.get_file_version('news.json') == version
+    assert (site / 'image/news/offer.jpg').exists()
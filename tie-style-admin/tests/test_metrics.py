@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+import pytest
+
+import metrics
+import utils
+
+@pytest.fixture
+def fresh(site, monkeypatch):
+    """Metrics of a worker that has recorded nothing yet, sharing through the temp state directory"""
+    monkeypatch.setattr(metrics, '_values', {})
+    monkeypatch.setattr(metrics, '_dirty', False)
+    monkeypatch.setattr(metrics, '_next_flush', 0.0)
+    monkeypatch.setattr(metrics, 'FLUSH_INTERVAL', 0.2)
+    yield
+    timer = metrics._flush_timer
+    if timer is not None:
+        timer.cancel()
+
+def _shared():
+    """Counter values this worker shared with the others"""
+    try:
+        with open(metrics._own_file(), encoding='utf-8') as f:
+            return {name: values[0] for name, labels, values in json.load(f) if name.endswith('_total')}
+    except FileNotFoundError:
+        return {}
+
+def test_idle_workers_share_their_last_updates(fresh):
+    metrics.render()
+    metrics.inc('tiestyle_upload_bytes_total', 10)
+    metrics.inc('tiestyle_upload_bytes_total', 5)
+    # The second update is within the flush interval, so only the first is shared yet
+    assert _shared() == {'tiestyle_upload_bytes_total': 10}
+
+    deadline = time.monotonic() + 5
+    while _shared() != {'tiestyle_upload_bytes_total': 15} and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert _shared() == {'tiestyle_upload_bytes_total': 15}
+
+def test_nothing_is_shared_until_scraped(fresh):
+    metrics.inc('tiestyle_upload_bytes_total', 10)
+    assert _shared() == {}
+    # Scraping shares this worker's values right away
+    metrics.render()
+    assert _shared() == {'tiestyle_upload_bytes_total': 10}
+
+def test_render_adds_up_every_worker(fresh):
+    metrics.inc('tiestyle_upload_bytes_total', 10, kind='image')
+    metrics.observe('tiestyle_upload_seconds', 0.02)
+    other = os.path.join(metrics._metrics_dir(), f'{os.getppid()}.json')
+    os.makedirs(os.path.dirname(other), exist_ok=True)
+    with open(other, 'w', encoding='utf-8') as f:
+        json.dump([['tiestyle_upload_bytes_total', [['kind', 'image']], [32]],
+                   ['tiestyle_upload_seconds', [], [0, 0, 1] + [0] * 8 + [0.02, 1]]], f)
+
+    text = metrics.render()
+    assert 'tiestyle_upload_bytes_total{kind="image"} 42\n' in text
+    assert 'tiestyle_upload_seconds_count 2\n' in text
+    assert 'tiestyle_upload_seconds_bucket{le="0.025"} 2\n' in text
+
+def test_dead_workers_are_removed(fresh, monkeypatch):
+    directory = metrics._metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    for pid in (111, 222):
+        with open(os.path.join(directory, f'{pid}.json'), 'w') as f:
+            f.write('[]')
+    monkeypatch.setattr(utils, 'pid_alive', lambda pid: pid == 222)
+    assert metrics.remove_dead_processes() == [111]
+    assert os.path.exists(os.path.join(directory, '222.json'))
+
+def test_requests_are_timed_by_endpoint(admin, fresh):
+    client = admin.app.test_client()
+    client.get('/api/orders/summary')
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'tiestyle_http_requests_total{endpoint="orders_summary_api",method="GET",status="200"} 1' in text
@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import orders
+
+def _order(order_id, total, phone='98765 43210', **fields):
+    order = {
+        'orderId': order_id,
+        'createdAt': datetime.utcnow().isoformat() + 'Z',
+        'total': total,
+        'items': [{'quantity': 2}],
+        'customer': {'name': 'Test', 'phone': phone},
+    }
+    order.update(fields)
+    return order
+
+def test_orders_roll_up_into_the_dashboard(site):
+    result = orders.ingest([_order('WH-1', 500), _order('WH-2', 250), _order('WH-3', 100, phone='91234 56789')])
+    assert result == {'accepted': 3, 'placed': 3, 'errors': []}
+
+    dashboard = orders.get_dashboard()
+    assert dashboard['orders'] == 3
+    assert dashboard['revenue'] == 850
+    assert dashboard['units'] == 6
+    assert dashboard['customers'] == 2
+    assert dashboard['repeatCustomers'] == 50.0
+    assert dashboard['status'] == {'pending': 3}
+
+def test_reposting_orders_only_records_changes(site):
+    orders.ingest([_order('WH-1', 500), _order('WH-2', 250)])
+    result = orders.ingest([_order('WH-1', 500), _order('WH-2', 250, status='cancelled', paymentStatus='failed')])
+    assert result['placed'] == 0
+    assert result['accepted'] == 2
+
+    dashboard = orders.get_dashboard()
+    assert dashboard['orders'] == 2
+    assert dashboard['revenue'] == 500
+    assert dashboard['status'] == {'pending': 1, 'cancelled': 1}
+    assert dashboard['payment'] == {'pending': 1, 'confirmed': 0, 'failed': 1}
+
+def test_invalid_items_are_reported(site):
+    result = orders.ingest([{'type': 'status', 'orderId': 'WH-404', 'status': 'packed'},
+                            {'type': 'refund', 'orderId': 'WH-1'}, 'not an order'])
+    assert result['accepted'] == 0
+    assert len(result['errors']) == 3
+
+def test_rollups_match_a_replay_across_segments(site, monkeypatch):
+    monkeypatch.setattr(orders, 'SEGMENT_BYTES', 512)
+    for i in range(12):
+        orders.ingest(_order(f'WH-{i}', 100 + i, phone=f'9000000{i:03d}'))
+    orders.ingest({'type': 'status', 'orderId': 'WH-3', 'status': 'delivered'})
+    assert len(orders._segments()) > 1
+
+    rollups = orders.get_rollups()
+    assert orders.rebuild() == rollups
+
+def test_partial_lines_wait_until_complete(site):
+    orders.ingest(_order('WH-1', 500))
+    path = orders._segment_path(orders._segments()[-1])
+    with open(path, 'ab') as f:
+        f.write(b'{"type": "status", "orderId": "WH-1"')
+    assert len(orders.get_rollups()['orders']) == 1
+
+    # The next append terminates the torn line instead of gluing onto it
+    orders.ingest(_order('WH-2', 250))
+    assert set(orders.rebuild()['orders']) == {'WH-1', 'WH-2'}
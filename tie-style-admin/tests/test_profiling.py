@@ -0,0 +1,83 @@
+import json
+import os
+import pstats
+import time
+
+import pytest
+
+import profiling
+
+TOKEN = 'test-token'
+
+@pytest.fixture
+def profiles(tmp_path, monkeypatch):
+    directory = tmp_path / 'profiles'
+    monkeypatch.setattr(profiling, 'PROFILES_DIR', str(directory))
+    monkeypatch.setattr(profiling, 'PROFILE_TOKEN', TOKEN)
+    monkeypatch.setattr(profiling, 'SAMPLE_RATE', 0)
+    return directory
+
+def _stream_rows():
+    time.sleep(0.05)
+    for i in range(3):
+        yield (','.join(str(n) for n in range(i * 1000)) + '\n').encode('utf-8')
+
+def _streaming_app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/csv')])
+    return _stream_rows()
+
+def _request(app, mode='cpu', profiled=True):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/export.csv'}
+    if profiled:
+        environ['HTTP_X_ADMIN_PROFILE'] = TOKEN
+        environ['HTTP_X_ADMIN_PROFILE_MODE'] = mode
+    statuses = []
+    return app(environ, lambda status, headers, exc_info=None: statuses.append(status))
+
+def _saved(directory):
+    return sorted(os.listdir(directory)) if directory.exists() else []
+
+def test_streamed_bodies_are_profiled_until_closed(profiles):
+    app = profiling.ProfilingMiddleware(_streaming_app)
+    body = _request(app)
+    assert b''.join(body)
+    # Still sending: nothing saved yet, and no other request is profiled meanwhile
+    assert _saved(profiles) == []
+    assert not profiling._busy.acquire(blocking=False)
+
+    body.close()
+    [name] = _saved(profiles)
+    assert profiling.list_profiles()[0]['ms'] >= 50
+    stats = pstats.Stats(str(profiles / name))
+    assert any(func == '_stream_rows' for _, _, func in stats.stats)
+    # The next profiled request runs
+    _request(app).close()
+    assert len(_saved(profiles)) == 2
+
+def test_memory_profiles_cover_the_body(profiles):
+    app = profiling.ProfilingMiddleware(_streaming_app)
+    body = _request(app, mode='memory')
+    list(body)
+    body.close()
+    [name] = _saved(profiles)
+    with open(profiles / name, encoding='utf-8') as f:
+        report = json.load(f)
+    assert report['path'] == '/export.csv'
+    assert report['peakBytes'] > 0
+
+def test_failing_requests_release_the_profiler(profiles):
+    def broken(environ, start_response):
+        raise RuntimeError('boom')
+
+    app = profiling.ProfilingMiddleware(broken)
+    with pytest.raises(RuntimeError):
+        _request(app)
+    assert [profiling.list_profiles()[0]['status']] == [500]
+    assert profiling._busy.acquire(blocking=False)
+    profiling._busy.release()
+
+def test_unprofiled_requests_pass_through(profiles):
+    body = _stream_rows()
+    app = profiling.ProfilingMiddleware(lambda environ, start_response: body)
+    assert _request(app, profiled=False) is body
+    assert _saved(profiles) == []
@@ -0,0 +1,152 @@
+import os
+from datetime import datetime
+
+import pytest
+
+git = pytest.importorskip('git')
+
+import jobs
+import publisher
+import utils
+
+@pytest.fixture
+def repo(site, tmp_path_factory, monkeypatch):
+    """Make the temp site a git repository with a bare 'origin' on the dev branch"""
+    remote_dir = str(tmp_path_factory.mktemp('remote'))
+    git.Repo.init(remote_dir, bare=True)
+    repo = git.Repo.init(str(site))
+    with repo.config_writer() as config:
+        config.set_value('user', 'name', 'Test')
+        config.set_value('user', 'email', 'test@example.com')
+    repo.git.checkout('-b', 'dev')
+    repo.git.add(all=True)
+    repo.index.commit('Initial')
+    repo.create_remote('origin', remote_dir)
+    repo.git.push('origin', 'dev')
+    monkeypatch.setenv('REPO_DIR', str(site))
+    monkeypatch.setenv('GITHUB_TOKEN', 'token')
+    monkeypatch.setenv('GITHUB_REPO_URL', remote_dir)
+    monkeypatch.delenv('PUBLISH_BRANCH', raising=False)
+    monkeypatch.delenv('REMOTE_NAME', raising=False)
+    return repo
+
+def _committed(repo):
+    return set(repo.git.show('--name-only', '--format=', 'HEAD').split())
+
+def _remote_files(repo):
+    return set(repo.git.ls_tree('-r', '--name-only', 'origin/dev').split('\n'))
+
+def _edit_product(title):
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['title'] = title
+    assert utils.save_product(product, is_new=False)
+
+def test_publish_commits_and_pushes(repo):
+    _edit_product('Published Bow')
+    result = publisher.publish('Test publish')
+    assert result['ok'] and 'data/products.json' in _committed(repo)
+    repo.git.fetch('origin')
+    assert repo.git.log('-1', '--format=%s', 'origin/dev') == 'Test publish'
+    assert set(result['timings']) >= {'build', 'scan', 'stage', 'commit', 'push', 'total'}
+    assert set(result['timings']) - {'total'} <= set(publisher.PHASES)
+
+def test_publish_without_changes(repo):
+    # The first publish also ships the derived files the sample data lacks
+    publisher.publish()
+    result = publisher.publish()
+    assert result['ok'] and result['files'] == 0 and 'commit' not in result
+
+def test_publish_job_reports_phases(repo):
+    _edit_product('Queued Bow')
+    job = jobs.wait(publisher.start_publish('From a job')['id'], timeout=30)
+    status = publisher.get_status(job)
+    assert status['status'] == jobs.SUCCEEDED and status['done']
+    assert status['phase'] == 'push'
+    assert set(status['timings']) >= {'build', 'push'}
+
+def test_missing_settings_are_reported(site, monkeypatch):
+    monkeypatch.delenv('GITHUB_TOKEN', raising=False)
+    with pytest.raises(publisher.PublishError) as error:
+        publisher.start_publish()
+    assert error.value.status == 400
+
+def test_only_recorded_changes_are_staged(repo, site):
+    publisher.publish()
+    (site / 'notes.txt').write_text('edited outside the admin')
+    _edit_product('Tracked Bow')
+    publisher.publish()
+    assert 'data/products.json' in _committed(repo)
+    assert 'notes.txt' not in _committed(repo)
+    assert utils.get_pending_changes() == {}
+    # A full publish scans the working tree and picks it up
+    assert publisher.publish(full=True)['changes'] == ['notes.txt']
+
+def test_deleted_files_are_staged(repo, site):
+    publisher.publish()
+    os.remove(site / 'data' / 'news.json')
+    utils.record_changes(['data/news.json'])
+    assert publisher.publish()['changes'] == ['data/news.json']
+    repo.git.fetch('origin')
+    assert 'data/news.json' not in _remote_files(repo)
+
+def test_failed_push_keeps_changes_pending(repo, monkeypatch):
+    publisher.publish()
+    _edit_product('Unpushed Bow')
+    real_push = publisher._push
+
+    def fail(*args):
+        raise publisher.PublishError('Cannot connect to GitHub')
+
+    monkeypatch.setattr(publisher, '_push', fail)
+    with pytest.raises(publisher.PublishError):
+        publisher.publish('Lost push')
+    assert 'data/products.json' in utils.get_pending_changes()
+
+    # The next publish pushes the commit that already holds the changes
+    monkeypatch.setattr(publisher, '_push', real_push)
+    result = publisher.publish()
+    assert result['ok'] and result['files'] == 0
+    assert utils.get_pending_changes() == {}
+    repo.git.fetch('origin')
+    assert repo.git.log('-1', '--format=%s', 'origin/dev') == 'Lost push'
+
+def test_auto_publish_waits_for_a_quiet_period(monkeypatch):
+    monkeypatch.setattr(publisher, 'AUTO_PUBLISH_QUIET', 120)
+    monkeypatch.setattr(publisher, 'AUTO_PUBLISH_MAX_DELAY', 900)
+    window = {'files': 2, 'firstChangeAt': '2026-01-01T10:00:00Z', 'lastChangeAt': '2026-01-01T10:05:00Z'}
+    assert publisher.auto_publish_due(window) == datetime(2026, 1, 1, 10, 7)
+
+def test_auto_publish_is_not_put_off_forever(monkeypatch):
+    monkeypatch.setattr(publisher, 'AUTO_PUBLISH_QUIET', 120)
+    monkeypatch.setattr(publisher, 'AUTO_PUBLISH_MAX_DELAY', 900)
+    window = {'files': 2, 'firstChangeAt': '2026-01-01T10:00:00Z', 'lastChangeAt': '2026-01-01T10:14:30Z'}
+    assert publisher.auto_publish_due(window) == datetime(2026, 1, 1, 10, 15)
+
+def test_nothing_pending_is_never_due(site):
+    assert publisher.auto_publish_due() is None
+
+def test_summary_message(site):
+    os.makedirs(site / 'assets' / 'products')
+    (site / 'assets' / 'products' / 'bow.jpeg').write_bytes(b'image')
+    pending = {'data/products.json': '', 'data/news.json': '', 'assets/products/bow.jpeg': '',
+               'assets/products/bow-320w.webp': '', 'assets/products/gone.jpeg': ''}
+    assert publisher.summarize_changes(pending) == (
+        'Auto-publish: update news, products; 1 image added or changed; 1 image removed (5 files)')
+
+def test_due_changes_start_one_publish(site, monkeypatch):
+    started = []
+    monkeypatch.setattr(publisher, 'AUTO_PUBLISH_QUIET', 0)
+    monkeypatch.setattr(publisher, 'start_publish', lambda message: started.append(message) or {'id': 'job'})
+    utils.record_changes(['data/news.json'])
+    publisher._auto_publish_check()
+    # The hashed copies built for the change are published along with it
+    assert len(started) == 1 and started[0].startswith('Auto-publish: update data-manifest, news;')
+
+def test_recent_changes_reschedule_the_check(site, monkeypatch):
+    scheduled = []
+    monkeypatch.setattr(publisher, 'AUTO_PUBLISH_QUIET', 60)
+    monkeypatch.setattr(publisher, 'start_publish', lambda message: pytest.fail('published too early'))
+    monkeypatch.setattr(publisher, '_schedule_auto_publish', scheduled.append)
+    utils.record_changes(['data/news.json'])
+    publisher._auto_publish_check()
+    assert scheduled == [publisher.auto_publish_due()]
@@ -0,0 +1,74 @@
+import copy
+import json
+import pickle
+
+import pytest
+
+import records
+import utils
+
+DATA_FILES = ('products.json', 'categories.json', 'subcategories.json', 'news.json')
+
+def _cached(product_id):
+    return utils.get_index('products.json').by_id[product_id]
+
+def _raw(site, filename):
+    return (site / 'data' / filename).read_text(encoding='utf-8')
+
+@pytest.mark.parametrize('filename', DATA_FILES)
+def test_records_convert_back_to_the_same_json(site, filename):
+    snapshot = utils.read_json_file(filename)
+    assert all(isinstance(r, records.RECORD_TYPES[filename]) for r in snapshot)
+    encoded = json.dumps(records.plain(snapshot), indent=2, ensure_ascii=False, default=records.json_default)
+    assert json.loads(encoded) == json.loads(_raw(site, filename))
+    assert utils.thaw(snapshot) == json.loads(_raw(site, filename))
+
+def test_colors_are_stored_column_wise(site):
+    product = _cached('prod-006')
+    raw = next(p for p in json.loads(_raw(site, 'products.json')) if p['id'] == 'prod-006')
+    colors = product['colors']
+    assert isinstance(colors, records.ColorVariants)
+    assert len(colors) == len(raw['colors']) > 50
+    assert colors == raw['colors']
+    assert colors[-1] == raw['colors'][-1]
+    assert colors[3]['hex'] == raw['colors'][3]['hex']
+    assert colors[3].get('missing', 'default') == 'default'
+    assert [c['name'] for c in colors[:5]] == [c['name'] for c in raw['colors'][:5]]
+    assert sum(c['available'] for c in colors) == sum(c['available'] for c in raw['colors'])
+
+def test_records_behave_like_read_only_dicts(site):
+    product = _cached('prod-006')
+    assert product['id'] == product.get('id') == 'prod-006'
+    assert 'colors' in product and 'nope' not in product
+    assert product.get('nope', 1) == 1
+    with pytest.raises(KeyError):
+        product['nope']
+    with pytest.raises(TypeError):
+        product['title'] = 'changed'
+    with pytest.raises(TypeError):
+        product['colors'][0]['stock'] = 5
+
+    editable = utils.thaw(product)
+    editable['colors'][0]['stock'] = 5
+    assert type(editable) is dict and type(editable['colors'][0]) is dict
+    assert copy.deepcopy(product) == utils.thaw(product)
+    assert pickle.loads(pickle.dumps(product)) == product
+
+def test_unusual_colors_and_extra_keys_are_kept_as_is():
+    colors = [{'name': 'Red', 'hex': '#ff0000', 'stock': 1, 'available': True},
+              {'name': 'Blue', 'hex': '#0000FF', 'stock': 2, 'available': False}]
+    product = records.Product({'id': 'p1', 'colors': colors, 'custom': {'a': 1}, 'title': 'T'})
+    # Lower-case hex can't be restored from a packed int, so the list stays a list
+    assert product['colors'] is colors
+    assert list(product) == ['id', 'colors', 'custom', 'title']
+    assert product['custom'] == {'a': 1}
+    assert records.plain(product) == {'id': 'p1', 'colors': colors, 'custom': {'a': 1}, 'title': 'T'}
+
+    packed = records.Product({'id': 'p2', 'colors': colors[1:]})
+    assert isinstance(packed['colors'], records.ColorVariants)
+    assert json.loads(json.dumps(packed, default=records.json_default)) == {'id': 'p2', 'colors': colors[1:]}
+
+def test_compact_records_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(records, 'ENABLED', False)
+    record = {'id': 'p1'}
+    assert records.compact('products.json', record) is record
@@ -0,0 +1,70 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import search
+import utils
+
+SEARCH_JS = os.path.join(os.path.dirname(__file__), '..', '..', 'js', 'search.js')
+
+def _ids(query, limit=search.DEFAULT_LIMIT):
+    return [hit['id'] for hit in search.search_products(query, limit)]
+
+def test_words_match_exactly_by_prefix_or_with_a_typo(site):
+    assert 'prod-006' in _ids('scrunchies')
+    assert 'prod-006' in _ids('scrunch')
+    assert 'prod-006' in _ids('scrunchei')
+    assert 'prod-006' in _ids('plian scrunchies')
+    assert _ids('zzzzqx') == []
+
+def test_every_word_must_match(site):
+    plain = set(_ids('plain', None))
+    scrunchies = set(_ids('scrunchies', None))
+    assert set(_ids('plain scrunchies', None)) == plain & scrunchies
+
+def test_descriptions_are_searched_and_rank_below_titles(site):
+    assert 'prod-093' in _ids('breezy')
+    product = utils.thaw(utils.get_product_by_id('prod-010'))
+    product['description'] = 'Pairs well with plain scrunchies'
+    assert utils.save_product(product, is_new=False)
+    ranked = _ids('plain scrunchies')
+    assert ranked.index('prod-006') < ranked.index('prod-010')
+
+def test_saves_and_deletes_update_the_index(site):
+    search.get_index()
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['title'] = 'Quokka Velvet Band'
+    assert utils.save_product(product, is_new=False)
+    assert [(hit['id'], hit['title']) for hit in search.search_products('quokka')] == [('prod-006', 'Quokka Velvet Band')]
+
+    assert utils.delete_product('prod-006')
+    assert _ids('quokka') == []
+    incremental = search.search_products('scrunchies velvet', None)
+    search.rebuild()
+    assert search.search_products('scrunchies velvet', None) == incremental
+
+def test_storefront_index_matches_the_admin(site):
+    search.rebuild()
+    path = site / 'data' / search.INDEX_FILE
+    data = json.loads(path.read_text(encoding='utf-8'))
+    assert data['format'] == search.INDEX_FORMAT
+    assert len(data['docs']) == len(utils.get_all_products())
+
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    script = (
+        "global.window = {};"
+        "global.fetchData = async () => ({ok: true, json: async () => JSON.parse("
+        "require('fs').readFileSync(process.argv[1], 'utf8'))});"
+        f"require({json.dumps(os.path.abspath(SEARCH_JS))});"
+        "(async () => { const out = {};"
+        " for (const q of process.argv.slice(2)) out[q] = (await window.searchProducts(q, 10)).map(h => h.id);"
+        " console.log(JSON.stringify(out)); })();"
+    )
+    queries = ['scrunchei', 'breezy', 'plain scrunchies', 'bow clip']
+    result = subprocess.run([node, '-e', script, str(path)] + queries, capture_output=True, text=True, check=True)
+    assert json.loads(result.stdout) == {q: _ids(q, 10) for q in queries}
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+import records
+import storage
+import utils
+
+@pytest.fixture
+def sqlite(site, tmp_path, monkeypatch):
+    """Run the record helpers on a fresh SQLite database imported from the temp site"""
+    backend = storage.SqliteStorage(str(tmp_path / 'state' / 'catalog.db'))
+    monkeypatch.setattr(storage, '_backend', backend)
+    backend.connection()
+    utils.invalidate_cache()
+    return backend
+
+def _json_bytes(data):
+    return json.dumps(records.plain(data), indent=2, ensure_ascii=False, default=records.json_default).encode('utf-8')
+
+def test_export_matches_the_json_backend(sqlite, site):
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['stock'] = 3
+    assert utils.save_product(product, is_new=False)
+
+    exported = (site / 'data' / 'products.json').read_bytes()
+    assert exported == _json_bytes(utils.get_all_products())
+    assert json.loads(exported)[[p['id'] for p in utils.get_all_products()].index('prod-006')]['stock'] == 3
+
+def test_exports_wait_for_saves_to_settle(sqlite, site, monkeypatch):
+    monkeypatch.setattr(utils, 'DEFER_SECONDS', 60)
+    path = site / 'data' / 'products.json'
+    before = path.read_bytes()
+    for product_id in ('prod-006', 'prod-009', 'prod-014'):
+        product = utils.thaw(utils.get_product_by_id(product_id))
+        product['stock'] = 1234
+        assert utils.save_product(product, is_new=False)
+        # The database has the save; the storefront copy is written later
+        assert utils.get_product_by_id(product_id)['stock'] == 1234
+    assert path.read_bytes() == before
+
+    utils.run_deferred()
+    stocks = {p['id']: p['stock'] for p in json.loads(path.read_bytes())}
+    assert all(stocks[i] == 1234 for i in ('prod-006', 'prod-009', 'prod-014'))
+
+def test_migrate_runs_waiting_exports_first(sqlite, site, monkeypatch):
+    monkeypatch.setattr(utils, 'DEFER_SECONDS', 60)
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    product['title'] = 'Saved Before Migrating'
+    assert utils.save_product(product, is_new=False)
+
+    storage.migrate('sqlite', db_path=sqlite.path)
+    assert utils.get_product_by_id('prod-006')['title'] == 'Saved Before Migrating'
+
+def test_documents_are_encoded_like_the_json_backend(sqlite, site):
+    store = utils.get_store_info()
+    # A cached record inside the document needs the records encoder
+    store['featured'] = utils.get_storage().get('products.json', 'prod-006')
+    assert utils.save_store_info(store)
+
+    exported = (site / 'data' / 'store.json').read_bytes()
+    assert exported == _json_bytes(store)
+    assert json.loads(exported)['featured']['id'] == 'prod-006'
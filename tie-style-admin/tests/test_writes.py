@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import utils
+
+def test_stale_etag_is_refused(site):
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    etag = utils.record_etag(product)
+    product['stock'] = product.get('stock', 0) + 1
+    assert utils.save_product(product, is_new=False, expected_etag=etag)
+
+    stale = dict(product, title='Someone else')
+    with pytest.raises(utils.ConflictError):
+        utils.save_product(stale, is_new=False, expected_etag=etag)
+    assert utils.get_product_by_id('prod-006')['title'] == product['title']
+
+def test_current_etag_is_accepted(site):
+    product = utils.thaw(utils.get_product_by_id('prod-006'))
+    etag = utils.record_etag(utils.get_product_by_id('prod-006'))
+    product['title'] = 'Fresh Edit'
+    assert utils.save_product(product, is_new=False, expected_etag=etag)
+    assert utils.get_product_by_id('prod-006')['title'] == 'Fresh Edit'
+
+def test_stale_file_version_is_refused(site):
+    version = utils.get_file_version('news.json')
+    news = utils.thaw(utils.read_json_file('news.json'))
+    assert utils.write_json_file('news.json', news, expected_version=version)
+    news[0]['title'] = 'Changed meanwhile'
+    assert utils.write_json_file('news.json', news)
+    with pytest.raises(utils.ConflictError):
+        utils.write_json_file('news.json', news, expected_version=version)
+
+def test_concurrent_saves_are_not_lost(site):
+    product_ids = [p['id'] for p in utils.get_all_products()[:8]]
+
+    def bump(product_id):
+        with utils.file_lock('products.json'):
+            product = utils.thaw(utils.get_product_by_id(product_id))
+            product['stock'] = 1000
+            return utils.save_product(product, is_new=False)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert all(pool.map(bump, product_ids))
+    assert all(utils.get_product_by_id(product_id)['stock'] == 1000 for product_id in product_ids)
+
+def test_no_temp_files_are_left_behind(site):
+    assert utils.write_json_file('news.json', utils.thaw(utils.read_json_file('news.json')))
+    assert not [name for name in os.listdir(utils.DATA_DIR) if name.endswith('.tmp')]
@@ -1,10 +1,24 @@
 """
 Utility functions for handling JSON data files
 """
+import atexit
+import hashlib
 import json
 import os
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Callable, Optional, Iterator, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import metrics
+import records
 
 # Path to the parent directory containing the data folder
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -12,196 +26,955 @@ PARENT_DIR = os.path.dirname(BASE_DIR)
 DATA_DIR = os.path.join(PARENT_DIR, 'data')
 ASSETS_DIR = os.path.join(PARENT_DIR, 'assets')
 IMAGE_DIR = os.path.join(PARENT_DIR, 'image')
+# Admin-only runtime state (locks, job table, ...). Never published.
+STATE_DIR = os.getenv('ADMIN_STATE_DIR', os.path.join(BASE_DIR, 'state'))
+
+class ConflictError(Exception):
+    """Raised when a save is based on data that was changed by someone else"""
+
+# ==================== FILE LOCKING ====================
+
+_lock_guards: Dict[str, threading.RLock] = {}
+_lock_guards_lock = threading.Lock()
+_lock_state = threading.local()
+
+def _acquire_os_lock(handle) -> None:
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after ~10 seconds; keep waiting
+            continue
+
+def _release_os_lock(handle) -> None:
+    if fcntl is not None:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    else:
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+@contextmanager
+def file_lock(name: str) -> Iterator[None]:
+    """
+    Hold an exclusive lock named after a data file, across threads and processes.
+    
+    The lock is re-entrant within a thread, so save helpers can be nested
+    inside a caller that already holds it.
+    
+    Args:
+        name: Lock name, usually the data filename (e.g., 'products.json')
+    """
+    with _lock_guards_lock:
+        guard = _lock_guards.setdefault(name, threading.RLock())
+    held = getattr(_lock_state, 'held', None)
+    if held is None:
+        held = _lock_state.held = {}
+    with guard:
+        if name in held:
+            held[name][1] += 1
+            try:
+                yield
+            finally:
+                held[name][1] -= 1
+            return
+        lock_dir = os.path.join(STATE_DIR, 'locks')
+        ensure_directory_exists(lock_dir)
+        handle = open(os.path.join(lock_dir, f'{name}.lock'), 'a+b')
+        try:
+            _acquire_os_lock(handle)
+            held[name] = [handle, 0]
+            try:
+                yield
+            finally:
+                del held[name]
+                _release_os_lock(handle)
+        finally:
+            handle.close()
+
+def pid_alive(pid: Optional[int]) -> bool:
+    """
+    Check whether a process (e.g. the owner of a job or a metrics file) is still running.
+    
+    Returns:
+        False only if the process is known to be gone; on Windows, where it
+        cannot be checked, always True
+    """
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == 'nt':
+        # os.kill() would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+# ==================== CATALOG CACHE ====================
+
+class FrozenDict(dict):
+    """
+    Read-only dict used for cached catalog snapshots.
+    
+    Behaves like a normal dict for reads, JSON serialisation and templates,
+    but raises TypeError on mutation so a request cannot corrupt the cache.
+    copy() returns a shallow mutable dict; use thaw() for a deep copy.
+    """
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Cached catalog data is read-only; use utils.thaw() to get a mutable copy")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def copy(self) -> Dict:
+        return dict(self)
+
+    def __copy__(self) -> Dict:
+        return dict(self)
+
+    def __deepcopy__(self, memo) -> Dict:
+        return thaw(self)
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+class FrozenList(list):
+    """Read-only list used for cached catalog snapshots (see FrozenDict)."""
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("Cached catalog data is read-only; use list() or utils.thaw() to get a mutable copy")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = remove = pop = clear = sort = reverse = _readonly
+
+    def copy(self) -> List:
+        return list(self)
+
+    def __copy__(self) -> List:
+        return list(self)
+
+    def __deepcopy__(self, memo) -> List:
+        return thaw(self)
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+def _freeze_list(items: list) -> FrozenList:
+    return FrozenList([_freeze_list(v) if type(v) is list else v for v in items])
+
+def _freeze_object(pairs: list) -> FrozenDict:
+    # object_pairs_hook runs bottom-up, so nested dicts are already frozen;
+    # only lists still need converting.
+    return FrozenDict([(k, _freeze_list(v) if type(v) is list else v) for k, v in pairs])
+
+def thaw(value: Any) -> Any:
+    """
+    Return a deep, fully mutable copy of cached (frozen) JSON data.
+    
+    Args:
+        value: A snapshot, record or nested value returned by the cache
+    
+    Returns:
+        Plain dicts/lists that are safe to modify
+    """
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    if isinstance(value, (records.Record, records.ColorVariant, records.ColorVariants)):
+        return thaw(records.json_default(value))
+    return value
+
+def parse_json_snapshot(text: str, filename: Optional[str] = None) -> Any:
+    """
+    Parse JSON text into read-only FrozenDict/FrozenList data.
+    
+    Args:
+        text: JSON text of a whole data file or of one of its records
+        filename: The data file it comes from; records of the catalog files
+            become compact record types (see records)
+    
+    Returns:
+        Read-only data
+    """
+    data = json.loads(text, object_pairs_hook=_freeze_object)
+    if type(data) is list:
+        return FrozenList([records.compact(filename, item) for item in _freeze_list(data)])
+    return records.compact(filename, data)
+
+# filename -> (stat key, frozen snapshot or None until read, content version)
+_json_cache: Dict[str, tuple] = {}
+_cache_lock = threading.Lock()
+_cache_stats: Dict[str, Dict[str, int]] = {}
+
+def _stat_key(st: os.stat_result) -> tuple:
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _count(filename: str, counter: str) -> None:
+    file_stats = _cache_stats.setdefault(filename, {'hits': 0, 'misses': 0, 'invalidations': 0})
+    file_stats[counter] += 1
+
+def _empty_snapshot(filename: str) -> Any:
+    return FrozenDict() if filename == 'store.json' else FrozenList()
+
+def invalidate_cache(filename: Optional[str] = None) -> None:
+    """Drop the cached snapshot for one file, or for every file if none given"""
+    with _cache_lock:
+        names = [filename] if filename else list(_json_cache)
+        for name in names:
+            if _json_cache.pop(name, None) is not None:
+                _count(name, 'invalidations')
+
+def get_cache_stats() -> Dict:
+    """Get hit/miss counters of the parsed-catalog cache"""
+    with _cache_lock:
+        files = {name: dict(counters) for name, counters in _cache_stats.items()}
+        cached = sorted(name for name, entry in _json_cache.items() if entry[1] is not None)
+    return {
+        'hits': sum(c['hits'] for c in files.values()),
+        'misses': sum(c['misses'] for c in files.values()),
+        'invalidations': sum(c['invalidations'] for c in files.values()),
+        'cached_files': cached,
+        'files': files
+    }
 
 def read_json_file(filename: str) -> Any:
     """
     Read and parse a JSON file from the data directory.
     
+    Parsed files are cached in-process and keyed on the file's mtime, size
+    and inode, so repeated reads only cost an fstat. The returned data is an
+    immutable snapshot shared between callers; use thaw() (or list()/copy()
+    for a shallow copy) before modifying it.
+    
     Args:
         filename: Name of the JSON file (e.g., 'products.json')
-        
+    
     Returns:
         Parsed JSON data (list or dict)
     """
     filepath = os.path.join(DATA_DIR, filename)
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            key = _stat_key(os.fstat(f.fileno()))
+            with _cache_lock:
+                cached = _json_cache.get(filename)
+                if cached is not None and cached[0] == key and cached[1] is not None:
+                    _count(filename, 'hits')
+                    return cached[1]
+            with metrics.timed('tiestyle_json_read_seconds', file=filename):
+                raw = f.read()
+                data = parse_json_snapshot(raw.decode('utf-8'), filename)
+            metrics.inc('tiestyle_json_read_bytes_total', len(raw), file=filename)
+        with _cache_lock:
+            _count(filename, 'misses')
+            _json_cache[filename] = (key, data, _content_version(raw))
+        return data
     except FileNotFoundError:
         print(f"File not found: {filepath}")
-        return [] if filename != 'store.json' else {}
-    except json.JSONDecodeError as e:
+        return _empty_snapshot(filename)
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
         print(f"Error parsing JSON from {filepath}: {e}")
-        return [] if filename != 'store.json' else {}
+        return _empty_snapshot(filename)
+
+def _content_version(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()[:16]
 
-def write_json_file(filename: str, data: Any) -> bool:
+def get_file_version(filename: str) -> str:
+    """
+    Get the current version (content hash) of a data file.
+    
+    Returns:
+        Version string, or '' if the file does not exist
+    """
+    try:
+        key = _stat_key(os.stat(os.path.join(DATA_DIR, filename)))
+    except OSError:
+        key = None
+    with _cache_lock:
+        cached = _json_cache.get(filename)
+    if cached is None or cached[0] != key:
+        read_json_file(filename)
+        with _cache_lock:
+            cached = _json_cache.get(filename)
+    return cached[2] if cached else ''
+
+def record_etag(record: Any) -> str:
+    """Get a stable ETag for a single record (or a whole small file like store.json)"""
+    canonical = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(',', ':'),
+                           default=records.json_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+def _check_etag(current: Any, expected_etag: Optional[str], label: str) -> None:
+    if expected_etag and (current is None or record_etag(current) != expected_etag):
+        raise ConflictError(f"{label} was changed by someone else since you opened it. "
+                            "Reload the page and apply your changes again.")
+
+def _atomic_write(filepath: str, payload: bytes) -> os.stat_result:
+    """Write bytes to a temp file, fsync it and rename it over the target; returns the new file's stat"""
+    directory = os.path.dirname(filepath)
+    fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(filepath) + '.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            st = os.fstat(f.fileno())
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    if fcntl is not None:
+        # Persist the rename itself (not supported on Windows)
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    return st
+
+def write_json_file(filename: str, data: Any, expected_version: Optional[str] = None) -> bool:
     """
     Write data to a JSON file in the data directory.
     
+    The file is replaced atomically (temp file, fsync, rename) while holding
+    the file's lock, so readers never see a half-written file.
+    
     Args:
         filename: Name of the JSON file (e.g., 'products.json')
         data: Data to write (list or dict)
-        
+        expected_version: If given, the write is refused unless the file is
+            still at this version (see get_file_version)
+    
     Returns:
         True if successful, False otherwise
+    
+    Raises:
+        ConflictError: If expected_version no longer matches the file
     """
     filepath = os.path.join(DATA_DIR, filename)
+    with file_lock(filename):
+        if expected_version is not None and get_file_version(filename) != expected_version:
+            raise ConflictError(f"{filename} was modified by another process; please retry.")
+        try:
+            with metrics.timed('tiestyle_json_write_seconds', file=filename):
+                payload = json.dumps(records.plain(data), indent=2, ensure_ascii=False,
+                                     default=records.json_default).encode('utf-8')
+                st = _atomic_write(filepath, payload)
+            metrics.inc('tiestyle_json_write_bytes_total', len(payload), file=filename)
+        except Exception as e:
+            print(f"Error writing to {filepath}: {e}")
+            return False
+        finally:
+            invalidate_cache(filename)
+        # Keep the new version, so listeners and the next save learn it
+        # without parsing the file again; the next read parses it
+        with _cache_lock:
+            _json_cache[filename] = (_stat_key(st), None, _content_version(payload))
+    record_changes([filepath])
+    return True
+
+# ==================== ADMIN STATE ====================
+
+def read_state_file(filename: str, default: Any = None) -> Any:
+    """
+    Read a JSON file from the admin state directory (not cached).
+    
+    Args:
+        filename: Name of the state file (e.g., 'jobs.json')
+        default: Value returned if the file is missing or unreadable
+    
+    Returns:
+        Parsed JSON data, or default
+    """
+    filepath = os.path.join(STATE_DIR, filename)
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except json.JSONDecodeError as e:
+        print(f"Error parsing JSON from {filepath}: {e}")
+        return default
+
+def write_state_file(filename: str, data: Any) -> bool:
+    """
+    Atomically write a JSON file to the admin state directory.
+    
+    Callers doing read-modify-write should hold file_lock(filename).
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    filepath = os.path.join(STATE_DIR, filename)
     try:
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        ensure_directory_exists(os.path.dirname(filepath))
+        _atomic_write(filepath, json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8'))
         return True
     except Exception as e:
         print(f"Error writing to {filepath}: {e}")
         return False
 
+# ==================== CHANGE TRACKING ====================
+
+# Files written or deleted by the admin since they were last published
+CHANGES_FILE = 'changes.json'
+_change_listeners: List[Callable[[List[str]], None]] = []
+
+def register_change_listener(listener: Callable[[List[str]], None]) -> None:
+    """Call listener(paths) whenever files are added to the change set (e.g. to schedule a publish)"""
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+def site_path(path: str) -> str:
+    """Convert an absolute path to a site-relative one (e.g., 'data/products.json')"""
+    if os.path.isabs(path):
+        path = os.path.relpath(path, PARENT_DIR)
+    return path.replace('\\', '/')
+
+def record_changes(paths: List[str]) -> None:
+    """
+    Add files to the persistent set of changes waiting to be published.
+    
+    Args:
+        paths: Site-relative or absolute paths of written or deleted files
+    """
+    paths = [site_path(p) for p in paths if p]
+    if not paths:
+        return
+    now = datetime.utcnow().isoformat() + 'Z'
+    try:
+        with file_lock(CHANGES_FILE):
+            changes = read_state_file(CHANGES_FILE, {})
+            pending = changes.setdefault('paths', {})
+            if not pending:
+                changes['firstChangeAt'] = now
+            for path in paths:
+                pending[path] = now
+            write_state_file(CHANGES_FILE, changes)
+    except Exception as e:
+        print(f"Error recording changed files {paths}: {e}")
+        return
+    for listener in _change_listeners:
+        try:
+            listener(paths)
+        except Exception as e:
+            print(f"Error in change listener {listener}: {e}")
+
+def get_pending_changes() -> Dict[str, str]:
+    """Get the unpublished changes as {site-relative path: last change time}"""
+    return read_state_file(CHANGES_FILE, {}).get('paths', {})
+
+def get_change_window() -> Dict[str, Any]:
+    """
+    Summarise the unpublished changes.
+    
+    Returns:
+        Dictionary with 'files' (count), 'firstChangeAt' and 'lastChangeAt'
+        (ISO timestamps, None if nothing is pending)
+    """
+    changes = read_state_file(CHANGES_FILE, {})
+    pending = changes.get('paths', {})
+    return {
+        'files': len(pending),
+        'firstChangeAt': changes.get('firstChangeAt') if pending else None,
+        'lastChangeAt': max(pending.values()) if pending else None
+    }
+
+def clear_changes(published: Dict[str, str]) -> None:
+    """
+    Remove published files from the change set.
+    
+    Files changed again after the snapshot in published was taken stay pending.
+    
+    Args:
+        published: Snapshot returned by get_pending_changes() that was published
+    """
+    with file_lock(CHANGES_FILE):
+        changes = read_state_file(CHANGES_FILE, {})
+        pending = changes.get('paths', {})
+        for path, changed_at in published.items():
+            if pending.get(path) == changed_at:
+                del pending[path]
+        # The oldest change left is what is now waiting longest
+        if pending:
+            changes['firstChangeAt'] = min(pending.values())
+        else:
+            changes.pop('firstChangeAt', None)
+        write_state_file(CHANGES_FILE, changes)
+
+# ==================== DERIVED DATA ====================
+
+def write_site_files(files: Dict[str, bytes], delete: Optional[List[str]] = None) -> bool:
+    """
+    Atomically write (and delete) generated files of the site.
+    
+    Derived files are not cached or locked per file; callers serialise their
+    builds with their own lock. All touched files are recorded as one change.
+    
+    Args:
+        files: Mapping of site-relative (or absolute) path to file contents
+        delete: Site-relative (or absolute) paths to remove
+        
+    Returns:
+        True if every file was written
+    """
+    ok = True
+    touched = []
+    for path, payload in files.items():
+        filepath = os.path.join(PARENT_DIR, path)
+        try:
+            ensure_directory_exists(os.path.dirname(filepath))
+            _atomic_write(filepath, payload)
+            touched.append(filepath)
+        except Exception as e:
+            print(f"Error writing to {filepath}: {e}")
+            ok = False
+    for path in delete or []:
+        filepath = os.path.join(PARENT_DIR, path)
+        try:
+            os.remove(filepath)
+            touched.append(filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error deleting {filepath}: {e}")
+    record_changes(touched)
+    return ok
+
+def write_data_artifacts(files: Dict[str, Any], delete: Optional[List[str]] = None) -> bool:
+    """
+    Write (and delete) derived JSON files under the data directory, compactly.
+    
+    Args:
+        files: Mapping of path relative to data/ (e.g., 'catalog/index.json') to data
+        delete: Paths relative to data/ to remove
+        
+    Returns:
+        True if every file was written
+    """
+    payloads = {os.path.join(DATA_DIR, rel_path): json.dumps(data, ensure_ascii=False, separators=(',', ':'),
+                                                         default=records.json_default).encode('utf-8')
+                for rel_path, data in files.items()}
+    return write_site_files(payloads, delete=[os.path.join(DATA_DIR, rel_path) for rel_path in delete or []])
+
+# ==================== DEFERRED BUILDS ====================
+
+# Seconds a deferred build waits for further saves before it runs (0 runs it right away)
+DEFER_SECONDS = float(os.getenv('ADMIN_DEFER_SECONDS', '2'))
+# name -> (build, timer) of the builds waiting to run in this process
+_deferred: Dict[str, Tuple[Callable[[], Any], threading.Timer]] = {}
+_deferred_lock = threading.Lock()
+
+def defer(name: str, build: Callable[[], Any]) -> None:
+    """
+    Run a build of derived files in the background once saves have been
+    quiet for DEFER_SECONDS, instead of inside the save.
+    
+    Deferring a name that is already waiting pushes it back, so a burst of
+    saves runs the build once. Builds still waiting when the process exits,
+    or when a publish starts, run then (see run_deferred).
+    
+    Args:
+        name: Build name; at most one run per name is waiting
+        build: Function to run
+    """
+    if DEFER_SECONDS <= 0:
+        _run_build(name, build)
+        return
+    timer = threading.Timer(DEFER_SECONDS, _deferred_due, args=(name,))
+    timer.daemon = True
+    with _deferred_lock:
+        waiting = _deferred.get(name)
+        if waiting is not None:
+            waiting[1].cancel()
+        _deferred[name] = (build, timer)
+    timer.start()
+
+def _run_build(name: str, build: Callable[[], Any]) -> None:
+    try:
+        build()
+    except Exception as e:
+        print(f"Error in deferred build {name}: {e}")
+
+def _deferred_due(name: str) -> None:
+    with _deferred_lock:
+        waiting = _deferred.get(name)
+        # Deferred again after this timer fired
+        if waiting is None or waiting[1] is not threading.current_thread():
+            return
+        del _deferred[name]
+    _run_build(name, waiting[0])
+
+def run_deferred() -> None:
+    """Run every build waiting in this process now, including builds they defer in turn"""
+    while True:
+        with _deferred_lock:
+            waiting = list(_deferred.items())
+            _deferred.clear()
+        if not waiting:
+            return
+        for name, (build, timer) in waiting:
+            timer.cancel()
+            _run_build(name, build)
+
+atexit.register(run_deferred)
+
+# ==================== CATALOG INDEXES ====================
+
+class CatalogIndex:
+    """
+    Lookup tables built over one cached snapshot of a data file.
+    
+    An index is tied to the snapshot object it was built from and is rebuilt
+    only when the storage backend hands out a new snapshot, i.e. when the
+    data changed. Like the linear scans it replaces, the first record
+    wins when an id, slug or SKU appears more than once.
+    """
+    __slots__ = ('snapshot', 'by_id', 'position', 'by_slug', 'by_sku', 'by_parent')
+
+    def __init__(self, records: List[Dict]):
+        self.snapshot = records
+        self.by_id: Dict[str, Dict] = {}
+        self.position: Dict[str, int] = {}
+        self.by_slug: Dict[str, str] = {}
+        self.by_sku: Dict[str, str] = {}
+        by_parent: Dict[str, list] = {}
+        for i, record in enumerate(records):
+            record_id = record.get('id')
+            if record_id is not None and record_id not in self.by_id:
+                self.by_id[record_id] = record
+                self.position[record_id] = i
+                slug = record.get('slug')
+                if slug and slug not in self.by_slug:
+                    self.by_slug[slug] = record_id
+                sku = record.get('sku')
+                if sku and sku not in self.by_sku:
+                    self.by_sku[sku] = record_id
+            parent_id = record.get('parentCategoryId')
+            if parent_id is not None:
+                by_parent.setdefault(parent_id, []).append(record)
+        self.by_parent: Dict[str, FrozenList] = {k: FrozenList(v) for k, v in by_parent.items()}
+
+_index_cache: Dict[str, CatalogIndex] = {}
+
+def get_index(filename: str) -> CatalogIndex:
+    """
+    Get the lookup index for a list-shaped data file (products, categories, ...).
+    
+    Args:
+        filename: Name of the JSON file (e.g., 'products.json')
+    
+    Returns:
+        CatalogIndex over the current cached snapshot of the file
+    """
+    records = get_storage().records(filename)
+    index = _index_cache.get(filename)
+    if index is None or index.snapshot is not records:
+        index = CatalogIndex(records)
+        with _cache_lock:
+            _index_cache[filename] = index
+    return index
+
+# ==================== STORAGE ====================
+
+def get_storage():
+    """
+    Get the backend holding the catalog records (JSON files or SQLite, see
+    storage.py). Every record helper below goes through it.
+    """
+    import storage  # storage builds on the file helpers in this module
+    return storage.get_backend()
+
+def get_data_version(filename: str) -> str:
+    """
+    Get the current version of a data file's records.
+    
+    Returns:
+        Version string that changes with every save
+    """
+    return get_storage().version(filename)
+
+# ==================== RECORD LISTENERS ====================
+
+# (old record or None, new record or None) pairs describing one write
+RecordChanges = List[Tuple[Optional[Dict], Optional[Dict]]]
+_record_listeners: Dict[str, List[Callable[[RecordChanges, str, str], None]]] = {}
+
+def register_record_listener(filename: str, listener: Callable[[RecordChanges, str, str], None]) -> None:
+    """
+    Call listener(changes, before_version, after_version) after records of a
+    data file are saved or deleted through the helpers below.
+    
+    The listener runs while the file's lock is still held, so calls arrive in
+    write order. Writes that bypass the helpers (e.g. write_json_file) are not
+    reported; comparing before_version with a stored version detects them.
+    
+    Args:
+        filename: Name of the JSON file (e.g., 'products.json')
+        listener: Function receiving the changes and the file versions
+    """
+    listeners = _record_listeners.setdefault(filename, [])
+    if listener not in listeners:
+        listeners.append(listener)
+
+def _notify_records(filename: str, changes: RecordChanges, before_version: str) -> None:
+    listeners = _record_listeners.get(filename)
+    if not listeners or not changes:
+        return
+    after_version = get_data_version(filename)
+    for listener in listeners:
+        try:
+            listener(changes, before_version, after_version)
+        except Exception as e:
+            print(f"Error in record listener {listener}: {e}")
+
 def get_all_products() -> List[Dict]:
-    """Get all products from products.json"""
-    return read_json_file('products.json')
+    """Get all products from products.json (read-only snapshot)"""
+    return get_storage().records('products.json')
 
 def get_product_by_id(product_id: str) -> Optional[Dict]:
-    """Get a specific product by ID"""
-    products = get_all_products()
+    """Get a specific product by ID (mutable copy)"""
+    product = get_storage().get('products.json', product_id)
+    return thaw(product) if product is not None else None
+
+def get_product_by_slug(slug: str) -> Optional[Dict]:
+    """Get a specific product by slug (mutable copy)"""
+    matches = get_storage().select('products.json', 'slug', slug)
+    return thaw(matches[0]) if matches else None
+
+def save_records(filename: str, records: List[Dict]) -> bool:
+    """
+    Create or update records of a list-shaped data file with a single write.
+    
+    Records whose ID already exists replace the stored record in place; all
+    others are appended. No timestamps are touched.
+    
+    Args:
+        filename: Name of the JSON file (e.g., 'categories.json')
+        records: Record dictionaries
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    with file_lock(filename):
+        version = get_data_version(filename)
+        try:
+            previous = get_storage().put(filename, records)
+        except Exception as e:
+            print(f"Error saving {filename}: {e}")
+            return False
+        _notify_records(filename, list(zip(previous, records)), version)
+        return True
+
+def _save_record(filename: str, record: Dict, is_new: bool, expected_etag: Optional[str], label: str) -> bool:
+    """Locked read-modify-write of one record in a list-shaped data file"""
+    with file_lock(filename):
+        if not is_new:
+            _check_etag(get_storage().get(filename, record.get('id')), expected_etag, label)
+        return save_records(filename, [record])
+
+def _delete_record(filename: str, record_id: str) -> bool:
+    """Locked removal of every record with the given ID from a data file"""
+    with file_lock(filename):
+        version = get_data_version(filename)
+        try:
+            removed = get_storage().delete(filename, record_id)
+        except Exception as e:
+            print(f"Error deleting from {filename}: {e}")
+            return False
+        _notify_records(filename, [(r, None) for r in removed], version)
+        return True
+
+def _check_skus(products: List[Dict]) -> None:
+    """
+    Refuse SKUs that already belong to another product (or to an earlier
+    product of the same batch). A product keeping the SKU it already has
+    is left alone, even if an older record shares it.
+    
+    Raises:
+        ConflictError: If a SKU is taken
+    """
+    index = get_index('products.json')
+    claimed: Dict[str, str] = {}
     for product in products:
-        if product.get('id') == product_id:
-            return product
-    return None
+        sku, product_id = product.get('sku'), product.get('id')
+        if not sku:
+            continue
+        owner = claimed.get(sku, index.by_sku.get(sku))
+        existing = index.by_id.get(product_id)
+        if owner not in (None, product_id) and (existing is None or existing.get('sku') != sku):
+            raise ConflictError(f"SKU {sku} is already used by {owner}.")
+        claimed[sku] = product_id
 
-def save_product(product_data: Dict, is_new: bool = True) -> bool:
+def save_product(product_data: Dict, is_new: bool = True, expected_etag: Optional[str] = None) -> bool:
     """
     Save a product (create or update).
     
     Args:
         product_data: Dictionary containing product information
         is_new: True if creating a new product, False if updating
-        
+        expected_etag: ETag of the product the edit was based on (see
+            record_etag); the save is refused if the stored product differs
+    
     Returns:
         True if successful, False otherwise
-    """
-    products = get_all_products()
     
-    if is_new:
-        # Add timestamps
-        product_data['createdAt'] = datetime.utcnow().isoformat() + 'Z'
-        product_data['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
-        products.append(product_data)
-    else:
-        # Update existing product
-        for i, product in enumerate(products):
-            if product.get('id') == product_data.get('id'):
+    Raises:
+        ConflictError: If the product was changed since expected_etag was
+            taken, or its SKU belongs to another product
+    """
+    with file_lock('products.json'):
+        _check_skus([product_data])
+        if is_new:
+            # Add timestamps
+            product_data['createdAt'] = datetime.utcnow().isoformat() + 'Z'
+            product_data['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
+        else:
+            # Update existing product
+            existing = get_storage().get('products.json', product_data.get('id'))
+            if existing is not None:
+                _check_etag(existing, expected_etag, 'This product')
                 product_data['updatedAt'] = datetime.utcnow().isoformat() + 'Z'
                 # Preserve createdAt
-                product_data['createdAt'] = product.get('createdAt')
-                products[i] = product_data
-                break
-    
-    return write_json_file('products.json', products)
+                product_data['createdAt'] = existing.get('createdAt')
+        return _save_record('products.json', product_data, is_new, None, 'This product')
 
 def delete_product(product_id: str) -> bool:
     """Delete a product by ID"""
-    products = get_all_products()
-    products = [p for p in products if p.get('id') != product_id]
-    return write_json_file('products.json', products)
+    return _delete_record('products.json', product_id)
+
+def save_products(products_data: List[Dict], touch: bool = True) -> bool:
+    """
+    Create or update many products with a single write.
+    
+    Products whose ID already exists replace the stored product (keeping its
+    createdAt); all others are appended as new products.
+    
+    Args:
+        products_data: List of product dictionaries
+        touch: Set updatedAt on updated products (False for maintenance
+            writes such as image backfills)
+    
+    Returns:
+        True if successful, False otherwise
+    
+    Raises:
+        ConflictError: If a SKU belongs to another product
+    """
+    with file_lock('products.json'):
+        _check_skus(products_data)
+        storage = get_storage()
+        now = datetime.utcnow().isoformat() + 'Z'
+        for product_data in products_data:
+            existing = storage.get('products.json', product_data.get('id'))
+            if touch or existing is None:
+                product_data['updatedAt'] = now
+            product_data['createdAt'] = now if existing is None else existing.get('createdAt')
+        return save_records('products.json', products_data)
+
+def generate_sku(title: str, number: int) -> str:
+    """
+    Generate a SKU from a product title and number.
+    
+    Args:
+        title: Product title (e.g., 'plain scrunchies')
+        number: Product number (e.g., 6)
+    
+    Returns:
+        SKU string (e.g., 'PLAI-SCR-006')
+    """
+    words = title.upper().split()
+    if len(words) >= 2:
+        return words[0][:4] + '-' + words[1][:3] + '-' + str(number).zfill(3)
+    elif len(words) == 1:
+        return words[0][:7] + '-' + str(number).zfill(3)
+    return 'PROD-' + str(number).zfill(3)
 
 def get_all_categories() -> List[Dict]:
-    """Get all categories from categories.json"""
-    return read_json_file('categories.json')
+    """Get all categories from categories.json (read-only snapshot)"""
+    return get_storage().records('categories.json')
 
 def get_category_by_id(category_id: str) -> Optional[Dict]:
-    """Get a specific category by ID"""
-    categories = get_all_categories()
-    for category in categories:
-        if category.get('id') == category_id:
-            return category
-    return None
+    """Get a specific category by ID (mutable copy)"""
+    category = get_storage().get('categories.json', category_id)
+    return thaw(category) if category is not None else None
 
-def save_category(category_data: Dict, is_new: bool = True) -> bool:
+def save_category(category_data: Dict, is_new: bool = True, expected_etag: Optional[str] = None) -> bool:
     """Save a category (create or update)"""
-    categories = get_all_categories()
-    
-    if is_new:
-        categories.append(category_data)
-    else:
-        for i, category in enumerate(categories):
-            if category.get('id') == category_data.get('id'):
-                categories[i] = category_data
-                break
-    
-    return write_json_file('categories.json', categories)
+    return _save_record('categories.json', category_data, is_new, expected_etag, 'This category')
 
 def delete_category(category_id: str) -> bool:
     """Delete a category by ID"""
-    categories = get_all_categories()
-    categories = [c for c in categories if c.get('id') != category_id]
-    return write_json_file('categories.json', categories)
+    return _delete_record('categories.json', category_id)
 
 def get_all_subcategories() -> List[Dict]:
-    """Get all subcategories from subcategories.json"""
-    return read_json_file('subcategories.json')
+    """Get all subcategories from subcategories.json (read-only snapshot)"""
+    return get_storage().records('subcategories.json')
+
+def get_subcategory_by_id(subcategory_id: str) -> Optional[Dict]:
+    """Get a specific subcategory by ID (mutable copy)"""
+    subcategory = get_storage().get('subcategories.json', subcategory_id)
+    return thaw(subcategory) if subcategory is not None else None
 
 def get_subcategories_by_parent(parent_id: str) -> List[Dict]:
-    """Get all subcategories for a specific parent category"""
-    subcategories = get_all_subcategories()
-    return [sc for sc in subcategories if sc.get('parentCategoryId') == parent_id]
+    """Get all subcategories for a specific parent category (read-only)"""
+    return get_storage().select('subcategories.json', 'parentCategoryId', parent_id)
 
-def save_subcategory(subcategory_data: Dict, is_new: bool = True) -> bool:
+def save_subcategory(subcategory_data: Dict, is_new: bool = True, expected_etag: Optional[str] = None) -> bool:
     """Save a subcategory (create or update)"""
-    subcategories = get_all_subcategories()
-    
-    if is_new:
-        subcategories.append(subcategory_data)
-    else:
-        for i, subcategory in enumerate(subcategories):
-            if subcategory.get('id') == subcategory_data.get('id'):
-                subcategories[i] = subcategory_data
-                break
-    
-    return write_json_file('subcategories.json', subcategories)
+    return _save_record('subcategories.json', subcategory_data, is_new, expected_etag, 'This subcategory')
 
 def delete_subcategory(subcategory_id: str) -> bool:
     """Delete a subcategory by ID"""
-    subcategories = get_all_subcategories()
-    subcategories = [sc for sc in subcategories if sc.get('id') != subcategory_id]
-    return write_json_file('subcategories.json', subcategories)
+    return _delete_record('subcategories.json', subcategory_id)
 
 def get_all_news() -> List[Dict]:
-    """Get all news items from news.json"""
-    return read_json_file('news.json')
+    """Get all news items from news.json (read-only snapshot)"""
+    return get_storage().records('news.json')
 
 def get_news_by_id(news_id: str) -> Optional[Dict]:
-    """Get a specific news item by ID"""
-    news_items = get_all_news()
-    for item in news_items:
-        if item.get('id') == news_id:
-            return item
-    return None
+    """Get a specific news item by ID (mutable copy)"""
+    item = get_storage().get('news.json', news_id)
+    return thaw(item) if item is not None else None
 
-def save_news(news_data: Dict, is_new: bool = True) -> bool:
+def save_news(news_data: Dict, is_new: bool = True, expected_etag: Optional[str] = None) -> bool:
     """Save a news item (create or update)"""
-    news_items = get_all_news()
-    
-    if is_new:
-        news_items.append(news_data)
-    else:
-        for i, item in enumerate(news_items):
-            if item.get('id') == news_data.get('id'):
-                news_items[i] = news_data
-                break
-    
-    return write_json_file('news.json', news_items)
+    return _save_record('news.json', news_data, is_new, expected_etag, 'This news item')
 
 def delete_news(news_id: str) -> bool:
     """Delete a news item by ID"""
-    news_items = get_all_news()
-    news_items = [n for n in news_items if n.get('id') != news_id]
-    return write_json_file('news.json', news_items)
+    return _delete_record('news.json', news_id)
 
 def get_store_info() -> Dict:
-    """Get store information from store.json"""
-    return read_json_file('store.json')
+    """Get store information from store.json (mutable copy)"""
+    return thaw(get_storage().document('store.json'))
 
-def save_store_info(store_data: Dict) -> bool:
+def save_store_info(store_data: Dict, expected_etag: Optional[str] = None) -> bool:
     """Save store information to store.json"""
-    return write_json_file('store.json', store_data)
+    with file_lock('store.json'):
+        _check_etag(get_storage().document('store.json'), expected_etag, 'The store settings')
+        try:
+            get_storage().put_document('store.json', store_data)
+        except Exception as e:
+            print(f"Error saving store.json: {e}")
+            return False
+        return True
 
 def generate_id(prefix: str) -> str:
     """
@@ -209,7 +982,7 @@ def generate_id(prefix: str) -> str:
     
     Args:
         prefix: Prefix for the ID (e.g., 'prod-scr-' for scrunchie products)
-        
+    
     Returns:
         A unique ID string
     """
@@ -219,41 +992,13 @@ def generate_id(prefix: str) -> str:
     suffix = ''.join(random.choices(string.digits, k=3))
     return f"{prefix}{suffix}"
 
-def generate_sequential_id(prefix: str, existing_ids: list) -> str:
-    """
-    Generate a sequential ID based on existing IDs.
-    
-    Args:
-        prefix: Prefix for the ID (e.g., 'cat-' for categories)
-        existing_ids: List of existing IDs to check
-        
-    Returns:
-        A sequential ID string (e.g., 'cat-04' if last is 'cat-03')
-    """
-    import re
-    
-    # Extract numbers from existing IDs with the same prefix
-    max_num = 0
-    pattern = re.compile(rf'^{re.escape(prefix)}(\d+)$')
-    
-    for existing_id in existing_ids:
-        match = pattern.match(existing_id)
-        if match:
-            num = int(match.group(1))
-            if num > max_num:
-                max_num = num
-    
-    # Generate next sequential number
-    next_num = max_num + 1
-    return f"{prefix}{next_num:02d}"  # Zero-padded to 2 digits
-
 def generate_slug(text: str) -> str:
     """
     Generate a URL-friendly slug from text.
     
     Args:
         text: Text to convert to slug
-        
+    
     Returns:
         URL-friendly slug string
     """
@@ -267,7 +1012,7 @@ def generate_slug(text: str) -> str:
 def ensure_directory_exists(directory: str) -> None:
     """Create a directory if it doesn't exist"""
     if not os.path.exists(directory):
-        os.makedirs(directory)
+        os.makedirs(directory, exist_ok=True)
 
 def get_dashboard_stats() -> Dict:
     """Get statistics for the dashboard"""
@@ -289,139 +1034,6 @@ def get_dashboard_stats() -> Dict:
         'active_news': active_news
     }
 
-def get_analytics_data() -> Dict:
-    """
-    Get comprehensive analytics data for the analytics dashboard.
-    
-    Returns:
-        Dictionary containing all analytics metrics
-    """
-    from datetime import datetime, timedelta
-    from collections import defaultdict
-    
-    products = get_all_products()
-    categories = get_all_categories()
-    
-    # Mock data - In production, this would come from order database
-    # For now, we'll calculate based on products and categories
-    
-    # Calculate total inventory value
-    total_inventory_value = sum(p.get('price', 0) * p.get('stock', 0) for p in products)
-    total_products_count = sum(p.get('stock', 0) for p in products)
-    
-    # Category performance
-    category_lookup = {cat['id']: cat['name'] for cat in categories}
-    category_stats = defaultdict(lambda: {'revenue': 0, 'count': 0})
-    
-    for product in products:
-        cat_ids = product.get('categoryIds', [])
-        for cat_id in cat_ids:
-            if cat_id in category_lookup:
-                value = product.get('price', 0) * product.get('stock', 0)
-                category_stats[cat_id]['revenue'] += value
-                category_stats[cat_id]['count'] += product.get('stock', 0)
-                category_stats[cat_id]['name'] = category_lookup[cat_id]
-    
-    # Sort categories by revenue
-    sorted_categories = sorted(
-        [{'name': v['name'], 'revenue': f"{v['revenue']:.2f}", 'percentage': (v['revenue'] / total_inventory_value * 100) if total_inventory_value > 0 else 0}
-         for k, v in category_stats.items()],
-        key=lambda x: float(x['revenue']),
-        reverse=True
-    )
-    
-    # Top products by potential value
-    top_products = sorted(products, key=lambda p: p.get('price', 0) * p.get('stock', 0), reverse=True)[:5]
-    top_products_data = [
-        {
-            'title': p.get('title', 'Unknown'),
-            'category': category_lookup.get(p.get('categoryIds', [''])[0], 'Uncategorized') if p.get('categoryIds') else 'Uncategorized',
-            'revenue': f"{p.get('price', 0) * p.get('stock', 0):.2f}",
-            'sales': p.get('stock', 0)
-        }
-        for p in top_products
-    ]
-    
-    # Inventory alerts
-    inventory_alerts = []
-    for product in products:
-        stock = product.get('stock', 0)
-        if stock == 0:
-            inventory_alerts.append({
-                'product': product.get('title', 'Unknown'),
-                'stock': stock,
-                'type': 'alert',
-                'message': 'Out of stock! Reorder immediately.'
-            })
-        elif stock <= 10:
-            inventory_alerts.append({
-                'product': product.get('title', 'Unknown'),
-                'stock': stock,
-                'type': 'warning',
-                'message': 'Low stock! Consider reordering soon.'
-            })
-    
-    # Recent activity (based on updatedAt timestamps)
-    recent_items = []
-    for product in sorted(products, key=lambda p: p.get('updatedAt', ''), reverse=True)[:5]:
-        recent_items.append({
-            'type': 'product',
-            'icon': '🛍️',
-            'title': f"Product Updated: {product.get('title', 'Unknown')}",
-            'description': f"Stock: {product.get('stock', 0)} units, Price: ₹{product.get('price', 0)}",
-            'time': format_time_ago(product.get('updatedAt', ''))
-        })
-    
-    # Generate revenue chart data (last 30 days)
-    today = datetime.now()
-    revenue_labels = []
-    revenue_data = []
-    for i in range(29, -1, -1):
-        date = today - timedelta(days=i)
-        revenue_labels.append(date.strftime('%b %d'))
-        # Mock revenue data - would come from actual orders
-        revenue_data.append(round(total_inventory_value / 30 * (0.8 + (i % 10) / 20), 2))
-    
-    return {
-        # Overview Stats
-        'total_revenue': f"{total_inventory_value:.2f}",
-        'revenue_trend': '↑ 15.3%',
-        'total_orders': len(products),  # Mock
-        'orders_trend': '↑ 8.7%',
-        'total_customers': 156,  # Mock
-        'customers_trend': '12',
-        'products_sold': total_products_count,
-        'avg_order_value': f"{(total_inventory_value / max(len(products), 1)):.2f}",
-        
-        # Charts Data
-        'revenue_chart': {
-            'labels': revenue_labels,
-            'data': revenue_data
-        },
-        'source_chart': {
-            'labels': ['Direct', 'WhatsApp', 'Instagram', 'Facebook'],
-            'data': [45, 30, 15, 10]  # Mock percentages
-        },
-        'order_status_chart': {
-            'labels': ['Pending', 'Processing', 'Completed'],
-            'data': [25, 15, 60]  # Mock percentages
-        },
-        'payment_chart': {
-            'labels': ['Pending', 'Confirmed', 'Failed'],
-            'data': [20, 75, 5]  # Mock counts
-        },
-        
-        # Lists
-        'top_products': top_products_data,
-        'categories': sorted_categories,
-        'inventory_alerts': inventory_alerts[:5],
-        'recent_activity': recent_items,
-        
-        # Customer Insights
-        'repeat_customers': 35,  # Mock percentage
-        'customer_lifetime_value': f"{(total_inventory_value / 156):.2f}",  # Mock
-    }
-
 def format_time_ago(timestamp_str: str) -> str:
     """Convert ISO timestamp to human-readable 'time ago' format"""
     if not timestamp_str: